@@ -0,0 +1,222 @@
+"""
+Cloud service concurrency benchmark: gunicorn gthread vs uvicorn (ASGI)
+Starts each entry point on a scratch SQLite database, opens one
+/api/events stream per simulated till (as the POS page does) and has
+every till scan barcodes and revalidate the catalog for a fixed time.
+With more tills than gthread threads, the thread-per-stream mode
+starves; the async mode keeps serving from one event loop.
+
+A checkout phase, run first, has up to 32 tills check out and complete
+payment in a loop (/api/generate_qr then /api/payment_complete, with no
+streams open). Both servers talk to a stand-in local service that
+answers after local_ms, as a store PC does, so payment_complete waits on
+I/O. Those routes are the Flask app in both modes, so this shows whether
+the ASGI entry point serves them concurrently rather than one at a time.
+
+Usage: python bench_async.py [tills] [seconds] [local_ms]
+Needs gunicorn, uvicorn and httpx (see requirements_async.txt).
+"""
+
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+MODES = [
+    ('gunicorn gthread (32 threads)', 8101,
+     ['gunicorn', 'body_soul_cloud_enhanced:app', '--worker-class', 'gthread', '--threads', '32',
+      '--bind', '127.0.0.1:8101']),
+    ('uvicorn ASGI', 8102,
+     ['uvicorn', 'body_soul_cloud_async:app', '--host', '127.0.0.1', '--port', '8102', '--log-level', 'warning']),
+]
+REQUEST_TIMEOUT = 10
+LOCAL_SERVICE_PORT = 8199
+
+
+class StandInLocalService(BaseHTTPRequestHandler):
+    """Local service stand-in: /health, /generate_qr and /payment_complete answer after a delay"""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    latency = 0.0
+
+    def reply(self, payload):
+        time.sleep(self.latency)
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.reply({'status': 'online', 'service': 'Body & Soul Local Service'})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.reply({'success': True})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_local_service(latency_ms):
+    handler = type('Handler', (StandInLocalService,), {'latency': latency_ms / 1000})
+    server = ThreadingHTTPServer(('127.0.0.1', LOCAL_SERVICE_PORT), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_server(command, port, sqlite_path):
+    """Launch one entry point and wait until /health answers"""
+    env = dict(os.environ, SQLITE_PATH=sqlite_path, DATABASE_URL='', PORT=str(port),
+               LOCAL_SERVICE_URL=f'http://127.0.0.1:{LOCAL_SERVICE_PORT}')
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f'http://127.0.0.1:{port}/health', timeout=2).status_code == 200:
+                httpx.get(f'http://127.0.0.1:{port}/init_db', timeout=30)  # schema + sample products
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{command[0]} did not start on port {port}")
+
+
+async def hold_stream(client, base_url, till, stop):
+    """Keep one till's SSE stream open until stop is set"""
+    try:
+        async with client.stream('GET', f'{base_url}/api/events', params={'till': till}, timeout=None) as response:
+            async for _ in response.aiter_bytes():
+                if stop.is_set():
+                    return
+    except (httpx.HTTPError, asyncio.CancelledError):
+        pass
+
+
+async def run_till(client, base_url, barcodes, stop, timings, errors):
+    """Scan a barcode, then revalidate the catalog, until stop is set"""
+    etag = None
+    while not stop.is_set():
+        for path, headers in ((f'/api/product/barcode/{random.choice(barcodes)}', {}),
+                              ('/api/products', {'If-None-Match': etag} if etag else {})):
+            started = time.perf_counter()
+            try:
+                response = await client.get(base_url + path, headers=headers, timeout=REQUEST_TIMEOUT)
+                if response.status_code >= 500:
+                    errors.append(response.status_code)
+                    continue
+                etag = response.headers.get('ETag', etag) if path == '/api/products' else etag
+            except httpx.HTTPError as e:
+                errors.append(type(e).__name__)
+                continue
+            timings.append((time.perf_counter() - started) * 1000)
+
+
+async def run_checkouts(client, base_url, till, stop, timings, errors):
+    """Check out and complete payment, until stop is set"""
+    headers = {'X-Till-Id': till}
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            response = await client.post(f'{base_url}/api/generate_qr', headers=headers, timeout=REQUEST_TIMEOUT,
+                                         json={'amount': round(random.uniform(50, 2000), 2), 'items': []})
+            if response.status_code != 202:
+                errors.append(response.status_code)
+                continue
+            response = await client.post(f'{base_url}/api/payment_complete', headers=headers,
+                                         timeout=REQUEST_TIMEOUT,
+                                         json={'transaction_id': response.json()['transaction_id']})
+            if response.status_code != 200:
+                errors.append(response.status_code)
+                continue
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+            continue
+        timings.append((time.perf_counter() - started) * 1000)
+
+
+async def load_checkouts(base_url, tills, seconds):
+    limits = httpx.Limits(max_connections=tills + 10, max_keepalive_connections=tills + 10)
+    async with httpx.AsyncClient(limits=limits) as client:
+        stop = asyncio.Event()
+        timings, errors = [], []
+        workers = [asyncio.create_task(run_checkouts(client, base_url, f'till-{i}', stop, timings, errors))
+                   for i in range(tills)]
+        await asyncio.sleep(seconds)
+        stop.set()
+        await asyncio.gather(*workers, return_exceptions=True)
+    return sorted(timings), errors
+
+
+async def load(base_url, tills, seconds):
+    limits = httpx.Limits(max_connections=tills * 2 + 10, max_keepalive_connections=tills * 2 + 10)
+    async with httpx.AsyncClient(limits=limits) as client:
+        products = (await client.get(f'{base_url}/api/products', timeout=REQUEST_TIMEOUT)).json()
+        barcodes = [product['barcode'] for product in products if product['barcode']] or ['0']
+        stop = asyncio.Event()
+        timings, errors = [], []
+        streams = [asyncio.create_task(hold_stream(client, base_url, f'till-{i}', stop)) for i in range(tills)]
+        await asyncio.sleep(1)  # let the streams connect before measuring
+        workers = [asyncio.create_task(run_till(client, base_url, barcodes, stop, timings, errors))
+                   for _ in range(tills)]
+        await asyncio.sleep(seconds)
+        stop.set()
+        await asyncio.gather(*workers, return_exceptions=True)
+        for task in streams:
+            task.cancel()
+        await asyncio.gather(*streams, return_exceptions=True)
+    return sorted(timings), errors
+
+
+def report(label, timings, errors, seconds, unit='req/s'):
+    if not timings:
+        print(f"{label:<40} no successful requests, {len(errors)} errors")
+        return
+    p50 = timings[len(timings) // 2]
+    p99 = timings[max(int(len(timings) * 0.99) - 1, 0)]
+    print(f"{label:<40} {len(timings) / seconds:8.1f} {unit}   p50 {p50:8.1f} ms   p99 {p99:8.1f} ms   "
+          f"errors {len(errors)}")
+
+
+def main():
+    tills = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 20
+    local_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 50
+    checkout_tills = min(tills, 32)
+
+    print("=" * 60)
+    print(f"Cloud service: {checkout_tills} tills checking out (local service answers in {local_ms:g} ms), "
+          f"then {tills} tills with an open event stream each, {seconds:.0f}s per phase")
+    print("=" * 60)
+    local_service = start_local_service(local_ms)
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, port, command in MODES:
+            process = start_server(command, port, os.path.join(tmp, f'bench_{port}.db'))
+            try:
+                # Checkouts first: a gthread worker's threads stay held by streams after their clients go
+                base_url = f'http://127.0.0.1:{port}'
+                timings, errors = asyncio.run(load_checkouts(base_url, checkout_tills, seconds))
+                report(f"{label}: checkouts", timings, errors, seconds, unit='sales/s')
+                timings, errors = asyncio.run(load(base_url, tills, seconds))
+                report(f"{label}: reads", timings, errors, seconds)
+            finally:
+                process.terminate()
+                process.wait()
+    local_service.shutdown()
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Barcode scan latency benchmark
+Compares the old per-scan path (new SQLite connection + query) with the
+in-memory barcode index used by /api/product/barcode/<barcode>.
+
+Usage: python bench_barcode_lookup.py [products] [scans]
+"""
+
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+from catalog_cache import CatalogCache, PRODUCT_COLUMNS, product_from_row, ensure_catalog_version
+from db import Database
+
+
+def seed_database(path, product_count):
+    """Create a products table with product_count in-stock rows"""
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            category TEXT NOT NULL,
+            price REAL NOT NULL,
+            size TEXT,
+            color TEXT,
+            stock INTEGER DEFAULT 0,
+            barcode TEXT UNIQUE
+        )
+    ''')
+    conn.executemany(
+        'INSERT INTO products (name, category, price, size, color, stock, barcode) VALUES (?, ?, ?, ?, ?, ?, ?)',
+        [(f'Product {i}', f'Category {i % 12}', 100.0 + i, 'M', 'Black', 10, f'59{i:011d}')
+         for i in range(product_count)]
+    )
+    ensure_catalog_version(conn.cursor(), 'sqlite')
+    conn.commit()
+    conn.close()
+
+
+def lookup_per_request(path, barcode):
+    """The previous route body: connect, query, close"""
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT {PRODUCT_COLUMNS}
+        FROM products
+        WHERE barcode = ? AND stock > 0
+    ''', (barcode,))
+    row = cursor.fetchone()
+    conn.close()
+    return product_from_row(row) if row else None
+
+
+def time_scans(lookup, barcodes):
+    """Return per-scan latencies in microseconds"""
+    timings = []
+    for barcode in barcodes:
+        started = time.perf_counter()
+        lookup(barcode)
+        timings.append((time.perf_counter() - started) * 1e6)
+    timings.sort()
+    return timings
+
+
+def report(label, timings):
+    p50 = timings[len(timings) // 2]
+    p99 = timings[int(len(timings) * 0.99) - 1]
+    print(f"{label:<28} p50 {p50:9.1f} us   p99 {p99:9.1f} us   mean {sum(timings) / len(timings):9.1f} us")
+
+
+def main():
+    product_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    scan_count = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        seed_database(path, product_count)
+        barcodes = [f'59{random.randrange(product_count):011d}' for _ in range(scan_count)]
+
+        cache = CatalogCache(Database(None, sqlite_path=path), ttl=3600)
+        cache.lookup(barcodes[0])  # build the index outside the timed loop
+
+        print("=" * 60)
+        print(f"Barcode lookup: {product_count} products, {scan_count} scans")
+        print("=" * 60)
+        report("per-request connection", time_scans(lambda b: lookup_per_request(path, b), barcodes))
+        report("in-memory barcode index", time_scans(cache.lookup, barcodes))
+        print("=" * 60)
+
+
+if __name__ == '__main__':
+    main()
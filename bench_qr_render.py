@@ -0,0 +1,107 @@
+"""
+Payment QR render benchmark
+Compares the previous path (qrcode render at box_size=10, LANCZOS resize
+to the display box) with qr_render's direct integer-module rendering,
+both pasted on the 320x480 canvas and JPEG-encoded as the local service
+does. The raster-only rows reuse one encoded QR, isolating the part this
+changes from qrcode's matrix encoding (mask search), which both share.
+No network: the QR data is a representative EMVCo merchant string.
+
+Usage: python bench_qr_render.py [iterations] [qr_box_px]
+"""
+
+import io
+import sys
+import time
+
+import qrcode
+from PIL import Image
+
+from qr_render import CANVAS_SIZE, centered_box, paste_qr, qr_matrix, render_matrix
+
+SAMPLE_DATA = ('00020101021226580014mu.zwennpay.www0108000000560215BODYANDSOUL0000000303ZWN5204531153034805406'
+               '1250.005802MU5920BODY AND SOUL MAURITIUS6010PORT LOUIS62290525BS-000042-TILL-MAIN-00016304A1B2')
+
+
+def render_resampled(data, box):
+    """The previous route body: oversized render, then LANCZOS down to the box"""
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(data)
+    qr.make(fit=True)
+    qr_image = qr.make_image(fill_color="black", back_color="white")
+    canvas = Image.new('RGB', CANVAS_SIZE, 'white')
+    left, top, size = box
+    canvas.paste(qr_image.resize((size, size), Image.Resampling.LANCZOS), (left, top))
+    return canvas
+
+
+def render_direct(data, box):
+    canvas = Image.new('RGB', CANVAS_SIZE, 'white')
+    paste_qr(canvas, data, box)
+    return canvas
+
+
+def raster_resampled(qr, box):
+    """Raster step only of the previous path, for an already encoded QR"""
+    canvas = Image.new('RGB', CANVAS_SIZE, 'white')
+    left, top, size = box
+    qr_image = qr.make_image(fill_color="black", back_color="white")
+    canvas.paste(qr_image.resize((size, size), Image.Resampling.LANCZOS), (left, top))
+    return canvas
+
+
+def raster_direct(matrix, box):
+    """Raster step only of qr_render, for an already encoded matrix"""
+    canvas = Image.new('RGB', CANVAS_SIZE, 'white')
+    left, top, size = box
+    qr_image = render_matrix(matrix, size)
+    offset = (size - qr_image.width) // 2
+    canvas.paste(qr_image, (left + offset, top + offset))
+    return canvas
+
+
+def time_renders(render, data, box, iterations):
+    """Return (sorted per-render milliseconds incl. JPEG encode, JPEG bytes)"""
+    timings = []
+    size = 0
+    for _ in range(iterations):
+        started = time.perf_counter()
+        buffer = io.BytesIO()
+        render(data, box).save(buffer, 'JPEG', quality=70)
+        timings.append((time.perf_counter() - started) * 1000)
+        size = buffer.tell()
+    timings.sort()
+    return timings, size
+
+
+def report(label, timings, size):
+    p50 = timings[len(timings) // 2]
+    p99 = timings[max(int(len(timings) * 0.99) - 1, 0)]
+    print(f"{label:<24} p50 {p50:7.2f} ms   p99 {p99:7.2f} ms   mean {sum(timings) / len(timings):7.2f} ms   "
+          f"JPEG {size:6d} bytes")
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    box_px = int(sys.argv[2]) if len(sys.argv) > 2 else 250
+    box = centered_box(box_px, top=50)
+    matrix = qr_matrix(SAMPLE_DATA)
+    modules = len(matrix)
+    encoded = qrcode.QRCode(version=1, box_size=10, border=5)
+    encoded.add_data(SAMPLE_DATA)
+    encoded.make(fit=True)
+
+    print("=" * 60)
+    print(f"QR render: {len(SAMPLE_DATA)}-char payload, {modules} modules incl. quiet zone, "
+          f"{box_px}px box ({box_px // modules}px/module), {iterations} renders")
+    print("=" * 60)
+    report("box_size=10 + LANCZOS", *time_renders(render_resampled, SAMPLE_DATA, box, iterations))
+    report("direct integer modules", *time_renders(render_direct, SAMPLE_DATA, box, iterations))
+    print("-" * 60)
+    report("raster: LANCZOS", *time_renders(raster_resampled, encoded, box, iterations))
+    report("raster: direct", *time_renders(raster_direct, matrix, box, iterations))
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+ZwennPay client benchmark
+Runs a local stand-in for the GetMerchantQR endpoint (keep-alive HTTP,
+configurable latency, optional failure rate) and compares the previous
+bare requests.post per call with the shared ZwennPayClient, with and
+without the payload cache. The stand-in can also be left running for
+the local service: ZWENNPAY_URL=http://127.0.0.1:<port>/api/v1.0/Common/GetMerchantQR
+
+Usage: python bench_zwennpay.py [calls] [latency_ms] [failure_rate]
+       python bench_zwennpay.py --serve [port] [latency_ms] [failure_rate]
+"""
+
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from zwennpay import ZwennPayClient, merchant_qr_payload
+
+QR_PATH = '/api/v1.0/Common/GetMerchantQR'
+SAMPLE_AMOUNTS = ['150', '250', '400', '1250', '99.50']
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """GetMerchantQR stand-in: a deterministic EMVCo-like string per merchant and amount"""
+
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real endpoint
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+    latency = 0.0
+    failure_rate = 0.0
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        time.sleep(self.latency)
+        if self.path != QR_PATH:
+            status, body = 404, b'not found'
+        elif random.random() < self.failure_rate:
+            status, body = 503, b'busy'
+        else:
+            status = 200
+            body = (f"00020101021226580014mu.zwennpay.www01080000{payload.get('MerchantId', 0):04d}"
+                    f"5303480540{len(payload.get('TransactionAmount', ''))}{payload.get('TransactionAmount', '')}"
+                    f"5802MU5913BODY AND SOUL6304A1B2").encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stand_in(port=0, latency_ms=0.0, failure_rate=0.0):
+    """Serve the stand-in on a background thread; returns (server, GetMerchantQR URL)"""
+    handler = type('Handler', (StandInHandler,), {'latency': latency_ms / 1000, 'failure_rate': failure_rate})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}{QR_PATH}"
+
+
+def bare_post(url, amount):
+    """The previous call: a new connection per request, no retry"""
+    response = requests.post(url, headers={"accept": "text/plain", "Content-Type": "application/json"},
+                             json=merchant_qr_payload(amount), timeout=20)
+    response.raise_for_status()
+    return response.text.strip()
+
+
+def time_calls(call, calls):
+    """Return (sorted per-call milliseconds, failures)"""
+    timings = []
+    failures = 0
+    for i in range(calls):
+        started = time.perf_counter()
+        try:
+            call(SAMPLE_AMOUNTS[i % len(SAMPLE_AMOUNTS)])
+        except requests.exceptions.RequestException:
+            failures += 1
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return timings, failures
+
+
+def report(label, timings, failures):
+    p50 = timings[len(timings) // 2]
+    p99 = timings[max(int(len(timings) * 0.99) - 1, 0)]
+    print(f"{label:<24} p50 {p50:7.2f} ms   p99 {p99:7.2f} ms   mean {sum(timings) / len(timings):7.2f} ms   "
+          f"failed {failures}")
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--serve':
+        port = int(sys.argv[2]) if len(sys.argv) > 2 else 9425
+        latency_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 0
+        failure_rate = float(sys.argv[4]) if len(sys.argv) > 4 else 0
+        server, url = start_stand_in(port, latency_ms, failure_rate)
+        print(f"✓ ZwennPay stand-in at {url} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
+        return
+
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    failure_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0.05
+    server, url = start_stand_in(latency_ms=latency_ms, failure_rate=failure_rate)
+    client = ZwennPayClient(url=url, backoff=0.01)
+    cached = ZwennPayClient(url=url, backoff=0.01, cache_size=64)
+
+    print("=" * 60)
+    print(f"GetMerchantQR stand-in: {latency_ms:g} ms server latency, {failure_rate:.0%} 503s, {calls} calls")
+    print("=" * 60)
+    report("bare requests.post", *time_calls(lambda amount: bare_post(url, amount), calls))
+    report("ZwennPayClient", *time_calls(client.merchant_qr, calls))
+    report("ZwennPayClient + cache", *time_calls(cached.merchant_qr, calls))
+    print("-" * 60)
+    print(f"client stats: {client.stats()}")
+    print(f"cached stats: {cached.stats()}")
+    print("=" * 60)
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
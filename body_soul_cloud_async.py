@@ -0,0 +1,274 @@
+"""
+Body & Soul POS - Cloud Service (ASGI entry point)
+Serves the same API as body_soul_cloud_enhanced.py from one asyncio
+event loop, so a single small instance holds hundreds of tills' SSE
+streams and status polls open without a thread each.
+
+The I/O-bound read paths run natively here (asyncpg/aiosqlite and an
+httpx client to the local services): the catalog, barcode scans,
+checkout job polling, receipts, the event stream, local status and
+health. Everything else (checkout, payment, imports, sync, reports) is
+the Flask app itself, mounted through a2wsgi's WSGIMiddleware, so the
+transactional code exists once. Those requests run on a pool of
+FLASK_THREADS threads, like the gthread workers they replace (asgiref's
+WsgiToAsgi would run every one of them on a single shared thread).
+
+Run with:
+    uvicorn body_soul_cloud_async:app --host 0.0.0.0 --port $PORT
+"""
+
+import asyncio
+import functools
+import os
+import time
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+import body_soul_cloud_enhanced as cloud
+from catalog_cache import PRODUCT_COLUMNS, product_from_row
+from checkout_jobs import JOB_COLUMNS, job_from_row
+from db import database_url_from_env
+from db import PoolTimeout
+from db_async import ASYNC_DATABASE_ERRORS, AsyncDatabase, async_database_unreachable
+from events import TooManyStreams, format_sse
+from local_client import AsyncLocalServiceClient, CircuitOpenError
+
+PAGED_PRODUCT_PARAMS = ('limit', 'cursor', 'fields', 'category')
+FLASK_THREADS = int(os.getenv('FLASK_THREADS', 32))  # concurrent requests served by the Flask routes
+ASYNC_SSE_MAX_STREAMS = int(os.getenv('ASYNC_SSE_MAX_STREAMS', 1000))  # streams are coroutines here, not threads
+
+adb = AsyncDatabase(database_url_from_env())
+local_client = AsyncLocalServiceClient(cloud.local_client)
+flask_app = WSGIMiddleware(cloud.app, workers=FLASK_THREADS)
+
+
+def observe_db_connection_hold(seconds):
+    """adb hold times go to the same histogram as cloud.db's, under one 'async' label"""
+    cloud.db_hold_time.observe(seconds, 'async')
+
+adb.observer = observe_db_connection_hold
+
+
+def till_id_for(request):
+    """Till identifier from the X-Till-Id header or ?till=, as request_till_id()"""
+    return request.headers.get('X-Till-Id') or request.query_params.get('till') or cloud.DEFAULT_TILL_ID
+
+
+def etag_matches(request, etag):
+    return etag and f'"{etag}"' in [tag.strip() for tag in request.headers.get('if-none-match', '').split(',')]
+
+
+def cached_json(request, body, etag):
+    """200 with ETag, or 304 when the client's copy is current"""
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type='application/json', headers=headers)
+
+
+def timed(route):
+    """Record a native route in the same http metrics the Flask hooks use"""
+    def decorate(handler):
+        @functools.wraps(handler)
+        async def wrapper(request):
+            started = time.perf_counter()
+            status = 500
+            try:
+                response = await handler(request)
+                status = response.status_code
+                return response
+            finally:
+                cloud.http_latency.observe(time.perf_counter() - started, route, request.method)
+                cloud.http_requests.inc(route, request.method, status)
+        return wrapper
+    return decorate
+
+
+class ProductsRoute:
+    """Bare /api/products is served from the catalog cache; paged listings go to the Flask view"""
+
+    async def __call__(self, scope, receive, send):
+        request = Request(scope, receive)
+        if any(name in request.query_params for name in PAGED_PRODUCT_PARAMS):
+            await flask_app(scope, receive, send)
+            return
+        response = await products(request)
+        await response(scope, receive, send)
+
+
+@timed('/api/products')
+async def products(request):
+    body, etag = await cloud.catalog_cache.get_async(adb)
+    return cached_json(request, body, etag)
+
+
+@timed('/api/product/barcode/<barcode>')
+async def product_by_barcode(request):
+    barcode = request.path_params['barcode']
+    product = await cloud.catalog_cache.lookup_async(adb, barcode)
+
+    if product is None:
+        # Miss: the product may have been added since our snapshot
+        row = await adb.fetchone(f'''
+            SELECT {PRODUCT_COLUMNS}
+            FROM products
+            WHERE barcode = ? AND stock > 0
+        ''', (barcode,))
+        if row:
+            cloud.catalog_cache.invalidate()
+            product = product_from_row(row)
+
+    if product:
+        return JSONResponse({'success': True, 'product': product})
+    return JSONResponse({'success': False, 'error': 'Product not found'}, status_code=404)
+
+
+@timed('/api/checkout_job/<job_id>')
+async def checkout_job(request):
+    row = await adb.fetchone(f'SELECT {JOB_COLUMNS} FROM checkout_jobs WHERE id = ?',
+                             (request.path_params['job_id'],))
+    if row:
+        return JSONResponse({'success': True, 'job': job_from_row(row)})
+    return JSONResponse({'success': False, 'error': 'Job not found'}, status_code=404)
+
+
+async def load_receipt(column, value):
+    row = await adb.fetchone(f'SELECT {cloud.RECEIPT_COLUMNS} FROM transactions WHERE {column} = ?', (value,))
+    return cloud.receipt_from_row(row) if row else None
+
+
+def receipt_response(request, receipt):
+    if receipt is None:
+        return JSONResponse({'success': False, 'error': 'Receipt not found'}, status_code=404)
+    body, etag = receipt
+    if etag:
+        return cached_json(request, body, etag)
+    return Response(body, media_type='application/json', headers={'Cache-Control': 'no-store'})
+
+
+@timed('/api/receipt/<int:transaction_id>')
+async def receipt(request):
+    transaction_id = request.path_params['transaction_id']
+    return receipt_response(request, cloud.receipt_cache.get(transaction_id=transaction_id)
+                            or await load_receipt('id', transaction_id))
+
+
+@timed('/api/receipt/number/<receipt_number>')
+async def receipt_by_number(request):
+    receipt_number = request.path_params['receipt_number']
+    return receipt_response(request, cloud.receipt_cache.get(receipt_number=receipt_number)
+                            or await load_receipt('receipt_number', receipt_number))
+
+
+@timed('/api/events')
+async def events(request):
+    """Server-Sent Events stream: one coroutine per till instead of one thread"""
+    try:
+        subscription = cloud.event_bus.subscribe(till_id_for(request), loop=asyncio.get_running_loop(),
+                                                 limit=ASYNC_SSE_MAX_STREAMS)
+    except TooManyStreams:
+        return Response(f"retry: {cloud.SSE_BUSY_RETRY_SECONDS * 1000}\n\n", status_code=503,
+                        media_type='text/event-stream',
+                        headers={'Retry-After': str(cloud.SSE_BUSY_RETRY_SECONDS), 'Cache-Control': 'no-cache'})
+
+    async def stream():
+        deadline = time.monotonic() + cloud.SSE_MAX_SECONDS
+        try:
+            yield "retry: 2000\n\n"
+            while time.monotonic() < deadline:
+                event = await subscription.next_event_async(timeout=cloud.SSE_HEARTBEAT_SECONDS)
+                yield format_sse(event) if event else ": keepalive\n\n"
+        finally:
+            cloud.event_bus.unsubscribe(subscription)
+
+    return StreamingResponse(stream(), media_type='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+@timed('/api/local_status')
+async def local_status(request):
+    """Check if this till's local service is online"""
+    till_id = till_id_for(request)
+    # Registry/discovery are cached per worker; a refresh or probe runs off the loop
+    terminal = await run_in_threadpool(cloud.local_service_for, till_id)
+    # publish_device_status may NOTIFY through the blocking Postgres relay; keep it off the loop too
+    if not terminal:
+        await run_in_threadpool(cloud.publish_device_status, 'offline', 'Local service not found', till_id=till_id)
+        return JSONResponse({'status': 'offline', 'message': 'Local service not found'})
+
+    local_url = terminal.url
+    breaker = cloud.local_client.breaker_state
+    try:
+        response = await local_client.get(local_url, 'health', headers={'X-API-Key': terminal.api_key})
+        if response.status_code == 200:
+            data = response.json()
+            data['url'] = local_url
+            data['terminal_id'] = terminal.id
+            await run_in_threadpool(cloud.publish_device_status, 'online', till_id=till_id)
+            return JSONResponse({'status': 'online', 'data': data, 'breaker': breaker(local_url)})
+        return JSONResponse({'status': 'error', 'message': f'Local service returned status {response.status_code}',
+                             'breaker': breaker(local_url)})
+    except CircuitOpenError as e:
+        return JSONResponse({'status': 'offline', 'message': str(e), 'breaker': breaker(local_url)})
+    except cloud.requests.exceptions.ConnectionError:
+        await run_in_threadpool(cloud.report_terminal_failure, terminal)
+        await run_in_threadpool(cloud.publish_device_status, 'offline', 'Cannot connect to local payment device',
+                                till_id=till_id)
+        return JSONResponse({'status': 'offline', 'message': 'Cannot connect to local payment device',
+                             'breaker': breaker(local_url)})
+    except Exception as e:
+        return JSONResponse({'status': 'error', 'message': str(e), 'breaker': breaker(local_url)})
+
+
+@timed('/health')
+async def health(request):
+    """Health check endpoint for Railway"""
+    return JSONResponse({
+        'status': 'healthy',
+        'service': 'Body & Soul Cloud POS (async)',
+        'db_pool': cloud.db.stats(),
+        'async_db': adb.stats(),
+        'events': cloud.event_bus.stats(),
+        'receipt_cache': cloud.receipt_cache.stats(),
+        'local_service': cloud.local_discovery.status()
+    })
+
+
+async def database_error(request, exc):
+    """503 when the database is down or its pool is exhausted; 500 for anything else"""
+    if isinstance(exc, PoolTimeout):
+        return JSONResponse({'success': False, 'error': 'Database busy, try again'}, status_code=503,
+                            headers={'Retry-After': '1'})
+    if async_database_unreachable(exc):
+        return JSONResponse({'success': False, 'error': 'Database unavailable, try again'}, status_code=503)
+    return JSONResponse({'success': False, 'error': str(exc)}, status_code=500)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # The schema was migrated when body_soul_cloud_enhanced was imported
+    await adb.open()
+    yield
+    await local_client.close()
+    await adb.close()
+
+
+app = Starlette(routes=[
+    Route('/api/products', ProductsRoute()),
+    Route('/api/product/barcode/{barcode}', product_by_barcode),
+    Route('/api/checkout_job/{job_id}', checkout_job),
+    Route('/api/receipt/{transaction_id:int}', receipt),
+    Route('/api/receipt/number/{receipt_number}', receipt_by_number),
+    Route('/api/events', events),
+    Route('/api/local_status', local_status),
+    Route('/health', health),
+    Mount('/', app=flask_app),
+], exception_handlers={error: database_error for error in ASYNC_DATABASE_ERRORS}, lifespan=lifespan)
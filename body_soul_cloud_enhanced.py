@@ -4,62 +4,88 @@ This service handles the web interface, database, and business logic.
 ESP32 communication is delegated to the local service.
 """
 
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, g, has_request_context, render_template, request, jsonify, stream_with_context
 import os
 from datetime import datetime
+import io
 import json
+import time
 import requests
+from db import Database, OPERATIONAL_ERRORS, PoolTimeout, database_unreachable, database_url_from_env
+from metrics import Registry
+from local_client import LocalServiceClient, CircuitOpenError
+from discovery import LocalServiceDiscovery
+from events import EventBus, PostgresEventRelay, TooManyStreams, format_sse
+from catalog_cache import (CatalogCache, PRODUCT_COLUMNS, PRODUCT_FIELDS, PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX,
+                           product_from_row, product_page, decode_cursor, bump_catalog_version,
+                           read_catalog_version)
+from checkout_jobs import CheckoutJobQueue, CheckoutJobError
+from transaction_items import save_transaction_items
+from product_import import CSVFormatError, import_products
+from receipt_cache import ReceiptCache
+from sales_rollups import (complete_transaction, daily_report, hourly_report,
+                           product_report, category_report)
+from stock import (InsufficientStock, reserve_stock, commit_stock,
+                   release_expired, release_failed_checkout)
+from terminals import Terminal, TerminalRegistry, is_online
+from receipts import ReceiptAllocator
+from idempotency import IdempotencyConflict, IdempotencyStore, MAX_KEY_LENGTH, request_fingerprint
+from migrations import LATEST_VERSION, migrate
 
 app = Flask(__name__)
 
 # Configuration
 LOCAL_SERVICE_PORTS = [8080, 8081, 8082, 8083]  # Try multiple ports
-LOCAL_SERVICE_URL = None  # Will be set when we find the working port
 LOCAL_API_KEY = os.getenv('LOCAL_API_KEY', 'dev-key-12345')
+DEFAULT_TILL_ID = os.getenv('DEFAULT_TILL_ID', 'main')
+SSE_HEARTBEAT_SECONDS = 15
+SSE_MAX_SECONDS = int(os.getenv('SSE_MAX_SECONDS', 60))  # browsers reconnect automatically
+# Each stream holds a gthread thread: keep this below gunicorn --threads so checkouts still get one
+SSE_MAX_STREAMS = int(os.getenv('SSE_MAX_STREAMS', 16))
+SSE_BUSY_RETRY_SECONDS = 30  # how long a refused browser waits before trying again
+RESERVATION_SWEEP_SECONDS = 60  # how often a worker releases stock from abandoned checkouts
+
+# Keep-alive HTTP client (with circuit breaker) for every call to the local service
+local_client = LocalServiceClient(LOCAL_API_KEY)
+
+def probe_local_service(url):
+    """True if a local service answers /health at url (no retries, breaker and call metrics untouched)"""
+    try:
+        response = local_client.request('GET', url, 'health', use_breaker=False, observe=False)
+        return response.status_code == 200
+    except Exception:
+        return False
+
+def local_service_candidates():
+    """URLs the local service may be on, in order of preference"""
+    return [os.getenv('LOCAL_SERVICE_URL')] + [f"http://localhost:{port}" for port in LOCAL_SERVICE_PORTS]
 
 def find_local_service():
-    """Find which port the local service is running on"""
-    global LOCAL_SERVICE_URL
-    
-    # If already found, return it
-    if LOCAL_SERVICE_URL:
-        return LOCAL_SERVICE_URL
-    
-    # Check environment variable first
-    env_url = os.getenv('LOCAL_SERVICE_URL')
-    if env_url:
-        try:
-            response = requests.get(f"{env_url}/health", timeout=2)
-            if response.status_code == 200:
-                LOCAL_SERVICE_URL = env_url
-                return LOCAL_SERVICE_URL
-        except:
-            pass
-    
-    # Try each port
-    for port in LOCAL_SERVICE_PORTS:
-        try:
-            test_url = f"http://localhost:{port}"
-            response = requests.get(f"{test_url}/health", timeout=2)
-            if response.status_code == 200:
-                LOCAL_SERVICE_URL = test_url
-                print(f"✓ Found local service on port {port}")
-                return LOCAL_SERVICE_URL
-        except:
-            continue
-    
-    return None
+    """Find which port the local service is running on (cached by the background prober)"""
+    return local_discovery.get()
+
+def local_service_for(till_id):
+    """Terminal (local service URL, API key, capabilities) that serves a till, or None.
+
+    Tills with a registered terminal are routed to it; a till without one
+    falls back to the single discovered local service.
+    """
+    terminal = terminal_registry.get(till_id)
+    if terminal:
+        return terminal if is_online(terminal) else None
+    local_url = find_local_service()
+    return Terminal(None, local_url, LOCAL_API_KEY, {}, time.time()) if local_url else None
+
+def report_terminal_failure(terminal):
+    """A call to a terminal failed to connect; re-probe if it came from discovery"""
+    if terminal.id is None:
+        local_discovery.report_failure(terminal.url)
 
 # Database configuration - supports both SQLite (local) and PostgreSQL (cloud)
 def get_database_url():
     """Get database URL with debug logging"""
     # Try multiple possible environment variable names
-    db_url = (
-        os.getenv('DATABASE_URL') or 
-        os.getenv('POSTGRES_URL') or 
-        os.getenv('POSTGRESQL_URL') or
-        os.getenv('DATABASE_PRIVATE_URL')
-    )
+    db_url = database_url_from_env()
     print(f"DEBUG: All env vars:")
     print(f"  DATABASE_URL = {os.getenv('DATABASE_URL')[:50] if os.getenv('DATABASE_URL') else 'None'}")
     print(f"  POSTGRES_URL = {os.getenv('POSTGRES_URL')[:50] if os.getenv('POSTGRES_URL') else 'None'}")
@@ -68,6 +94,69 @@ def get_database_url():
 
 DATABASE_URL = get_database_url()
 
+# Shared connection pool (PostgreSQL) or per-thread connections (SQLite)
+db = Database(DATABASE_URL)
+
+# Background discovery of the local service, shared across workers via the DB
+local_discovery = LocalServiceDiscovery(db, probe_local_service, local_service_candidates)
+receipt_allocator = ReceiptAllocator(db)
+catalog_cache = CatalogCache(db)
+terminal_registry = TerminalRegistry(db)
+receipt_cache = ReceiptCache()
+idempotency_store = IdempotencyStore()
+
+# Till status events for the /api/events stream
+event_bus = EventBus()
+if db.db_type == 'postgresql':
+    event_bus.relay = PostgresEventRelay(db, event_bus)
+
+# Metrics exported at /metrics (Prometheus text format, per worker)
+metrics = Registry()
+http_latency = metrics.histogram('pos_http_request_duration_seconds', 'Request latency by route', ('route', 'method'))
+http_requests = metrics.counter('pos_http_requests_total', 'Requests by route and status', ('route', 'method', 'status'))
+db_hold_time = metrics.histogram('pos_db_connection_hold_seconds',
+                                 'Time a database connection is held (acquired to released, including work between queries)',
+                                 ('endpoint',))
+local_latency = metrics.histogram('pos_local_call_seconds', 'Calls to the local service', ('endpoint', 'outcome'))
+local_errors = metrics.counter('pos_local_call_errors_total', 'Failed calls to the local service', ('endpoint', 'outcome'))
+checkout_funnel = metrics.counter('pos_checkout_funnel_total', 'Checkouts reaching each stage', ('stage',))
+metrics.gauge('pos_db_pool_in_use', 'Database connections currently borrowed', lambda: db.stats()['in_use'])
+metrics.gauge('pos_db_pool_max', 'Database pool size limit', lambda: db.stats()['pool_max'])
+metrics.gauge('pos_db_pool_checkouts', 'Database connections handed out since start', lambda: db.stats()['checkouts'])
+metrics.gauge('pos_db_pool_timeouts', 'Requests that gave up waiting for a connection', lambda: db.stats()['timeouts'])
+metrics.gauge('pos_db_pool_wait_seconds_total', 'Total time spent waiting for a connection', lambda: db.stats()['wait_seconds_total'])
+metrics.gauge('pos_db_pool_wait_seconds_max', 'Longest wait for a connection', lambda: db.stats()['wait_seconds_max'])
+metrics.gauge('pos_catalog_cache_hits', 'Catalog/barcode requests served without revalidation', lambda: catalog_cache.stats()['hits'])
+metrics.gauge('pos_catalog_cache_rebuilds', 'Catalog snapshots built from the database', lambda: catalog_cache.stats()['rebuilds'])
+metrics.gauge('pos_receipt_cache_hits', 'Receipts served from the receipt cache', lambda: receipt_cache.stats()['hits'])
+metrics.gauge('pos_receipt_cache_bytes', 'Bytes held by the receipt cache', lambda: receipt_cache.stats()['bytes'])
+metrics.gauge('pos_sse_subscribers', 'Open /api/events streams', lambda: event_bus.stats()['subscribers'])
+metrics.gauge('pos_sse_refused', 'Event streams refused at SSE_MAX_STREAMS', lambda: event_bus.stats()['refused'])
+
+def observe_db_connection_hold(seconds):
+    db_hold_time.observe(seconds, request.endpoint if has_request_context() else 'background')
+
+def observe_local_call(endpoint, seconds, outcome):
+    local_latency.observe(seconds, endpoint, outcome)
+    if outcome != 'ok':
+        local_errors.inc(endpoint, outcome)
+
+db.observer = observe_db_connection_hold
+local_client.observer = observe_local_call
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        http_latency.observe(time.perf_counter() - started, route, request.method)
+        http_requests.inc(route, request.method, response.status_code)
+    return response
+
 # Company details for receipts (Mauritius requirements)
 COMPANY_INFO = {
     'name': 'Body & Soul Mauritius',
@@ -79,143 +168,73 @@ COMPANY_INFO = {
     'vat_rate': 0.15  # 15% VAT in Mauritius
 }
 
-def get_db_connection():
-    """Get database connection - supports SQLite and PostgreSQL"""
-    db_url = os.getenv('DATABASE_URL')  # Read fresh each time
-    print(f"DEBUG: Connecting with DATABASE_URL present: {bool(db_url)}")
-    if db_url and 'postgres' in db_url:
-        # PostgreSQL for cloud deployment
-        try:
-            import psycopg2
-            import psycopg2.extras
-            # Fix Railway's postgres:// to postgresql://
-            connection_url = db_url.replace('postgres://', 'postgresql://', 1)
-            print(f"Connecting to PostgreSQL...")
-            conn = psycopg2.connect(connection_url)
-            print(f"✓ PostgreSQL connected")
-            return conn, 'postgresql'
-        except Exception as e:
-            print(f"✗ PostgreSQL connection failed: {e}")
-            print(f"Falling back to SQLite...")
-            import sqlite3
-            conn = sqlite3.connect('body_soul.db')
-            conn.row_factory = sqlite3.Row
-            return conn, 'sqlite'
-    else:
-        # SQLite for local development
-        print(f"Using SQLite database")
-        import sqlite3
-        conn = sqlite3.connect('body_soul.db')
-        conn.row_factory = sqlite3.Row
-        return conn, 'sqlite'
-
 def init_db():
-    """Initialize database with sample Body and Soul products"""
-    conn, db_type = get_db_connection()
-    cursor = conn.cursor()
-    
-    if db_type == 'postgresql':
-        # PostgreSQL schema
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS products (
-                id SERIAL PRIMARY KEY,
-                name TEXT NOT NULL,
-                category TEXT NOT NULL,
-                price DECIMAL(10,2) NOT NULL,
-                size TEXT,
-                color TEXT,
-                stock INTEGER DEFAULT 0,
-                barcode TEXT UNIQUE
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS transactions (
-                id SERIAL PRIMARY KEY,
-                receipt_number TEXT UNIQUE NOT NULL,
-                total_amount DECIMAL(10,2) NOT NULL,
-                subtotal DECIMAL(10,2) NOT NULL,
-                vat_amount DECIMAL(10,2) NOT NULL,
-                items_json TEXT NOT NULL,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                status TEXT DEFAULT 'pending',
-                payment_method TEXT DEFAULT 'QR'
-            )
-        ''')
-    else:
-        # SQLite schema
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS products (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                category TEXT NOT NULL,
-                price REAL NOT NULL,
-                size TEXT,
-                color TEXT,
-                stock INTEGER DEFAULT 0,
-                barcode TEXT UNIQUE
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS transactions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                receipt_number TEXT UNIQUE NOT NULL,
-                total_amount REAL NOT NULL,
-                subtotal REAL NOT NULL,
-                vat_amount REAL NOT NULL,
-                items_json TEXT NOT NULL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                status TEXT DEFAULT 'pending',
-                payment_method TEXT DEFAULT 'QR'
-            )
-        ''')
-    
-    # Insert sample products if table is empty
-    cursor.execute('SELECT COUNT(*) FROM products')
-    count = cursor.fetchone()[0]
-    
-    if count == 0:
-        sample_products = [
-            ('Body & Soul T-Shirt', 'Tops', 450.00, 'M', 'Blue', 25, '5901234123457'),
-            ('Body & Soul T-Shirt', 'Tops', 450.00, 'L', 'Blue', 20, '5901234123464'),
-            ('Body & Soul T-Shirt', 'Tops', 450.00, 'M', 'Black', 30, '5901234123471'),
-            ('Body & Soul Hoodie', 'Tops', 890.00, 'M', 'Grey', 15, '5901234123488'),
-            ('Body & Soul Hoodie', 'Tops', 890.00, 'L', 'Grey', 12, '5901234123495'),
-            ('Body & Soul Jeans', 'Bottoms', 1250.00, '32', 'Dark Blue', 18, '5901234123501'),
-            ('Body & Soul Jeans', 'Bottoms', 1250.00, '34', 'Dark Blue', 22, '5901234123518'),
-            ('Body & Soul Shorts', 'Bottoms', 650.00, 'M', 'Khaki', 20, '5901234123525'),
-            ('Body & Soul Cap', 'Accessories', 320.00, 'One Size', 'Black', 35, '5901234123532'),
-            ('Body & Soul Socks', 'Accessories', 180.00, 'One Size', 'White', 50, '5901234123549')
-        ]
-        
-        cursor.executemany('''
-            INSERT INTO products (name, category, price, size, color, stock, barcode)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        ''' if db_type == 'postgresql' else '''
-            INSERT INTO products (name, category, price, size, color, stock, barcode)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', sample_products)
-    
-    conn.commit()
-    conn.close()
+    """Bring the schema up to date (one query when it already is)"""
+    applied = migrate(db)
+    for version, name in applied:
+        print(f"✓ Applied migration {version}: {name}")
+    if applied:
+        catalog_cache.invalidate()
+    return applied
+
+# Every process serving the app (gunicorn workers, uvicorn, python) migrates once as it starts;
+# workers booting together take turns on the migration lock and then find nothing to do
+print("Initializing database...")
+try:
+    init_db()
+    print("✓ Database initialized successfully")
+except Exception as e:
+    print(f"✗ Database initialization failed: {e} (retry with GET /init_db)")
 
 def generate_receipt_number():
     """Generate unique receipt number"""
-    conn, db_type = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT receipt_number FROM transactions ORDER BY id DESC LIMIT 1')
-    last_receipt = cursor.fetchone()
+    return receipt_allocator.next_receipt()
+
+def split_vat(total_amount):
+    """(subtotal, vat_amount) for a VAT-inclusive total"""
+    subtotal = total_amount / (1 + COMPANY_INFO['vat_rate'])
+    return subtotal, total_amount - subtotal
+
+def record_stock_change(cursor):
+    """Bump the catalog version after a stock write; returns the new version"""
+    bump_catalog_version(cursor)
+    return read_catalog_version(cursor)
+
+_last_reservation_sweep = 0.0
+
+def release_abandoned_stock():
+    """Release expired reservations, at most once per RESERVATION_SWEEP_SECONDS per worker.
+
+    Runs in its own transaction: a checkout rolling back must not undo a
+    sweep this worker then thinks is done.
+    """
+    global _last_reservation_sweep
+    if time.monotonic() - _last_reservation_sweep < RESERVATION_SWEEP_SECONDS:
+        return
+    with db.connection() as (conn, db_type):
+        cursor = conn.cursor()
+        stock_levels = release_expired(cursor, db_type)
+        catalog_version = record_stock_change(cursor) if stock_levels else None
+    _last_reservation_sweep = time.monotonic()
+    if stock_levels:
+        catalog_cache.apply_stock_levels(stock_levels, catalog_version)
+
+def save_transaction(cursor, db_type, receipt_number, total_amount, subtotal, vat_amount, items):
+    """Insert a pending transaction; returns (transaction_id, receipt_number) in one round trip"""
+    placeholder = '%s' if db_type == 'postgresql' else '?'
+    sql = f'''
+        INSERT INTO transactions (receipt_number, total_amount, subtotal, vat_amount, items_json, payment_method)
+        VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder})
+    '''
+    params = (receipt_number, total_amount, subtotal, vat_amount, json.dumps(items), 'QR')
     
-    if last_receipt:
-        last_num = int(last_receipt[0].split('-')[1])
-        new_num = last_num + 1
+    if db_type == 'postgresql':
+        cursor.execute(sql + ' RETURNING id, receipt_number', params)
+        transaction_id, receipt_number = cursor.fetchone()
     else:
-        new_num = 1
-    
-    conn.close()
-    return f"BS-{new_num:06d}"
+        cursor.execute(sql, params)
+        transaction_id = cursor.lastrowid
+    return transaction_id, receipt_number
 
 @app.route('/')
 def index():
@@ -224,69 +243,182 @@ def index():
 
 @app.route('/api/products')
 def get_products():
-    """Get all products"""
-    conn, db_type = get_db_connection()
-    cursor = conn.cursor()
+    """Get all products (cached per catalog version, revalidated with ETag).
+
+    With ?limit=, ?cursor=, ?fields= or ?category= the listing is paged
+    by keyset instead and streamed.
+    """
+    if any(name in request.args for name in ('limit', 'cursor', 'fields', 'category')):
+        return get_products_page()
     
-    cursor.execute('''
-        SELECT id, name, category, price, size, color, stock, barcode 
-        FROM products 
-        WHERE stock > 0
-        ORDER BY category, name
-    ''')
+    body, etag = catalog_cache.get()
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+def get_products_page():
+    """Keyset page: ?limit=100&cursor=<next_cursor>&fields=id,name,price&category=Tops,Bottoms"""
+    try:
+        limit = min(max(int(request.args.get('limit', PAGE_SIZE_DEFAULT)), 1), PAGE_SIZE_MAX)
+        after = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError:
+        return jsonify({'success': False, 'error': 'limit must be a number and cursor a next_cursor value'}), 400
     
-    products = []
-    for row in cursor.fetchall():
-        products.append({
-            'id': row[0],
-            'name': row[1],
-            'category': row[2],
-            'price': float(row[3]),
-            'size': row[4],
-            'color': row[5],
-            'stock': row[6],
-            'barcode': row[7]
-        })
+    fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()] or list(PRODUCT_FIELDS)
+    unknown = [f for f in fields if f not in PRODUCT_FIELDS]
+    if unknown:
+        return jsonify({'success': False, 'error': f"Unknown field(s): {', '.join(unknown)}"}), 400
+    categories = [c.strip() for c in request.args.get('category', '').split(',') if c.strip()]
+    
+    products, next_cursor = product_page(db, after, limit, fields, categories)
+    
+    def stream():
+        yield '{"products":['
+        for i, product in enumerate(products):
+            yield (',' if i else '') + json.dumps(product, separators=(',', ':'))
+        yield '],"next_cursor":' + json.dumps(next_cursor) + '}'
     
-    conn.close()
-    return jsonify(products)
+    return Response(stream(), mimetype='application/json')
 
 @app.route('/api/product/barcode/<barcode>')
 def get_product_by_barcode(barcode):
-    """Get product by barcode"""
-    conn, db_type = get_db_connection()
-    cursor = conn.cursor()
-    
-    placeholder = '%s' if db_type == 'postgresql' else '?'
-    cursor.execute(f'''
-        SELECT id, name, category, price, size, color, stock, barcode 
-        FROM products 
-        WHERE barcode = {placeholder} AND stock > 0
-    ''', (barcode,))
+    """Get product by barcode (served from the in-memory barcode index)"""
+    product = catalog_cache.lookup(barcode)
     
-    row = cursor.fetchone()
-    conn.close()
+    if product is None:
+        # Miss: the product may have been added since our snapshot
+        with db.connection() as (conn, db_type):
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT {PRODUCT_COLUMNS}
+                FROM products 
+                WHERE barcode = {db.placeholder} AND stock > 0
+            ''', (barcode,))
+            row = cursor.fetchone()
+        if row:
+            catalog_cache.invalidate()
+            product = product_from_row(row)
     
-    if row:
+    if product:
         return jsonify({
             'success': True,
-            'product': {
-                'id': row[0],
-                'name': row[1],
-                'category': row[2],
-                'price': float(row[3]),
-                'size': row[4],
-                'color': row[5],
-                'stock': row[6],
-                'barcode': row[7]
-            }
+            'product': product
         })
     else:
         return jsonify({'success': False, 'error': 'Product not found'}), 404
 
+@app.route('/api/products/import', methods=['POST'])
+def import_products_endpoint():
+    """Bulk upsert products from a CSV (raw text/csv body or multipart 'file')"""
+    if request.headers.get('X-API-Key') != LOCAL_API_KEY:
+        return jsonify({'success': False, 'error': 'Invalid API key'}), 401
+    
+    upload = request.files.get('file')
+    raw = upload.stream if upload else request.stream
+    try:
+        report = import_products(db, io.TextIOWrapper(raw, encoding='utf-8-sig', newline=''))
+    except (CSVFormatError, UnicodeDecodeError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    catalog_cache.invalidate()
+    print(f"✓ Imported {report['imported']} products ({report['rejected_count']} rejected, "
+          f"{report['rows_per_second']} rows/sec)")
+    return jsonify({'success': True, **report})
+
+def display_qr_on_device(payload, report):
+    """Checkout job runner: ask the local service to render and show the QR.
+
+    The local service streams its progress as NDJSON lines, which are
+    relayed to report() so the till sees rendering/uploading as they happen.
+    """
+    terminal = local_service_for(payload.get('terminal_id'))
+    if not terminal:
+        raise CheckoutJobError('Payment terminal for this till not found. Please ensure the local service is running.')
+    
+    report('rendering')
+    try:
+        with local_client.post(
+            terminal.url, 'generate_qr',
+            json=dict(payload, slot=terminal.capabilities.get('qr_slot', 1)),
+            headers={'Accept': 'application/x-ndjson', 'X-API-Key': terminal.api_key},
+            stream=True
+        ) as local_response:
+            if local_response.status_code != 200:
+                raise CheckoutJobError(f'Local service returned status {local_response.status_code}')
+            
+            if 'application/x-ndjson' not in local_response.headers.get('Content-Type', ''):
+                # Older local service: single JSON reply once the QR is displayed
+                result = local_response.json()
+                if not result.get('success'):
+                    raise CheckoutJobError(result.get('error', 'Unknown error from local service'))
+                return
+            
+            for line in local_response.iter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                state = event.get('state')
+                if state == 'failed':
+                    raise CheckoutJobError(event.get('error', 'Unknown error from local service'))
+                if state == 'displayed':
+                    return
+                if state in ('rendering', 'uploading'):
+                    report(state)
+            raise CheckoutJobError('Local service closed the connection before the QR was displayed')
+    
+    except CircuitOpenError:
+        raise CheckoutJobError('Local payment device is offline. Please check the store computer and try again shortly.')
+    except requests.exceptions.ConnectionError:
+        report_terminal_failure(terminal)
+        raise CheckoutJobError('Cannot connect to local payment device. Please ensure the local service is running.')
+    except requests.exceptions.Timeout:
+        raise CheckoutJobError('Timeout connecting to local payment device.')
+
+checkout_jobs = CheckoutJobQueue(db, display_qr_on_device)
+
+def publish_job_event(job):
+    """Push checkout job state changes to the till that started the job"""
+    event_bus.publish(job['till_id'], 'job', job)
+    if job['state'] in ('displayed', 'failed'):
+        checkout_funnel.inc(job['state'])
+    if job['state'] == 'displayed':
+        publish_device_status('online', till_id=job['till_id'])
+    elif job['state'] == 'failed' and 'connect' in (job['error'] or '').lower():
+        publish_device_status('offline', job['error'], till_id=job['till_id'])
+
+checkout_jobs.subscribe(publish_job_event)
+
+def release_failed_job_stock(job):
+    """A QR that never reached the till cannot be paid: fail its checkout and give its stock back"""
+    if job['state'] != 'failed':
+        return
+    with db.connection() as (conn, db_type):
+        cursor = conn.cursor()
+        stock_levels = release_failed_checkout(cursor, db_type, job['transaction_id'])
+        catalog_version = record_stock_change(cursor) if stock_levels else None
+    if stock_levels:
+        catalog_cache.apply_stock_levels(stock_levels, catalog_version)
+
+checkout_jobs.subscribe(release_failed_job_stock)
+
+last_device_status = {}
+
+def publish_device_status(status, message=None, till_id=None):
+    """Tell a till (or every till) when its payment terminal goes offline or comes back"""
+    if last_device_status.get(till_id) == status:
+        return
+    last_device_status[till_id] = status
+    event_bus.publish(till_id, 'device', {'status': status, 'message': message})
+
+def request_till_id(data=None):
+    """Till identifier from the request body, X-Till-Id header or query string"""
+    till_id = (data or {}).get('till_id') or request.headers.get('X-Till-Id') or request.args.get('till')
+    return str(till_id) if till_id else DEFAULT_TILL_ID
+
 @app.route('/api/generate_qr', methods=['POST'])
 def generate_qr():
-    """Generate payment QR via local service"""
+    """Save the transaction and queue a job to show its payment QR"""
     try:
         data = request.json
         total_amount = data.get('amount')
@@ -295,103 +427,272 @@ def generate_qr():
         if not total_amount or total_amount <= 0:
             return jsonify({'error': 'Invalid amount'}), 400
         
-        # Calculate VAT
-        vat_rate = COMPANY_INFO['vat_rate']
-        subtotal = total_amount / (1 + vat_rate)
-        vat_amount = total_amount - subtotal
-        
-        # Generate receipt number
-        receipt_number = generate_receipt_number()
+        # A retried request with the same Idempotency-Key gets the original result back
+        idempotency_key = request.headers.get('Idempotency-Key')
+        if idempotency_key:
+            if len(idempotency_key) > MAX_KEY_LENGTH:
+                return jsonify({'error': f'Idempotency-Key is longer than {MAX_KEY_LENGTH} characters'}), 400
+            idempotency_key = f"{request_till_id(data)}:{idempotency_key}"
+            fingerprint = request_fingerprint(data)
         
-        # Save transaction to database
-        conn, db_type = get_db_connection()
-        cursor = conn.cursor()
-        
-        placeholder = '%s' if db_type == 'postgresql' else '?'
-        cursor.execute(f'''
-            INSERT INTO transactions (receipt_number, total_amount, subtotal, vat_amount, items_json, payment_method)
-            VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder})
-        ''', (receipt_number, total_amount, subtotal, vat_amount, json.dumps(cart_items), 'QR'))
+        # Calculate VAT
+        subtotal, vat_amount = split_vat(total_amount)
         
-        if db_type == 'postgresql':
-            cursor.execute('SELECT lastval()')
-            transaction_id = cursor.fetchone()[0]
-        else:
-            transaction_id = cursor.lastrowid
+        try:
+            if idempotency_key:
+                replay = find_idempotent_response(idempotency_key, fingerprint)
+                if replay:
+                    return replay
+            
+            release_abandoned_stock()
+            
+            # Hold a receipt number from this worker's reserved block (a block is reserved in its
+            # own transaction, never inside the checkout's); it goes back to the block unless the
+            # key is claimed, the stock reserved and the checkout committed
+            receipt_number = generate_receipt_number()
+            committed = False
+            try:
+                # Save transaction, its stock reservation, its display job and its idempotency key together
+                with db.connection() as (conn, db_type):
+                    cursor = conn.cursor()
+                    claimed = not idempotency_key or idempotency_store.claim(cursor, db_type, idempotency_key,
+                                                                             fingerprint)
+                    if claimed:
+                        transaction_id, receipt_number = save_transaction(
+                            cursor, db_type, receipt_number, total_amount, subtotal, vat_amount, cart_items
+                        )
+                        save_transaction_items(cursor, db_type, transaction_id, cart_items)
+                        stock_levels = reserve_stock(cursor, db_type, transaction_id, cart_items)
+                        catalog_version = record_stock_change(cursor) if stock_levels else None
+                        job_id = checkout_jobs.create(cursor, db_type, transaction_id)
+                        result = {
+                            'success': True,
+                            'transaction_id': transaction_id,
+                            'receipt_number': receipt_number,
+                            'job_id': job_id,
+                            'state': 'queued',
+                            'message': f'QR generated for MUR {total_amount:.2f}'
+                        }
+                        if idempotency_key:
+                            idempotency_store.save(cursor, db_type, idempotency_key, 202, result)
+                committed = claimed
+            finally:
+                if not committed:
+                    receipt_allocator.give_back(receipt_number)
+            
+            if not claimed:
+                # Another request with this key committed while we allocated
+                return (find_idempotent_response(idempotency_key, fingerprint)
+                        or (jsonify({'error': 'A request with this Idempotency-Key is in progress', 'in_progress': True}),
+                            409, {'Retry-After': '1'}))
+        except IdempotencyConflict as e:
+            return jsonify({'error': str(e)}), 422
+        except PoolTimeout:
+            # The database is up but every connection is busy: the till retries, it does not go offline
+            return jsonify({'error': 'Database busy, please try again'}), 503, {'Retry-After': '1'}
+        except OPERATIONAL_ERRORS as e:
+            if not database_unreachable(e):
+                raise  # locked, bad query, ...: a 500, not an offline sale
+            print(f"✗ Database unavailable ({e}); handing checkout to the local journal")
+            return offline_checkout(total_amount, cart_items, request_till_id(data), idempotency_key)
+        except InsufficientStock as e:
+            return jsonify({'error': str(e), 'shortages': e.shortages}), 409
         
-        conn.commit()
-        conn.close()
+        if stock_levels:
+            catalog_cache.apply_stock_levels(stock_levels, catalog_version)
         
-        # Call local service to generate and upload QR
-        local_url = find_local_service()
-        if not local_url:
-            return jsonify({'error': 'Local payment device not found. Please ensure the local service is running.'}), 500
+        # The device round trip happens in the background, on this till's terminal
+        till_id = request_till_id(data)
+        checkout_jobs.start(job_id, transaction_id, {
+            'amount': total_amount,
+            'transaction_id': transaction_id,
+            'receipt_number': receipt_number,
+            'terminal_id': till_id
+        }, till_id=till_id)
+        checkout_funnel.inc('queued')
         
-        try:
-            local_response = requests.post(
-                f"{local_url}/generate_qr",
-                json={
-                    'amount': total_amount,
-                    'transaction_id': transaction_id,
-                    'receipt_number': receipt_number
-                },
-                headers={'X-API-Key': LOCAL_API_KEY},
-                timeout=30
-            )
-            
-            if local_response.status_code == 200:
-                result = local_response.json()
-                if result.get('success'):
-                    return jsonify({
-                        'success': True,
-                        'transaction_id': transaction_id,
-                        'receipt_number': receipt_number,
-                        'message': f'QR generated for MUR {total_amount:.2f}'
-                    })
-                else:
-                    return jsonify({'error': result.get('error', 'Unknown error from local service')}), 500
-            else:
-                return jsonify({'error': f'Local service returned status {local_response.status_code}'}), 500
-                
-        except requests.exceptions.ConnectionError:
-            return jsonify({'error': 'Cannot connect to local payment device. Please ensure the local service is running.'}), 500
-        except requests.exceptions.Timeout:
-            return jsonify({'error': 'Timeout connecting to local payment device.'}), 500
-        except Exception as e:
-            return jsonify({'error': f'Error communicating with local device: {str(e)}'}), 500
+        return jsonify(result), 202
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def find_idempotent_response(key, fingerprint):
+    """Stored response for a retried checkout, marked as a replay, or None"""
+    with db.connection() as (conn, db_type):
+        stored = idempotency_store.lookup(conn.cursor(), db_type, key, fingerprint)
+    if not stored:
+        return None
+    status_code, body = stored
+    checkout_funnel.inc('replayed')
+    response = jsonify(body)
+    response.status_code = status_code
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+def offline_checkout(total_amount, cart_items, till_id, idempotency_key=None):
+    """Have the till's local service journal the checkout and show its QR; synced back later.
+
+    The (till-scoped) Idempotency-Key becomes the journal's client_ref, so
+    a retried checkout reuses its journal entry instead of adding another.
+    """
+    terminal = local_service_for(till_id)
+    if not terminal:
+        return jsonify({'error': 'Database and local service are both unavailable'}), 503
+    
+    try:
+        response = local_client.post(terminal.url, 'checkout', json={
+            'amount': total_amount,
+            'items': cart_items,
+            'slot': terminal.capabilities.get('qr_slot', 1),
+            'client_ref': idempotency_key
+        }, headers={'X-API-Key': terminal.api_key})
+        result = response.json()
+    except requests.exceptions.ConnectionError:
+        report_terminal_failure(terminal)
+        return jsonify({'error': 'Database and local service are both unavailable'}), 503
+    
+    if not result.get('success'):
+        return jsonify({'error': result.get('error', 'Offline checkout failed')}), 500
+    
+    checkout_funnel.inc('offline')
+    return jsonify({
+        'success': True,
+        'offline': True,
+        'client_ref': result['client_ref'],
+        'transaction_id': None,
+        'receipt_number': None,
+        'state': 'displayed',
+        'message': f'QR generated for MUR {total_amount:.2f} (offline, saved on the store PC)'
+    })
+
+@app.route('/api/sync/transactions', methods=['POST'])
+def sync_transactions():
+    """Record checkouts journaled by the local service; safe to repeat per client_ref"""
+    if request.headers.get('X-API-Key') != LOCAL_API_KEY:
+        return jsonify({'success': False, 'error': 'Invalid API key'}), 401
+    
+    entries = (request.json or {}).get('transactions', [])
+    # Receipt numbers are reserved in their own transactions, so they are taken
+    # before the sync transaction opens (only for entries not synced before)
+    synced = synced_client_refs([entry['client_ref'] for entry in entries])
+    receipt_numbers = {entry['client_ref']: generate_receipt_number()
+                       for entry in entries if entry['client_ref'] not in synced}
+    results = []
+    with db.connection() as (conn, db_type):
+        cursor = conn.cursor()
+        for entry in entries:
+            results.append(apply_offline_entry(cursor, db_type, entry, receipt_numbers.get(entry['client_ref'])))
+    
+    for result in results:
+        receipt_cache.invalidate(result['transaction_id'])
+    if any(result['status'] == 'completed' for result in results):
+        catalog_cache.invalidate()  # offline sales take their stock on completion
+    return jsonify({'success': True, 'results': results})
+
+def synced_client_refs(client_refs):
+    """The client_refs among these that already have a transaction"""
+    if not client_refs:
+        return set()
+    with db.connection() as (conn, db_type):
+        placeholder = '%s' if db_type == 'postgresql' else '?'
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT client_ref FROM offline_sync WHERE client_ref IN ({", ".join([placeholder] * len(client_refs))})',
+                       client_refs)
+        return {row[0] for row in cursor.fetchall()}
+
+def apply_offline_entry(cursor, db_type, entry, receipt_number):
+    """Create (once) and complete (once) the transaction for one journal entry.
+
+    receipt_number is used if the transaction has to be created; it must be
+    allocated before the caller's transaction (see ReceiptAllocator).
+    """
+    placeholder = '%s' if db_type == 'postgresql' else '?'
+    client_ref = entry['client_ref']
+    cursor.execute(f'''
+        SELECT o.transaction_id, t.receipt_number
+        FROM offline_sync o JOIN transactions t ON t.id = o.transaction_id
+        WHERE o.client_ref = {placeholder}
+    ''', (client_ref,))
+    row = cursor.fetchone()
+    
+    if row:
+        transaction_id, receipt_number = row
+    else:
+        total_amount = float(entry['amount'])
+        subtotal, vat_amount = split_vat(total_amount)
+        items = entry.get('items') or []
+        if receipt_number is None:
+            # Counted as synced before this transaction, but its row is gone
+            raise ValueError(f"No receipt number allocated for journal entry {client_ref}")
+        transaction_id, receipt_number = save_transaction(
+            cursor, db_type, receipt_number, total_amount, subtotal, vat_amount, items
+        )
+        cursor.execute(f'UPDATE transactions SET timestamp = {placeholder} WHERE id = {placeholder}',
+                       (entry['created_at'], transaction_id))
+        save_transaction_items(cursor, db_type, transaction_id, items)
+        cursor.execute(f'INSERT INTO offline_sync (client_ref, transaction_id) VALUES ({placeholder}, {placeholder})',
+                       (client_ref, transaction_id))
+    
+    if entry.get('status') == 'completed' and complete_transaction(cursor, db_type, transaction_id):
+        if commit_stock(cursor, db_type, transaction_id):
+            record_stock_change(cursor)
+    
+    return {
+        'client_ref': client_ref,
+        'transaction_id': transaction_id,
+        'receipt_number': receipt_number,
+        'status': entry.get('status', 'pending')
+    }
+
+@app.route('/api/checkout_job/<job_id>')
+def get_checkout_job(job_id):
+    """Get the display state of a checkout job"""
+    job = checkout_jobs.get(job_id)
+    if job:
+        return jsonify({'success': True, 'job': job})
+    else:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+
 @app.route('/api/payment_complete', methods=['POST'])
 def payment_complete():
     """Mark payment as complete"""
     try:
         data = request.json
         transaction_id = data.get('transaction_id')
+        client_ref = data.get('client_ref')
         
-        # Update transaction status
-        conn, db_type = get_db_connection()
-        cursor = conn.cursor()
+        if client_ref and not transaction_id:
+            return offline_payment_complete(client_ref, request_till_id(data))
         
-        placeholder = '%s' if db_type == 'postgresql' else '?'
-        cursor.execute(f'''
-            UPDATE transactions 
-            SET status = 'completed' 
-            WHERE id = {placeholder}
-        ''', (transaction_id,))
-        conn.commit()
-        conn.close()
+        # Update transaction status, its stock and the sales rollups together
+        stock_levels = {}
+        with db.connection() as (conn, db_type):
+            cursor = conn.cursor()
+            newly_completed = complete_transaction(cursor, db_type, transaction_id)
+            if newly_completed:
+                stock_levels = commit_stock(cursor, db_type, transaction_id)
+                catalog_version = record_stock_change(cursor) if stock_levels else None
         
-        # Notify local service to restart rotation
-        local_url = find_local_service()
-        if local_url:
+        if stock_levels:
+            catalog_cache.apply_stock_levels(stock_levels, catalog_version)
+        if newly_completed:
+            receipt_cache.invalidate(transaction_id)
+            checkout_funnel.inc('completed')
+        event_bus.publish(request_till_id(data), 'payment', {
+            'transaction_id': transaction_id,
+            'status': 'completed'
+        })
+        
+        # Notify the till's local service to restart rotation
+        terminal = local_service_for(request_till_id(data))
+        if terminal:
             try:
-                requests.post(
-                    f"{local_url}/payment_complete",
+                # Restarting rotation twice is harmless, so this may be retried
+                local_client.post(
+                    terminal.url, 'payment_complete',
+                    idempotent=True,
                     json={'transaction_id': transaction_id},
-                    headers={'X-API-Key': LOCAL_API_KEY},
-                    timeout=10
+                    headers={'X-API-Key': terminal.api_key}
                 )
             except:
                 pass  # Don't fail if local service is offline
@@ -401,38 +702,152 @@ def payment_complete():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def offline_payment_complete(client_ref, till_id):
+    """Completion of an offline checkout is journaled on the store PC and synced later"""
+    terminal = local_service_for(till_id)
+    if not terminal:
+        return jsonify({'error': 'Local service unavailable'}), 503
+    try:
+        local_client.post(terminal.url, 'payment_complete', idempotent=True, json={'client_ref': client_ref},
+                          headers={'X-API-Key': terminal.api_key})
+    except CircuitOpenError:
+        return jsonify({'error': 'Local payment device is offline. Please check the store computer and try again shortly.',
+                        'breaker': local_client.breaker_state(terminal.url)}), 503
+    except requests.exceptions.ConnectionError:
+        report_terminal_failure(terminal)
+        publish_device_status('offline', 'Cannot connect to local payment device', till_id=till_id)
+        return jsonify({'error': 'Cannot connect to local payment device. Please ensure the local service is running.'}), 503
+    checkout_funnel.inc('completed')
+    return jsonify({'success': True, 'offline': True, 'message': 'Payment completed (will sync when online)'})
+
 @app.route('/api/receipt/<int:transaction_id>')
 def get_receipt(transaction_id):
     """Get receipt data for a transaction"""
-    conn, db_type = get_db_connection()
-    cursor = conn.cursor()
+    return receipt_response(receipt_cache.get(transaction_id=transaction_id) or load_receipt('id', transaction_id))
+
+@app.route('/api/receipt/number/<receipt_number>')
+def get_receipt_by_number(receipt_number):
+    """Get receipt data by receipt number (e.g. BS-000042)"""
+    return receipt_response(receipt_cache.get(receipt_number=receipt_number) or load_receipt('receipt_number', receipt_number))
+
+RECEIPT_COLUMNS = 'receipt_number, total_amount, subtotal, vat_amount, items_json, timestamp, payment_method, id, status'
+
+def load_receipt(column, value):
+    """Read and serialize a receipt; completed receipts are cached. Returns (body, etag) or None"""
+    with db.connection() as (conn, db_type):
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT {RECEIPT_COLUMNS}
+            FROM transactions 
+            WHERE {column} = {db.placeholder}
+        ''', (value,))
+        row = cursor.fetchone()
     
-    placeholder = '%s' if db_type == 'postgresql' else '?'
-    cursor.execute(f'''
-        SELECT receipt_number, total_amount, subtotal, vat_amount, items_json, timestamp, payment_method
-        FROM transactions 
-        WHERE id = {placeholder}
-    ''', (transaction_id,))
+    return receipt_from_row(row) if row else None
+
+def receipt_from_row(row):
+    """(body, etag) for a transactions row selected with RECEIPT_COLUMNS; completed receipts are cached"""
+    body = json.dumps({
+        'success': True,
+        'receipt': {
+            'receipt_number': row[0],
+            'total_amount': float(row[1]),
+            'subtotal': float(row[2]),
+            'vat_amount': float(row[3]),
+            'items': json.loads(row[4]),
+            'timestamp': str(row[5]),
+            'payment_method': row[6],
+            'company': COMPANY_INFO
+        }
+    }, separators=(',', ':')).encode('utf-8')
+    if row[8] == 'completed':
+        return body, receipt_cache.put(row[7], row[0], body)
+    return body, None
+
+def receipt_response(receipt):
+    """JSON response for a (body, etag) receipt; 304 when the client's copy is current"""
+    if receipt is None:
+        return jsonify({'success': False, 'error': 'Receipt not found'}), 404
+    body, etag = receipt
+    response = app.response_class(body, mimetype='application/json')
+    if etag:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+    response.headers['Cache-Control'] = 'no-store'  # pending receipts still change
+    return response
+
+def report_range():
+    """Validated ?from=YYYY-MM-DD&to=YYYY-MM-DD for the report endpoints"""
+    dates = []
+    for name in ('from', 'to'):
+        value = request.args.get(name)
+        if value:
+            datetime.strptime(value, '%Y-%m-%d')  # ValueError -> 400
+        dates.append(value)
+    return dates
+
+@app.route('/api/reports/daily')
+def report_daily():
+    """Revenue, VAT and units per day (from the sales_daily rollup)"""
+    try:
+        start, end = report_range()
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Dates must be YYYY-MM-DD'}), 400
+    return jsonify({'success': True, 'days': daily_report(db, start, end)})
+
+@app.route('/api/reports/hourly')
+def report_hourly():
+    """Revenue, VAT and units per hour (from the sales_hourly rollup)"""
+    try:
+        start, end = report_range()
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Dates must be YYYY-MM-DD'}), 400
+    return jsonify({'success': True, 'hours': hourly_report(db, start, end)})
+
+@app.route('/api/reports/products')
+def report_products():
+    """Best-selling products over a date range (from the product_sales_daily rollup)"""
+    try:
+        start, end = report_range()
+        limit = min(int(request.args.get('limit', 50)), 500)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Dates must be YYYY-MM-DD and limit a number'}), 400
+    return jsonify({'success': True, 'products': product_report(db, start, end, limit)})
+
+@app.route('/api/reports/categories')
+def report_categories():
+    """Sales per category over a date range (from the product_sales_daily rollup)"""
+    try:
+        start, end = report_range()
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Dates must be YYYY-MM-DD'}), 400
+    return jsonify({'success': True, 'categories': category_report(db, start, end)})
+
+@app.route('/api/events')
+def events():
+    """Server-Sent Events stream of job, payment and device status for one till"""
+    try:
+        subscription = event_bus.subscribe(request_till_id(), limit=SSE_MAX_STREAMS)
+    except TooManyStreams:
+        # Every stream would hold a thread checkouts need; the page polls its job until it reconnects
+        return Response(f"retry: {SSE_BUSY_RETRY_SECONDS * 1000}\n\n", status=503, mimetype='text/event-stream',
+                        headers={'Retry-After': str(SSE_BUSY_RETRY_SECONDS), 'Cache-Control': 'no-cache'})
     
-    row = cursor.fetchone()
-    conn.close()
+    def stream():
+        deadline = time.monotonic() + SSE_MAX_SECONDS
+        try:
+            yield "retry: 2000\n\n"
+            while time.monotonic() < deadline:
+                event = subscription.next_event(timeout=SSE_HEARTBEAT_SECONDS)
+                yield format_sse(event) if event else ": keepalive\n\n"
+        finally:
+            event_bus.unsubscribe(subscription)
     
-    if row:
-        return jsonify({
-            'success': True,
-            'receipt': {
-                'receipt_number': row[0],
-                'total_amount': float(row[1]),
-                'subtotal': float(row[2]),
-                'vat_amount': float(row[3]),
-                'items': json.loads(row[4]),
-                'timestamp': str(row[5]),
-                'payment_method': row[6],
-                'company': COMPANY_INFO
-            }
-        })
-    else:
-        return jsonify({'success': False, 'error': 'Receipt not found'}), 404
+    return Response(stream_with_context(stream()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
 
 @app.route('/api/company_info')
 def get_company_info():
@@ -441,38 +856,91 @@ def get_company_info():
 
 @app.route('/api/local_status')
 def local_status():
-    """Check if local service is online"""
-    local_url = find_local_service()
-    if not local_url:
-        return jsonify({'status': 'offline', 'message': 'Local service not found on any port'})
+    """Check if this till's local service is online"""
+    till_id = request_till_id()
+    terminal = local_service_for(till_id)
+    if not terminal:
+        publish_device_status('offline', 'Local service not found', till_id=till_id)
+        return jsonify({'status': 'offline', 'message': 'Local service not found'})
     
+    local_url = terminal.url
     try:
-        response = requests.get(
-            f"{local_url}/health",
-            timeout=5
-        )
+        response = local_client.get(local_url, 'health', headers={'X-API-Key': terminal.api_key})
         if response.status_code == 200:
             data = response.json()
             data['url'] = local_url  # Include the URL we found
-            return jsonify({'status': 'online', 'data': data})
+            data['terminal_id'] = terminal.id
+            publish_device_status('online', till_id=till_id)
+            return jsonify({'status': 'online', 'data': data, 'breaker': local_client.breaker_state(local_url)})
         else:
-            return jsonify({'status': 'error', 'message': f'Local service returned status {response.status_code}'})
+            return jsonify({'status': 'error', 'message': f'Local service returned status {response.status_code}',
+                            'breaker': local_client.breaker_state(local_url)})
+    except CircuitOpenError as e:
+        return jsonify({'status': 'offline', 'message': str(e), 'breaker': local_client.breaker_state(local_url)})
     except requests.exceptions.ConnectionError:
-        return jsonify({'status': 'offline', 'message': 'Cannot connect to local payment device'})
+        report_terminal_failure(terminal)
+        publish_device_status('offline', 'Cannot connect to local payment device', till_id=till_id)
+        return jsonify({'status': 'offline', 'message': 'Cannot connect to local payment device',
+                        'breaker': local_client.breaker_state(local_url)})
     except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)})
+        return jsonify({'status': 'error', 'message': str(e), 'breaker': local_client.breaker_state(local_url)})
+
+@app.route('/api/terminals/heartbeat', methods=['POST'])
+def terminal_heartbeat():
+    """Register or refresh a till's terminal (called by its local service)"""
+    data = request.json or {}
+    terminal_id = data.get('terminal_id')
+    url = data.get('url')
+    if not terminal_id or not url:
+        return jsonify({'success': False, 'error': 'terminal_id and url are required'}), 400
+    
+    # The shared key may register any terminal; a terminal's own key only refreshes itself
+    api_key = request.headers.get('X-API-Key')
+    existing = terminal_registry.get(terminal_id)
+    if api_key != LOCAL_API_KEY and not (existing and api_key == existing.api_key):
+        return jsonify({'success': False, 'error': 'Invalid API key'}), 401
+    
+    terminal = terminal_registry.heartbeat(terminal_id, url, data.get('api_key') or api_key,
+                                           data.get('capabilities'))
+    return jsonify({'success': True, 'terminal_id': terminal.id})
+
+@app.route('/api/terminals')
+def list_terminals():
+    """Registered terminals with their capabilities and heartbeat age"""
+    now = time.time()
+    return jsonify({'success': True, 'terminals': [{
+        'terminal_id': terminal.id,
+        'url': terminal.url,
+        'capabilities': terminal.capabilities,
+        'online': is_online(terminal),
+        'last_heartbeat_seconds': round(now - terminal.last_heartbeat, 1)
+    } for terminal in terminal_registry.all()]})
 
 @app.route('/health')
 def health():
     """Health check endpoint for Railway"""
-    return jsonify({'status': 'healthy', 'service': 'Body & Soul Cloud POS'})
+    return jsonify({
+        'status': 'healthy',
+        'service': 'Body & Soul Cloud POS',
+        'db_pool': db.stats(),
+        'events': event_bus.stats(),
+        'receipt_cache': receipt_cache.stats(),
+        'local_service': local_discovery.status()
+    })
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus metrics for this worker"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/init_db')
 def init_db_endpoint():
     """Initialize database - call this once after deployment"""
     try:
-        init_db()
-        return jsonify({'success': True, 'message': 'Database initialized successfully'})
+        applied = init_db()
+        return jsonify({'success': True, 'message': 'Database initialized successfully',
+                        'applied': [{'version': version, 'name': name} for version, name in applied],
+                        'schema_version': LATEST_VERSION})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -492,16 +960,6 @@ if __name__ == '__main__':
     print(f"POS Interface: http://localhost:{port}")
     print(f"Local Service Ports: {LOCAL_SERVICE_PORTS}")
     print("="*60)
-    
-    # Initialize database
-    print("Initializing database...")
-    try:
-        init_db()
-        print("✓ Database initialized successfully")
-    except Exception as e:
-        print(f"✗ Database initialization failed: {e}")
-    
-    print("="*60)
     print("Checking for local service...")
     local_url = find_local_service()
     if local_url:
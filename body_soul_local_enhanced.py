@@ -4,16 +4,25 @@ This service runs on the store computer and handles ESP32 communication.
 It provides a simple HTTP API for the cloud service to call.
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 import os
+import json
+import threading
 from datetime import datetime
 import logging
+from transaction_journal import TransactionJournal, JournalSync
+from terminals import TerminalHeartbeat
+from zwennpay import zwennpay_client
 
 app = Flask(__name__)
 
 # Configuration
 API_KEY = os.getenv('LOCAL_API_KEY', 'dev-key-12345')
 COM_PORT = os.getenv('COM_PORT', 'COM3')
+CLOUD_URL = os.getenv('CLOUD_URL')  # where journaled offline checkouts are synced to
+TERMINAL_ID = os.getenv('TERMINAL_ID', 'main')  # the till this service's ESP32 belongs to
+LOCAL_PUBLIC_URL = os.getenv('LOCAL_PUBLIC_URL')  # how the cloud reaches this service
+QR_SLOT = int(os.getenv('QR_SLOT', 1))  # device slot the payment QR is shown in
 
 # Setup logging
 logging.basicConfig(
@@ -25,6 +34,16 @@ logger = logging.getLogger(__name__)
 # Global ESP32 connection
 global_uploader = None
 
+# Durable record of every checkout shown on the device, synced to the cloud
+journal = TransactionJournal()
+journal_sync = JournalSync(journal, CLOUD_URL, API_KEY)
+
+# One QR render/upload at a time: there is a single serial link and QR slot
+device_lock = threading.Lock()
+
+class DisplayError(Exception):
+    """QR could not be shown on the device"""
+
 def verify_api_key():
     """Verify API key from request"""
     api_key = request.headers.get('X-API-Key')
@@ -70,65 +89,133 @@ def health():
         'service': 'Body & Soul Local Service',
         'device': device_status,
         'com_port': COM_PORT,
+        'journal': journal.stats(),
+        'sync': journal_sync.status(),
+        'zwennpay': zwennpay_client.stats(),
         'timestamp': datetime.now().isoformat()
     })
 
+def display_qr(amount, receipt_number, slot=QR_SLOT):
+    """Generate the payment QR and show it on the ESP32, yielding progress states"""
+    with device_lock:
+        logger.info(f"Generating QR for MUR {amount} (Receipt: {receipt_number})")
+        yield 'rendering'
+        
+        # Render the QR screen in memory (no temp file)
+        from payment_qr import render_payment_qr
+        screen = render_payment_qr(amount)
+        
+        if not screen:
+            logger.error("Failed to generate QR code")
+            raise DisplayError('Failed to generate QR code')
+        
+        # Upload to ESP32
+        uploader = get_uploader()
+        if not uploader:
+            logger.error("ESP32 not connected")
+            raise DisplayError('ESP32 device not connected')
+        
+        logger.info("Uploading QR to ESP32...")
+        yield 'uploading'
+        jpeg, size = screen
+        success = uploader.upload_image(jpeg, slot, chunk_size=1024, size=size)
+        
+        if not success:
+            logger.error("Failed to upload QR to ESP32")
+            raise DisplayError('Failed to upload QR to device')
+        
+        logger.info("QR uploaded successfully, stopping rotation")
+        try:
+            uploader.stop_rotation()
+        except Exception as e:
+            logger.warning(f"Could not stop rotation: {e}")
+        
+        yield 'displayed'
+
 @app.route('/generate_qr', methods=['POST'])
 def generate_qr():
-    """Generate and upload QR code to ESP32"""
+    """Generate and upload QR code to ESP32.
+
+    Clients that accept application/x-ndjson get one line per progress
+    state ('rendering', 'uploading', 'displayed' or 'failed').
+    """
     try:
         data = request.json
         amount = data.get('amount')
         transaction_id = data.get('transaction_id')
         receipt_number = data.get('receipt_number')
+        slot = int(data.get('slot', QR_SLOT))
         
         if not amount or amount <= 0:
             return jsonify({'error': 'Invalid amount'}), 400
         
-        logger.info(f"Generating QR for MUR {amount} (Receipt: {receipt_number})")
+        journal.record(amount, data.get('items'), transaction_id=transaction_id, receipt_number=receipt_number)
         
-        # Generate QR code
-        from payment_qr import generate_payment_qr_with_amount
-        qr_filename = generate_payment_qr_with_amount(amount)
+        if 'application/x-ndjson' in request.headers.get('Accept', ''):
+            def progress():
+                try:
+                    for state in display_qr(amount, receipt_number, slot):
+                        yield json.dumps({'state': state, 'transaction_id': transaction_id}) + '\n'
+                except Exception as e:
+                    logger.error(f"Error in generate_qr: {e}")
+                    yield json.dumps({'state': 'failed', 'error': str(e), 'transaction_id': transaction_id}) + '\n'
+            return Response(stream_with_context(progress()), mimetype='application/x-ndjson')
         
-        if not qr_filename:
-            logger.error("Failed to generate QR code")
-            return jsonify({'error': 'Failed to generate QR code'}), 500
+        try:
+            for state in display_qr(amount, receipt_number, slot):
+                pass
+        except DisplayError as e:
+            return jsonify({'error': str(e)}), 500
         
-        # Upload to ESP32
-        uploader = get_uploader()
-        if not uploader:
-            logger.error("ESP32 not connected")
-            return jsonify({'error': 'ESP32 device not connected'}), 500
+        return jsonify({
+            'success': True,
+            'message': f'QR code uploaded for MUR {amount}',
+            'transaction_id': transaction_id,
+            'receipt_number': receipt_number
+        })
         
-        logger.info("Uploading QR to ESP32...")
-        success = uploader.upload_image(qr_filename, 1, chunk_size=1024)
+    except Exception as e:
+        logger.error(f"Error in generate_qr: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/checkout', methods=['POST'])
+def offline_checkout():
+    """Journal a checkout and show its QR while the cloud database is unreachable.
+
+    The journal entry is written before the QR is shown and is synced to
+    the cloud (which assigns the receipt number) once it is reachable.
+    The cloud passes the checkout's Idempotency-Key as client_ref, so a
+    retried request reuses its entry.
+    """
+    try:
+        data = request.json
+        amount = data.get('amount')
         
-        if success:
-            logger.info("QR uploaded successfully, stopping rotation")
-            try:
-                uploader.stop_rotation()
-            except Exception as e:
-                logger.warning(f"Could not stop rotation: {e}")
-            
-            # Clean up temp file
-            try:
-                os.remove(qr_filename)
-            except:
+        if not amount or amount <= 0:
+            return jsonify({'error': 'Invalid amount'}), 400
+        
+        client_ref = journal.record(amount, data.get('items'), client_ref=data.get('client_ref'))
+        logger.info(f"Offline checkout {client_ref} journaled for MUR {amount}")
+        
+        try:
+            for state in display_qr(amount, client_ref, int(data.get('slot', QR_SLOT))):
                 pass
-            
-            return jsonify({
-                'success': True,
-                'message': f'QR code uploaded for MUR {amount}',
-                'transaction_id': transaction_id,
-                'receipt_number': receipt_number
-            })
-        else:
-            logger.error("Failed to upload QR to ESP32")
-            return jsonify({'error': 'Failed to upload QR to device'}), 500
+        except Exception as e:
+            # No QR, no sale: keep it out of the sync so it never takes a receipt number
+            logger.error(f"Offline checkout {client_ref} not displayed: {e}")
+            journal.mark_display_failed(client_ref, e)
+            return jsonify({'error': str(e), 'client_ref': client_ref}), 500
+        
+        journal_sync.wake()
+        return jsonify({
+            'success': True,
+            'offline': True,
+            'client_ref': client_ref,
+            'message': f'QR code uploaded for MUR {amount} (saved on the store PC until the cloud is back)'
+        })
         
     except Exception as e:
-        logger.error(f"Error in generate_qr: {e}")
+        logger.error(f"Error in offline checkout: {e}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/payment_complete', methods=['POST'])
@@ -137,8 +224,12 @@ def payment_complete():
     try:
         data = request.json
         transaction_id = data.get('transaction_id')
+        client_ref = data.get('client_ref')
         
-        logger.info(f"Payment completed for transaction {transaction_id}")
+        if client_ref and journal.mark_completed(client_ref):
+            journal_sync.wake()
+        
+        logger.info(f"Payment completed for transaction {transaction_id or client_ref}")
         
         uploader = get_uploader()
         if uploader:
@@ -164,22 +255,16 @@ def upload_image():
         file = request.files['image']
         slot = request.form.get('slot', 2, type=int)
         
-        # Save temporarily
-        temp_path = f"temp_upload_{slot}.jpg"
-        file.save(temp_path)
+        # Kept in memory; no temp file
+        image_bytes = file.read()
         
         # Upload to ESP32
         uploader = get_uploader()
         if not uploader:
             return jsonify({'error': 'ESP32 device not connected'}), 500
         
-        success = uploader.upload_image(temp_path, slot, chunk_size=1024)
-        
-        # Clean up
-        try:
-            os.remove(temp_path)
-        except:
-            pass
+        with device_lock:
+            success = uploader.upload_image(image_bytes, slot, chunk_size=1024)
         
         if success:
             return jsonify({'success': True, 'message': f'Image uploaded to slot {slot}'})
@@ -218,6 +303,16 @@ def stop_rotation():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def terminal_capabilities():
+    """What this terminal can do, sent to the cloud with each heartbeat"""
+    return {
+        'device': 'connected' if global_uploader else 'disconnected',
+        'com_port': COM_PORT,
+        'qr_slot': QR_SLOT,
+        'screen': [320, 480],
+        'offline_checkout': True
+    }
+
 def find_available_port(start_port=8080, max_attempts=10):
     """Find an available port"""
     import socket
@@ -262,6 +357,14 @@ if __name__ == '__main__':
         print("  - COM port is correct")
         print("  - No other program is using the port")
     
+    # Composite the payment screen layouts once, before the first checkout
+    from screen_templates import screen_templates
+    print(f"✓ Screen layouts ready: {', '.join(screen_templates().templates)}")
+    
+    journal_sync.start()
+    TerminalHeartbeat(CLOUD_URL, TERMINAL_ID, LOCAL_PUBLIC_URL or f"http://localhost:{port}",
+                      API_KEY, terminal_capabilities).start()
+    
     print("="*60)
     print("Local service is ready!")
     print("="*60)
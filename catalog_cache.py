@@ -0,0 +1,297 @@
+"""
+Body & Soul POS - Product Catalog Cache
+Keeps the in-stock catalog as pre-serialized JSON per worker, keyed by a
+catalog version stored in the database. Any product/stock write bumps the
+version; workers re-check it at most once per CATALOG_CACHE_TTL seconds.
+The same snapshot backs a barcode -> product hash index for scans.
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+
+CATALOG_CACHE_TTL = float(os.getenv('CATALOG_CACHE_TTL', 30))  # seconds
+
+PRODUCT_COLUMNS = 'id, name, category, price, size, color, stock, barcode'
+PRODUCT_FIELDS = tuple(PRODUCT_COLUMNS.split(', '))
+PAGE_SIZE_DEFAULT = 100
+PAGE_SIZE_MAX = 1000
+
+
+def product_from_row(row):
+    """Build the API dict for a products row selected with PRODUCT_COLUMNS"""
+    return {
+        'id': row[0],
+        'name': row[1],
+        'category': row[2],
+        'price': float(row[3]),
+        'size': row[4],
+        'color': row[5],
+        'stock': row[6],
+        'barcode': row[7]
+    }
+
+
+def ensure_catalog_version(cursor, db_type):
+    """Create the single-row catalog_version table if missing"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS catalog_version (
+            id INTEGER PRIMARY KEY,
+            version BIGINT NOT NULL
+        )
+    ''')
+    if db_type == 'postgresql':
+        cursor.execute('INSERT INTO catalog_version (id, version) VALUES (1, 1) ON CONFLICT (id) DO NOTHING')
+    else:
+        cursor.execute('INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 1)')
+
+
+def ensure_product_listing_index(cursor):
+    """Index matching the listing order so keyset pages are index range scans"""
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_listing ON products (category, name, id)')
+
+
+def encode_cursor(category, name, product_id):
+    """Opaque page cursor for the last (category, name, id) returned"""
+    raw = json.dumps([category, name, product_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor_text):
+    """(category, name, id) from encode_cursor(); raises ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor_text + '=' * (-len(cursor_text) % 4))
+        category, name, product_id = json.loads(raw)
+        return str(category), str(name), int(product_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def product_page(database, after=None, limit=PAGE_SIZE_DEFAULT, fields=PRODUCT_FIELDS, categories=None):
+    """One keyset page of in-stock products ordered by (category, name, id).
+
+    Returns (products projected to fields, next cursor or None). Only
+    limit + 1 rows are read, however large the catalog is.
+    """
+    placeholder = database.placeholder
+    columns = list(dict.fromkeys(('id', 'name', 'category') + tuple(fields)))
+    clauses, params = ['stock > 0'], []
+    if categories:
+        clauses.append(f"category IN ({', '.join([placeholder] * len(categories))})")
+        params.extend(categories)
+    if after:
+        clauses.append(f"(category, name, id) > ({placeholder}, {placeholder}, {placeholder})")
+        params.extend(after)
+
+    with database.connection() as (conn, db_type):
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT {', '.join(columns)}
+            FROM products
+            WHERE {' AND '.join(clauses)}
+            ORDER BY category, name, id
+            LIMIT {placeholder}
+        ''', params + [limit + 1])
+        rows = cursor.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = dict(zip(columns, rows[-1]))
+        next_cursor = encode_cursor(last['category'], last['name'], last['id'])
+
+    products = []
+    for row in rows:
+        product = dict(zip(columns, row))
+        if 'price' in product:
+            product['price'] = float(product['price'])
+        products.append({field: product[field] for field in fields})
+    return products, next_cursor
+
+
+def bump_catalog_version(cursor):
+    """Mark the catalog as changed; call in the same transaction as the product write"""
+    cursor.execute('UPDATE catalog_version SET version = version + 1 WHERE id = 1')
+
+
+def read_catalog_version(cursor):
+    """Current catalog version number"""
+    cursor.execute('SELECT version FROM catalog_version WHERE id = 1')
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+class CatalogCache:
+    """Process-local cache of the /api/products body and barcode index"""
+
+    def __init__(self, database, ttl=CATALOG_CACHE_TTL):
+        self.database = database
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._version = None
+        self._products = []
+        self._by_barcode = {}
+        self._body = None
+        self._etag = None
+        self._expires = 0.0
+        self._table_ready = False
+        self._async_refresh_lock = None
+        self.hits = 0
+        self.rebuilds = 0
+
+    def _fresh(self):
+        return self._body is not None and time.monotonic() < self._expires
+
+    def _ensure_fresh(self):
+        """Revalidate against the DB if the TTL has expired"""
+        with self._lock:
+            if self._fresh():
+                self.hits += 1
+                return
+
+        # One thread revalidates; the others wait and reuse its result
+        with self._refresh_lock:
+            with self._lock:
+                if self._fresh():
+                    self.hits += 1
+                    return
+            self._refresh()
+
+    def get(self):
+        """Return (json_bytes, etag) for the in-stock catalog"""
+        self._ensure_fresh()
+        with self._lock:
+            return self._body, self._etag
+
+    def lookup(self, barcode):
+        """Return the in-stock product dict for a barcode, or None"""
+        self._ensure_fresh()
+        with self._lock:
+            return self._by_barcode.get(barcode)
+
+    def _refresh(self):
+        """Re-read the version and rebuild the body only if it changed"""
+        with self.database.connection() as (conn, db_type):
+            cursor = conn.cursor()
+            if not self._table_ready:
+                ensure_catalog_version(cursor, db_type)
+                self._table_ready = True
+            version = read_catalog_version(cursor)
+
+            if version == self._version and self._body is not None:
+                with self._lock:
+                    self._expires = time.monotonic() + self.ttl
+                return
+
+            cursor.execute(f'''
+                SELECT {PRODUCT_COLUMNS}
+                FROM products
+                WHERE stock > 0
+                ORDER BY category, name
+            ''')
+            products = [product_from_row(row) for row in cursor.fetchall()]
+
+        with self._lock:
+            self._install(products, version)
+
+    async def get_async(self, database):
+        """get() for the ASGI app, revalidating through an AsyncDatabase"""
+        await self._ensure_fresh_async(database)
+        with self._lock:
+            return self._body, self._etag
+
+    async def lookup_async(self, database, barcode):
+        """lookup() for the ASGI app"""
+        await self._ensure_fresh_async(database)
+        with self._lock:
+            return self._by_barcode.get(barcode)
+
+    async def _ensure_fresh_async(self, database):
+        with self._lock:
+            if self._fresh():
+                self.hits += 1
+                return
+        if self._async_refresh_lock is None:
+            self._async_refresh_lock = asyncio.Lock()
+
+        # One coroutine revalidates; the others await it, as in _ensure_fresh
+        async with self._async_refresh_lock:
+            with self._lock:
+                if self._fresh():
+                    self.hits += 1
+                    return
+            async with database.connection() as conn:
+                row = await conn.fetchone('SELECT version FROM catalog_version WHERE id = 1')
+                version = row[0] if row else 0
+                if version == self._version and self._body is not None:
+                    with self._lock:
+                        self._expires = time.monotonic() + self.ttl
+                    return
+                rows = await conn.fetchall(f'''
+                    SELECT {PRODUCT_COLUMNS}
+                    FROM products
+                    WHERE stock > 0
+                    ORDER BY category, name
+                ''')
+            products = [product_from_row(row) for row in rows]
+            with self._lock:
+                self._install(products, version)
+
+    def _install(self, products, version):
+        """Swap in a new snapshot; caller holds self._lock"""
+        body = json.dumps(products, separators=(',', ':')).encode('utf-8')
+        self._version = version
+        self._products = products
+        self._by_barcode = {p['barcode']: p for p in products if p['barcode']}
+        self._body = body
+        self._etag = f"{version}-{hashlib.sha1(body).hexdigest()[:16]}"
+        self._expires = time.monotonic() + self.ttl
+        self.rebuilds += 1
+
+    def apply_stock_levels(self, levels, version=None):
+        """Patch stock for {product_id: new_stock} after a local stock write.
+
+        Products that reach zero leave the catalog and the barcode index.
+        Pass the bumped catalog version to avoid a redundant rebuild later;
+        if other writes happened in between, or a product comes back into
+        stock, the snapshot is dropped and rebuilt instead.
+        """
+        with self._lock:
+            if self._version is None:
+                return
+            known = {product['id'] for product in self._products}
+            restocked = any(stock > 0 and product_id not in known for product_id, stock in levels.items())
+            if restocked or (version is not None and version != self._version + 1):
+                self._version = None
+                self._expires = 0.0
+                return
+            products = []
+            for product in self._products:
+                if product['id'] in levels:
+                    product = dict(product, stock=levels[product['id']])
+                if product['stock'] > 0:
+                    products.append(product)
+            self._install(products, version if version is not None else self._version)
+
+    def invalidate(self):
+        """Drop this worker's copy so the next request rebuilds it from the DB"""
+        with self._lock:
+            self._version = None
+            self._expires = 0.0
+
+    def stats(self):
+        """Hit/rebuild counters for this worker"""
+        with self._lock:
+            return {
+                'version': self._version,
+                'products': len(self._products),
+                'barcodes': len(self._by_barcode),
+                'hits': self.hits,
+                'rebuilds': self.rebuilds,
+                'ttl': self.ttl,
+            }
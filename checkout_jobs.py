@@ -0,0 +1,224 @@
+"""
+Body & Soul POS - Checkout Jobs
+Background "display QR" jobs so /api/generate_qr returns as soon as the
+transaction is saved. Job state is kept in the checkout_jobs table so any
+gunicorn worker can answer status queries. Jobs lost with their worker
+(restart, crash) are failed by a reaper once CHECKOUT_JOB_TIMEOUT passes.
+"""
+
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+CHECKOUT_WORKERS = int(os.getenv('CHECKOUT_WORKERS', 4))
+CHECKOUT_JOB_TIMEOUT = float(os.getenv('CHECKOUT_JOB_TIMEOUT', 90))  # seconds without progress before a job is failed
+JOB_REAP_INTERVAL = 30  # seconds between each worker's checks for stale jobs
+STALE_JOB_ERROR = 'The payment terminal did not respond in time. Please try again.'
+
+JOB_STATES = ('queued', 'rendering', 'uploading', 'displayed', 'failed')
+FINAL_STATES = ('displayed', 'failed')
+
+
+JOB_COLUMNS = 'id, transaction_id, state, error, updated_at'
+
+
+def job_from_row(row):
+    """Job dict for a checkout_jobs row selected with JOB_COLUMNS"""
+    return {
+        'job_id': row[0],
+        'transaction_id': row[1],
+        'state': row[2],
+        'error': row[3],
+        'updated_at': str(row[4]),
+    }
+
+
+class CheckoutJobError(Exception):
+    """Raised by a job runner with a message suitable for the till"""
+
+
+def ensure_checkout_jobs(cursor, db_type):
+    """Create the checkout_jobs table if missing"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS checkout_jobs (
+            id TEXT PRIMARY KEY,
+            transaction_id INTEGER NOT NULL,
+            state TEXT NOT NULL DEFAULT 'queued',
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_checkout_jobs_transaction ON checkout_jobs (transaction_id)')
+
+
+class CheckoutJobQueue:
+    """Runs display-QR jobs on a bounded thread pool per worker process.
+
+    runner(payload, report) does the work, calling report(state) as it
+    moves through 'rendering'/'uploading'; returning means 'displayed',
+    raising means 'failed'.
+    """
+
+    def __init__(self, database, runner, max_workers=CHECKOUT_WORKERS, timeout=CHECKOUT_JOB_TIMEOUT,
+                 reap_interval=JOB_REAP_INTERVAL):
+        self.database = database
+        self.runner = runner
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.reap_interval = reap_interval
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._reaper_pid = None
+        self._table_ready = False
+        self._listeners = []
+
+    def _get_executor(self):
+        """Thread pool for this process (threads do not survive fork)"""
+        pid = os.getpid()
+        with self._lock:
+            if self._executor is None or self._pid != pid:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='checkout-job')
+                self._pid = pid
+            return self._executor
+
+    def _ensure_reaper(self):
+        """Start this worker's stale-job reaper (threads do not survive fork)"""
+        with self._lock:
+            if self._reaper_pid == os.getpid():
+                return
+            self._reaper_pid = os.getpid()
+        threading.Thread(target=self._reap_forever, name='checkout-reaper', daemon=True).start()
+
+    def _reap_forever(self):
+        while True:
+            time.sleep(self.reap_interval)
+            try:
+                self.reap_stale()
+            except Exception as e:
+                print(f"✗ Checkout job reaper error: {e}")
+
+    def reap_stale(self):
+        """Fail jobs with no progress for timeout seconds (their worker is gone); returns the jobs failed.
+
+        Subscribers hear about each one as they would a failure in this
+        worker, so its checkout's stock is released the same way.
+        """
+        with self.database.connection() as (conn, db_type):
+            cursor = conn.cursor()
+            self._ensure_table(cursor, db_type)
+            if db_type == 'postgresql':
+                cutoff = "CURRENT_TIMESTAMP - %s * INTERVAL '1 second'"
+                placeholder = '%s'
+            else:
+                cutoff = "datetime('now', '-' || ? || ' seconds')"
+                placeholder = '?'
+            # Claimed in one statement, so two workers never fail the same job twice
+            cursor.execute(f'''
+                UPDATE checkout_jobs
+                SET state = 'failed', error = {placeholder}, updated_at = CURRENT_TIMESTAMP
+                WHERE state NOT IN ('displayed', 'failed') AND updated_at < {cutoff}
+                RETURNING id, transaction_id
+            ''', (STALE_JOB_ERROR, self.timeout))
+            reaped = cursor.fetchall()
+
+        jobs = [{'job_id': row[0], 'transaction_id': row[1], 'state': 'failed', 'error': STALE_JOB_ERROR,
+                 'till_id': None} for row in reaped]
+        if jobs:
+            print(f"✗ Failed {len(jobs)} checkout job(s) with no progress for {self.timeout:g}s")
+        for job in jobs:
+            self._notify(job)
+        return jobs
+
+    def _ensure_table(self, cursor, db_type):
+        if not self._table_ready:
+            ensure_checkout_jobs(cursor, db_type)
+            self._table_ready = True
+
+    def subscribe(self, callback):
+        """Call callback(job_dict) on every state change made by this worker"""
+        self._listeners.append(callback)
+
+    def create(self, cursor, db_type, transaction_id):
+        """Insert a queued job in the caller's transaction; returns the job id"""
+        self._ensure_table(cursor, db_type)
+        job_id = uuid.uuid4().hex
+        placeholder = '%s' if db_type == 'postgresql' else '?'
+        cursor.execute(f'''
+            INSERT INTO checkout_jobs (id, transaction_id, state)
+            VALUES ({placeholder}, {placeholder}, 'queued')
+        ''', (job_id, transaction_id))
+        return job_id
+
+    def start(self, job_id, transaction_id, payload, till_id=None):
+        """Hand a committed job to the thread pool"""
+        self._ensure_reaper()
+        self._get_executor().submit(self._run, job_id, transaction_id, payload, till_id)
+
+    def _run(self, job_id, transaction_id, payload, till_id):
+        last_state = ['queued']
+
+        def report(state):
+            if state != last_state[0]:
+                last_state[0] = state
+                self.set_state(job_id, transaction_id, state, till_id=till_id)
+
+        try:
+            self.runner(payload, report)
+        except CheckoutJobError as e:
+            self.set_state(job_id, transaction_id, 'failed', str(e), till_id=till_id)
+            return
+        except Exception as e:
+            self.set_state(job_id, transaction_id, 'failed', f'Error communicating with local device: {e}',
+                           till_id=till_id)
+            return
+        self.set_state(job_id, transaction_id, 'displayed', till_id=till_id)
+
+    def set_state(self, job_id, transaction_id, state, error=None, till_id=None):
+        """Persist a state change and notify subscribers; a job already displayed or failed keeps its state"""
+        if state not in JOB_STATES:
+            raise ValueError(f"Unknown job state: {state}")
+        try:
+            with self.database.connection() as (conn, db_type):
+                cursor = conn.cursor()
+                placeholder = '%s' if db_type == 'postgresql' else '?'
+                cursor.execute(f'''
+                    UPDATE checkout_jobs
+                    SET state = {placeholder}, error = {placeholder}, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = {placeholder} AND state NOT IN ('displayed', 'failed')
+                ''', (state, error, job_id))
+                if cursor.rowcount == 0:
+                    print(f"✗ Job {job_id} already finished (reaped?); state '{state}' not saved")
+                    return
+        except Exception as e:
+            print(f"✗ Could not save state '{state}' for job {job_id}: {e}")
+
+        self._notify({'job_id': job_id, 'transaction_id': transaction_id, 'state': state, 'error': error,
+                      'till_id': till_id})
+
+    def _notify(self, job):
+        for callback in list(self._listeners):
+            try:
+                callback(job)
+            except Exception as e:
+                print(f"✗ Checkout job listener failed: {e}")
+
+    def get(self, job_id):
+        """Return the job as a dict, or None"""
+        self._ensure_reaper()  # tills poll jobs that a restarted worker left behind
+        with self.database.connection() as (conn, db_type):
+            cursor = conn.cursor()
+            self._ensure_table(cursor, db_type)
+            placeholder = '%s' if db_type == 'postgresql' else '?'
+            cursor.execute(f'''
+                SELECT {JOB_COLUMNS}
+                FROM checkout_jobs
+                WHERE id = {placeholder}
+            ''', (job_id,))
+            row = cursor.fetchone()
+
+        return job_from_row(row) if row else None
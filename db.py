@@ -0,0 +1,235 @@
+"""
+Body & Soul POS - Database Layer
+Pooled, dialect-aware connections shared by every cloud route.
+PostgreSQL uses a bounded psycopg2 pool per gunicorn worker; SQLite uses
+one WAL-mode connection per thread.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# Pool configuration (per gunicorn worker process)
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', 1))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', 5))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))  # seconds to wait for a free connection
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'body_soul.db')
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+
+
+def database_url_from_env():
+    """Database URL from the environment variable names Railway/Heroku use, or None"""
+    return (
+        os.getenv('DATABASE_URL') or
+        os.getenv('POSTGRES_URL') or
+        os.getenv('POSTGRESQL_URL') or
+        os.getenv('DATABASE_PRIVATE_URL')
+    )
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes free within the wait timeout"""
+
+
+def _operational_errors():
+    """Driver exception types a lost database raises (among other operational errors)"""
+    errors = (sqlite3.OperationalError,)
+    try:
+        import psycopg2
+        errors += (psycopg2.OperationalError, psycopg2.InterfaceError)
+    except ImportError:
+        pass
+    return errors
+
+
+OPERATIONAL_ERRORS = _operational_errors()
+# SQLSTATEs PostgreSQL sends when it drops or refuses connections (shutdown, starting up)
+PG_CONNECTION_SQLSTATES = ('57P01', '57P02', '57P03')
+
+
+def database_unreachable(error):
+    """True only if error means the database could not be reached at all.
+
+    A busy or locked database, a pool with no free connection and a bad
+    query are not: those are for the caller to report, not to route around.
+    """
+    if isinstance(error, sqlite3.OperationalError):
+        return 'unable to open database file' in str(error)
+    try:
+        import psycopg2
+    except ImportError:
+        return False
+    if isinstance(error, psycopg2.InterfaceError):
+        return True  # connection already closed
+    if isinstance(error, psycopg2.OperationalError):
+        # Connect failures and dropped connections carry no SQLSTATE or a class 08 one;
+        # lock and statement timeouts are OperationalErrors with their own codes
+        code = error.pgcode
+        return code is None or code.startswith('08') or code in PG_CONNECTION_SQLSTATES
+    return False
+
+
+class Database:
+    """Shared connection source for PostgreSQL (pooled) or SQLite (per-thread)"""
+
+    def __init__(self, url=None, sqlite_path=SQLITE_PATH, minconn=DB_POOL_MIN,
+                 maxconn=DB_POOL_MAX, timeout=DB_POOL_TIMEOUT, sqlite_synchronous='NORMAL'):
+        self.url = url.replace('postgres://', 'postgresql://', 1) if url else None
+        self.db_type = 'postgresql' if url and 'postgres' in url else 'sqlite'
+        self.sqlite_path = sqlite_path
+        self.sqlite_synchronous = sqlite_synchronous  # FULL makes each commit survive power loss
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._pool = None
+        self._slots = None
+        self._pid = None
+        self.observer = None  # optional callable(seconds) per connection hold (acquired to released), for metrics
+        self._stats = {
+            'checkouts': 0,
+            'in_use': 0,
+            'timeouts': 0,
+            'waited': 0,
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0,
+        }
+
+    @property
+    def placeholder(self):
+        """Parameter placeholder for the active dialect"""
+        return '%s' if self.db_type == 'postgresql' else '?'
+
+    def _ensure_pool(self):
+        """Create the psycopg2 pool lazily, once per worker process.
+
+        If PostgreSQL cannot be reached the error is raised and the next
+        _acquire tries again; callers decide with database_unreachable().
+        """
+        pid = os.getpid()
+        if self._pool is not None and self._pid == pid:
+            return
+        with self._lock:
+            if self._pool is not None and self._pid == pid:
+                return
+            # A pool inherited across fork() shares sockets with the parent;
+            # drop it without closing and start fresh in this worker.
+            import psycopg2.pool
+            self._pool = None
+            try:
+                self._pool = psycopg2.pool.ThreadedConnectionPool(self.minconn, self.maxconn, self.url)
+            except Exception as e:
+                print(f"✗ PostgreSQL pool creation failed: {e}")
+                raise
+            self._slots = threading.BoundedSemaphore(self.maxconn)
+            self._pid = pid
+            print(f"✓ PostgreSQL pool ready ({self.minconn}-{self.maxconn} connections, pid {pid})")
+
+    def _open_sqlite(self):
+        """Open this thread's SQLite connection in WAL mode"""
+        conn = sqlite3.connect(self.sqlite_path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(f'PRAGMA synchronous={self.sqlite_synchronous}')
+        conn.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}')
+        return conn
+
+    def _acquire(self):
+        """Take a connection for the calling thread"""
+        if self.db_type == 'postgresql':
+            self._ensure_pool()
+
+        if self.db_type == 'sqlite':
+            conn = getattr(self._local, 'sqlite_conn', None)
+            if conn is None or getattr(self._local, 'sqlite_pid', None) != os.getpid():
+                conn = self._open_sqlite()
+                self._local.sqlite_conn = conn
+                self._local.sqlite_pid = os.getpid()
+            with self._lock:
+                self._stats['checkouts'] += 1
+                self._stats['in_use'] += 1
+            return conn
+
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._stats['timeouts'] += 1
+            raise PoolTimeout(f"No database connection free after {self.timeout}s (pool max {self.maxconn})")
+        try:
+            conn = self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+        waited = time.perf_counter() - started
+
+        with self._lock:
+            self._stats['checkouts'] += 1
+            self._stats['in_use'] += 1
+            if waited > 0.001:
+                self._stats['waited'] += 1
+            self._stats['wait_seconds_total'] += waited
+            self._stats['wait_seconds_max'] = max(self._stats['wait_seconds_max'], waited)
+        return conn
+
+    def _release(self, conn):
+        """Return a connection taken by _acquire()"""
+        with self._lock:
+            self._stats['in_use'] -= 1
+        if self.db_type == 'sqlite':
+            return
+        try:
+            # Broken connections are discarded so the pool reconnects
+            self._pool.putconn(conn, close=bool(conn.closed))
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection as (conn, db_type); commits on success, rolls back on error.
+
+        Nested use on the same thread joins the outer transaction.
+        """
+        depth = getattr(self._local, 'depth', 0)
+        if depth:
+            self._local.depth = depth + 1
+            try:
+                yield self._local.conn, self.db_type
+            finally:
+                self._local.depth = depth
+            return
+
+        conn = self._acquire()
+        started = time.perf_counter()  # pool waits are in stats(), not the hold time
+        self._local.conn = conn
+        self._local.depth = 1
+        try:
+            yield conn, self.db_type
+            conn.commit()
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            self._local.conn = None
+            self._local.depth = 0
+            self._release(conn)
+            if self.observer:
+                self.observer(time.perf_counter() - started)
+
+    def stats(self):
+        """Pool size and wait-time metrics for this worker"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['db_type'] = self.db_type
+        stats['pool_max'] = self.maxconn if self.db_type == 'postgresql' else None
+        stats['wait_seconds_avg'] = (
+            stats['wait_seconds_total'] / stats['checkouts'] if stats['checkouts'] else 0.0
+        )
+        stats['pid'] = os.getpid()
+        return stats
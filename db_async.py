@@ -0,0 +1,156 @@
+"""
+Body & Soul POS - Async Database Layer
+asyncio counterpart of db.Database for the ASGI entry point: an asyncpg
+pool on PostgreSQL, one aiosqlite (WAL) connection on SQLite. Queries
+use '?' placeholders on both; they are numbered ($1, $2, ...) for asyncpg.
+"""
+
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+
+from db import (DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT, OPERATIONAL_ERRORS, SQLITE_PATH,
+                SQLITE_BUSY_TIMEOUT_MS, PoolTimeout, database_unreachable)
+
+
+def _connection_errors():
+    """asyncpg's connection errors, and the socket errors it lets through"""
+    errors = (ConnectionError,)
+    try:
+        import asyncpg
+        errors += (asyncpg.PostgresConnectionError, asyncpg.InterfaceError)
+    except ImportError:
+        pass
+    return errors
+
+
+ASYNC_CONNECTION_ERRORS = _connection_errors()
+# Everything the ASGI app's database error handler sees; async_database_unreachable() sorts them
+ASYNC_DATABASE_ERRORS = (PoolTimeout,) + OPERATIONAL_ERRORS + ASYNC_CONNECTION_ERRORS
+
+
+def async_database_unreachable(error):
+    """database_unreachable() for errors raised through asyncpg/aiosqlite"""
+    return isinstance(error, ASYNC_CONNECTION_ERRORS) or database_unreachable(error)
+
+
+def numbered_placeholders(sql):
+    """'... = ? AND ... = ?' -> '... = $1 AND ... = $2' for asyncpg"""
+    parts = sql.split('?')
+    return parts[0] + ''.join(f'${i}{part}' for i, part in enumerate(parts[1:], start=1))
+
+
+class AsyncDatabase:
+    """Shared async connection source for PostgreSQL (pooled) or SQLite"""
+
+    def __init__(self, url=None, sqlite_path=SQLITE_PATH, minconn=DB_POOL_MIN,
+                 maxconn=DB_POOL_MAX, timeout=DB_POOL_TIMEOUT):
+        self.url = url.replace('postgres://', 'postgresql://', 1) if url else None
+        self.db_type = 'postgresql' if url and 'postgres' in url else 'sqlite'
+        self.sqlite_path = sqlite_path
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self._pool = None
+        self._sqlite = None
+        self._open_lock = asyncio.Lock()
+        self._sqlite_lock = asyncio.Lock()
+        self.observer = None  # optional callable(seconds) per connection hold (acquired to released), for metrics
+        self._stats = {'queries': 0, 'in_use': 0}
+
+    async def open(self):
+        """Create the pool / connection (called lazily on first use)"""
+        async with self._open_lock:
+            if self.db_type == 'postgresql' and self._pool is None:
+                import asyncpg
+                self._pool = await asyncpg.create_pool(self.url, min_size=self.minconn, max_size=self.maxconn)
+                print(f"✓ asyncpg pool ready ({self.minconn}-{self.maxconn} connections, pid {os.getpid()})")
+            elif self.db_type == 'sqlite' and self._sqlite is None:
+                import aiosqlite
+                self._sqlite = await aiosqlite.connect(self.sqlite_path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+                await self._sqlite.execute('PRAGMA journal_mode=WAL')
+                await self._sqlite.execute('PRAGMA synchronous=NORMAL')
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+        if self._sqlite is not None:
+            await self._sqlite.close()
+            self._sqlite = None
+
+    @asynccontextmanager
+    async def connection(self):
+        """Borrow a connection wrapped as an AsyncConnection, inside one transaction"""
+        if self._pool is None and self._sqlite is None:
+            await self.open()
+        started = None
+        self._stats['in_use'] += 1
+        try:
+            if self.db_type == 'postgresql':
+                try:
+                    conn = await self._pool.acquire(timeout=self.timeout)
+                except asyncio.TimeoutError:
+                    raise PoolTimeout(f"No database connection free after {self.timeout}s (pool max {self.maxconn})")
+                started = time.perf_counter()
+                try:
+                    async with conn.transaction():
+                        yield AsyncConnection(conn, self)
+                finally:
+                    await self._pool.release(conn)
+            else:
+                # aiosqlite runs one connection on its own thread; transactions must not interleave
+                async with self._sqlite_lock:
+                    started = time.perf_counter()
+                    try:
+                        yield AsyncConnection(self._sqlite, self)
+                        await self._sqlite.commit()
+                    except Exception:
+                        await self._sqlite.rollback()
+                        raise
+        finally:
+            self._stats['in_use'] -= 1
+            if self.observer and started is not None:
+                self.observer(time.perf_counter() - started)
+
+    async def fetchone(self, sql, params=()):
+        async with self.connection() as conn:
+            return await conn.fetchone(sql, params)
+
+    async def fetchall(self, sql, params=()):
+        async with self.connection() as conn:
+            return await conn.fetchall(sql, params)
+
+    def stats(self):
+        stats = dict(self._stats, db_type=self.db_type, pid=os.getpid())
+        if self._pool is not None:
+            stats['pool_size'] = self._pool.get_size()
+            stats['pool_idle'] = self._pool.get_idle_size()
+        return stats
+
+
+class AsyncConnection:
+    """Dialect-neutral fetchone/fetchall/execute over an asyncpg or aiosqlite connection"""
+
+    def __init__(self, conn, database):
+        self.conn = conn
+        self.database = database
+
+    async def fetchall(self, sql, params=()):
+        self.database._stats['queries'] += 1
+        if self.database.db_type == 'postgresql':
+            return [tuple(row) for row in await self.conn.fetch(numbered_placeholders(sql), *params)]
+        async with self.conn.execute(sql, params) as cursor:
+            return [tuple(row) for row in await cursor.fetchall()]
+
+    async def fetchone(self, sql, params=()):
+        rows = await self.fetchall(sql, params)
+        return rows[0] if rows else None
+
+    async def execute(self, sql, params=()):
+        self.database._stats['queries'] += 1
+        if self.database.db_type == 'postgresql':
+            await self.conn.execute(numbered_placeholders(sql), *params)
+        else:
+            await self.conn.execute(sql, params)
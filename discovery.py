@@ -0,0 +1,164 @@
+"""
+Body & Soul POS - Local Service Discovery
+Finds the local service off the request path. Candidate URLs are probed
+in parallel by a background thread, the winner is cached with a TTL and
+shared between gunicorn workers through the service_discovery table, and
+a connection failure wakes the background prober at once.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DISCOVERY_TTL = float(os.getenv('DISCOVERY_TTL', 30))  # seconds a probe result stays valid
+DISCOVERY_INTERVAL = float(os.getenv('DISCOVERY_INTERVAL', 10))  # background check period
+DISCOVERY_KEY = 'local_service'
+
+
+def ensure_discovery_table(cursor, db_type):
+    """Create the service_discovery table if missing"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS service_discovery (
+            name TEXT PRIMARY KEY,
+            url TEXT,
+            checked_at DOUBLE PRECISION NOT NULL
+        )
+    ''')
+
+
+class LocalServiceDiscovery:
+    """Cached, shared answer to 'where is the local service?'"""
+
+    def __init__(self, database, probe, candidates, ttl=DISCOVERY_TTL, interval=DISCOVERY_INTERVAL):
+        self.database = database
+        self.probe = probe
+        self.candidates = candidates
+        self.ttl = ttl
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._url = None
+        self._checked_at = 0.0
+        self._known = False
+        self._pid = None
+        self._table_ready = False
+
+    def _ensure_table(self, cursor, db_type):
+        if not self._table_ready:
+            ensure_discovery_table(cursor, db_type)
+            self._table_ready = True
+
+    def _ensure_thread(self):
+        """Start this worker's background prober (threads do not survive fork)"""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        threading.Thread(target=self._run, name='local-discovery', daemon=True).start()
+
+    def get(self):
+        """Return the local service URL, or None if none is reachable.
+
+        Served from memory or the shared table. Once this worker has had an
+        answer, a stale one (None after report_failure) is returned while
+        the background thread re-probes; only a cold start with no shared
+        answer probes inline (all candidates at once).
+        """
+        self._ensure_thread()
+        with self._lock:
+            if self._known and time.time() - self._checked_at < self.ttl:
+                return self._url
+
+        shared = self._read_shared()
+        if shared is not None and time.time() - shared[1] < self.ttl:
+            with self._lock:
+                self._url, self._checked_at, self._known = shared[0], shared[1], True
+            return shared[0]
+
+        with self._lock:
+            warm, url = self._checked_at > 0, self._url
+        if warm:
+            self._wake.set()
+            return url
+        return self.refresh()
+
+    def report_failure(self, url):
+        """A call to url failed to connect: forget it and have the background thread re-probe now"""
+        with self._lock:
+            if self._url != url:
+                return
+            self._url, self._known = None, False
+        self._write_shared(None, 0.0)
+        self._wake.set()
+
+    def refresh(self):
+        """Probe every candidate in parallel and publish the first (by preference) that answers"""
+        candidates = list(dict.fromkeys(c for c in self.candidates() if c))
+        url = None
+        if candidates:
+            with ThreadPoolExecutor(max_workers=len(candidates)) as pool:
+                results = list(pool.map(self.probe, candidates))
+            url = next((c for c, ok in zip(candidates, results) if ok), None)
+
+        checked_at = time.time()
+        with self._lock:
+            previous = self._url
+            self._url, self._checked_at, self._known = url, checked_at, True
+        if url and url != previous:
+            print(f"✓ Found local service at {url}")
+        self._write_shared(url, checked_at)
+        return url
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            woken = self._wake.is_set()
+            self._wake.clear()
+            try:
+                shared = self._read_shared()
+                # Another worker probed recently; adopt its answer instead of probing again
+                if not woken and shared is not None and time.time() - shared[1] < self.interval:
+                    with self._lock:
+                        self._url, self._checked_at, self._known = shared[0], shared[1], True
+                    continue
+                self.refresh()
+            except Exception as e:
+                print(f"✗ Local service discovery error: {e}")
+
+    def _read_shared(self):
+        """(url, checked_at) from the shared table, or None"""
+        try:
+            with self.database.connection() as (conn, db_type):
+                cursor = conn.cursor()
+                self._ensure_table(cursor, db_type)
+                placeholder = '%s' if db_type == 'postgresql' else '?'
+                cursor.execute(f'SELECT url, checked_at FROM service_discovery WHERE name = {placeholder}',
+                               (DISCOVERY_KEY,))
+                row = cursor.fetchone()
+            return (row[0], float(row[1])) if row else None
+        except Exception as e:
+            print(f"✗ Could not read shared discovery result: {e}")
+            return None
+
+    def _write_shared(self, url, checked_at):
+        try:
+            with self.database.connection() as (conn, db_type):
+                cursor = conn.cursor()
+                self._ensure_table(cursor, db_type)
+                placeholder = '%s' if db_type == 'postgresql' else '?'
+                cursor.execute(f'''
+                    INSERT INTO service_discovery (name, url, checked_at)
+                    VALUES ({placeholder}, {placeholder}, {placeholder})
+                    ON CONFLICT (name) DO UPDATE SET url = EXCLUDED.url, checked_at = EXCLUDED.checked_at
+                ''', (DISCOVERY_KEY, url, checked_at))
+        except Exception as e:
+            print(f"✗ Could not share discovery result: {e}")
+
+    def status(self):
+        with self._lock:
+            return {
+                'url': self._url,
+                'age_seconds': round(time.time() - self._checked_at, 1) if self._known else None,
+                'ttl': self.ttl,
+            }
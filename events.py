@@ -0,0 +1,221 @@
+"""
+Body & Soul POS - Till Event Bus
+In-process pub/sub behind the /api/events Server-Sent Events stream.
+Every subscriber gets a bounded buffer: a slow browser loses its oldest
+events instead of growing memory or blocking publishers. subscribe() can
+be given a limit on open streams, since each one holds a server thread
+under gunicorn gthread. On PostgreSQL,
+events are relayed between gunicorn workers with LISTEN/NOTIFY.
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import select
+import socket
+import threading
+import time
+from collections import deque
+
+EVENT_BUFFER_SIZE = int(os.getenv('EVENT_BUFFER_SIZE', 100))
+EVENT_CHANNEL = 'till_events'
+ALL_TILLS = '*'
+
+
+def process_origin():
+    """Identifies this worker process across hosts"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def format_sse(event):
+    """Encode an event dict as a Server-Sent Events frame"""
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+class TooManyStreams(Exception):
+    """Raised by EventBus.subscribe when this worker already has limit streams open"""
+
+
+class Subscription:
+    """One connected browser's bounded event buffer"""
+
+    def __init__(self, till, maxlen):
+        self.till = till
+        self.dropped = 0
+        self._events = deque(maxlen=maxlen)
+        self._cond = threading.Condition()
+
+    def push(self, event):
+        with self._cond:
+            if len(self._events) == self._events.maxlen:
+                self.dropped += 1
+            self._events.append(event)
+            self._cond.notify()
+
+    def next_event(self, timeout):
+        """Wait up to timeout seconds for the next event; None on timeout"""
+        with self._cond:
+            if not self._events:
+                self._cond.wait(timeout)
+            return self._events.popleft() if self._events else None
+
+
+class AsyncSubscription(Subscription):
+    """Subscription read by a coroutine on an asyncio loop (the ASGI app).
+
+    Publishers run on any thread, so events are handed to the loop with
+    call_soon_threadsafe rather than a Condition.
+    """
+
+    def __init__(self, till, maxlen, loop):
+        super().__init__(till, maxlen)
+        self._loop = loop
+        self._ready = asyncio.Event()
+
+    def push(self, event):
+        try:
+            self._loop.call_soon_threadsafe(self._append, event)
+        except RuntimeError:
+            pass  # loop closed: the stream is gone
+
+    def _append(self, event):
+        if len(self._events) == self._events.maxlen:
+            self.dropped += 1
+        self._events.append(event)
+        self._ready.set()
+
+    async def next_event_async(self, timeout):
+        """Await the next event for up to timeout seconds; None on timeout"""
+        if not self._events:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self._events.popleft() if self._events else None
+
+
+class EventBus:
+    """Per-process fan-out of till events to SSE subscribers"""
+
+    def __init__(self, buffer_size=EVENT_BUFFER_SIZE):
+        self.buffer_size = buffer_size
+        self.relay = None
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._ids = itertools.count(1)
+        self.published = 0
+        self.refused = 0
+
+    def subscribe(self, till, loop=None, limit=None):
+        """Buffer for one stream; pass the running asyncio loop to get an AsyncSubscription.
+
+        Raises TooManyStreams if limit streams are already open.
+        """
+        if loop is not None:
+            subscription = AsyncSubscription(till, self.buffer_size, loop)
+        else:
+            subscription = Subscription(till, self.buffer_size)
+        with self._lock:
+            if limit is not None and len(self._subscribers) >= limit:
+                self.refused += 1
+                raise TooManyStreams(f"{limit} event streams already open")
+            self._subscribers.add(subscription)
+        if self.relay:
+            self.relay.ensure_listening()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, till, event_type, data):
+        """Send an event to this worker's subscribers and, if relayed, to other workers"""
+        event = {
+            'id': f"{os.getpid()}-{next(self._ids)}",
+            'till': till or ALL_TILLS,
+            'type': event_type,
+            'data': data,
+            'time': time.time(),
+            'origin': process_origin(),
+        }
+        self.deliver(event)
+        if self.relay:
+            self.relay.send(event)
+        return event
+
+    def deliver(self, event):
+        """Push an event to matching local subscribers"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self.published += 1
+        for subscription in subscribers:
+            if event['till'] == ALL_TILLS or subscription.till in (event['till'], ALL_TILLS):
+                subscription.push(event)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'published': self.published,
+                'refused': self.refused,
+                'dropped': sum(s.dropped for s in self._subscribers),
+            }
+
+
+class PostgresEventRelay:
+    """Shares events between workers through PostgreSQL LISTEN/NOTIFY"""
+
+    def __init__(self, database, bus):
+        self.database = database
+        self.bus = bus
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def send(self, event):
+        """NOTIFY other workers; our own listener skips events from this process"""
+        self.ensure_listening()
+        payload = json.dumps(event)
+        if len(payload) >= 8000:
+            return  # NOTIFY payload limit; local subscribers already have it
+        try:
+            with self.database.connection() as (conn, db_type):
+                conn.cursor().execute('SELECT pg_notify(%s, %s)', (EVENT_CHANNEL, payload))
+        except Exception as e:
+            print(f"✗ Event relay NOTIFY failed: {e}")
+
+    def ensure_listening(self):
+        """Start this worker's listener thread (once per process)"""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        threading.Thread(target=self._listen, name='event-relay', daemon=True).start()
+
+    def _listen(self):
+        import psycopg2
+        import psycopg2.extensions
+        origin = process_origin()
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(self.database.url)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                conn.cursor().execute(f'LISTEN {EVENT_CHANNEL}')
+                while True:
+                    if select.select([conn], [], [], 60) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        event = json.loads(conn.notifies.pop(0).payload)
+                        if event.get('origin') != origin:
+                            self.bus.deliver(event)
+            except Exception as e:
+                print(f"✗ Event relay listener error: {e}; reconnecting in 5s")
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+                time.sleep(5)
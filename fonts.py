@@ -0,0 +1,137 @@
+"""
+Font registry and glyph cache
+Fonts are resolved once per process from FONT_PATHS (first file that
+loads wins) and kept per size, so rendering a screen never touches the
+filesystem. Amount text is drawn from pre-rasterised glyphs: digits and
+separators are rendered once per font, and fixed text such as
+"Amount: MUR " is cached as one piece, so "Amount: MUR 1,250.00" is a
+handful of masked pastes.
+"""
+
+import os
+import threading
+
+from PIL import Image, ImageDraw, ImageFont
+
+DEFAULT_FONT_PATHS = [
+    'arial.ttf',
+    'C:/Windows/Fonts/arial.ttf',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    '/usr/share/fonts/dejavu/DejaVuSans.ttf',
+    '/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf',
+    '/System/Library/Fonts/Supplemental/Arial.ttf',
+    '/Library/Fonts/Arial.ttf',
+]
+FONT_PATHS = [path for path in os.getenv('FONT_PATHS', '').split(os.pathsep) if path] or DEFAULT_FONT_PATHS
+GLYPH_CHARS = '0123456789.,- '
+MAX_CACHED_PIECES = 256
+
+
+def format_amount(amount):
+    """1250 -> '1,250.00'; text that is not a number is shown as given"""
+    try:
+        return f"{float(amount):,.2f}"
+    except (TypeError, ValueError):
+        return str(amount)
+
+
+class GlyphCache:
+    """Pre-rendered masks for text pieces in one font"""
+
+    def __init__(self, font):
+        self.font = font
+        self._pieces = {}
+        self._lock = threading.Lock()
+        for char in GLYPH_CHARS:
+            self.piece(char)
+
+    def piece(self, text):
+        """(mask, x offset, y offset, advance) for text drawn at the origin"""
+        with self._lock:
+            cached = self._pieces.get(text)
+        if cached:
+            return cached
+        left, top, right, bottom = self.font.getbbox(text)
+        mask = Image.new('L', (max(right - left, 1), max(bottom - top, 1)))
+        ImageDraw.Draw(mask).text((-left, -top), text, fill=255, font=self.font)
+        cached = (mask, left, top, self.font.getlength(text))
+        with self._lock:
+            if len(self._pieces) < MAX_CACHED_PIECES:
+                self._pieces[text] = cached
+        return cached
+
+    def pieces(self, text):
+        """Split text into cached pieces: one per glyph character, whole runs for the rest"""
+        pieces = []
+        run = ''
+        for char in text:
+            if char in GLYPH_CHARS:
+                if run:
+                    pieces.append(self.piece(run))
+                    run = ''
+                pieces.append(self.piece(char))
+            else:
+                run += char
+        if run:
+            pieces.append(self.piece(run))
+        return pieces
+
+    def width(self, text):
+        return round(sum(piece[3] for piece in self.pieces(text)))
+
+    def draw(self, canvas, text, xy, fill='black'):
+        """Paste text onto canvas with its top-left at xy, as ImageDraw.text would place it"""
+        x, y = xy
+        for mask, left, top, advance in self.pieces(text):
+            canvas.paste(fill, (round(x) + left, y + top), mask)
+            x += advance
+
+    def draw_centered(self, canvas, text, center_x, y, fill='black'):
+        self.draw(canvas, text, (center_x - self.width(text) // 2, y), fill)
+
+
+class FontRegistry:
+    """Process-wide fonts by (name, size) and their glyph caches"""
+
+    def __init__(self, paths=FONT_PATHS):
+        self.paths = paths
+        self._fonts = {}
+        self._glyphs = {}
+        self._resolved = {}
+        self._lock = threading.Lock()
+
+    def _resolve(self, name):
+        """First loadable font file for name (None = the configured path list)"""
+        if name not in self._resolved:
+            for path in ([name] if name else []) + list(self.paths):
+                try:
+                    ImageFont.truetype(path, 12)
+                except OSError:
+                    continue
+                self._resolved[name] = path
+                break
+            else:
+                print(f"✗ No font found in {[name] if name else self.paths}; using Pillow's default font")
+                self._resolved[name] = None
+        return self._resolved[name]
+
+    def get(self, size, name=None):
+        """FreeType font at size, loaded once per process"""
+        key = (name, size)
+        with self._lock:
+            if key not in self._fonts:
+                path = self._resolve(name)
+                self._fonts[key] = ImageFont.truetype(path, size) if path else ImageFont.load_default(size)
+            return self._fonts[key]
+
+    def glyphs(self, size, name=None):
+        """GlyphCache for a font, built once per process"""
+        key = (name, size)
+        font = self.get(size, name)
+        with self._lock:
+            if key not in self._glyphs:
+                self._glyphs[key] = GlyphCache(font)
+            return self._glyphs[key]
+
+
+font_registry = FontRegistry()
@@ -0,0 +1,108 @@
+"""
+Body & Soul POS - Idempotency Keys
+A till sends an Idempotency-Key header with /api/generate_qr. The key is
+claimed in the same database transaction that saves the checkout, and
+the response is stored with it, so a retried request gets the original
+result back without a second transaction, receipt number or QR upload.
+Keys expire after IDEMPOTENCY_TTL seconds.
+"""
+
+import hashlib
+import json
+import os
+import time
+
+IDEMPOTENCY_TTL = float(os.getenv('IDEMPOTENCY_TTL', 86400))  # seconds a key is remembered
+IDEMPOTENCY_SWEEP_SECONDS = 300  # how often a worker deletes expired keys
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyConflict(Exception):
+    """The key was already used for a different request"""
+
+
+def ensure_idempotency_keys(cursor, db_type):
+    """Create the idempotency_keys table if missing"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            key TEXT PRIMARY KEY,
+            fingerprint TEXT NOT NULL,
+            status_code INTEGER,
+            response TEXT,
+            created_at DOUBLE PRECISION NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created ON idempotency_keys (created_at)')
+
+
+def request_fingerprint(payload):
+    """Stable hash of a JSON request body"""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+class IdempotencyStore:
+    """Claims keys and stores responses through the caller's cursor"""
+
+    def __init__(self, ttl=IDEMPOTENCY_TTL, sweep_seconds=IDEMPOTENCY_SWEEP_SECONDS):
+        self.ttl = ttl
+        self.sweep_seconds = sweep_seconds
+        self._table_ready = False
+        self._last_sweep = 0.0
+        self.replays = 0
+
+    def _ensure_table(self, cursor, db_type):
+        if not self._table_ready:
+            ensure_idempotency_keys(cursor, db_type)
+            self._table_ready = True
+
+    def lookup(self, cursor, db_type, key, fingerprint):
+        """(status_code, response dict) stored for a live key, or None.
+
+        Raises IdempotencyConflict if the key belongs to a different request.
+        A key claimed by a request that has not committed yet also returns None.
+        """
+        self._ensure_table(cursor, db_type)
+        placeholder = '%s' if db_type == 'postgresql' else '?'
+        cursor.execute(f'''
+            SELECT fingerprint, status_code, response FROM idempotency_keys
+            WHERE key = {placeholder} AND created_at >= {placeholder}
+        ''', (key, time.time() - self.ttl))
+        row = cursor.fetchone()
+        if not row:
+            return None
+        if row[0] != fingerprint:
+            raise IdempotencyConflict(f"Idempotency-Key {key} was already used for a different request")
+        if row[2] is None:
+            return None
+        self.replays += 1
+        return row[1], json.loads(row[2])
+
+    def claim(self, cursor, db_type, key, fingerprint):
+        """Take the key for this request (or an expired one over); False if another request holds it"""
+        self._ensure_table(cursor, db_type)
+        placeholder = '%s' if db_type == 'postgresql' else '?'
+        now = time.time()
+        self._sweep(cursor, placeholder, now)
+        cursor.execute(f'''
+            INSERT INTO idempotency_keys (key, fingerprint, created_at)
+            VALUES ({placeholder}, {placeholder}, {placeholder})
+            ON CONFLICT (key) DO UPDATE SET
+                fingerprint = EXCLUDED.fingerprint, status_code = NULL, response = NULL,
+                created_at = EXCLUDED.created_at
+            WHERE idempotency_keys.created_at < {placeholder}
+        ''', (key, fingerprint, now, now - self.ttl))
+        return cursor.rowcount == 1
+
+    def save(self, cursor, db_type, key, status_code, response):
+        """Store the response for a claimed key (same transaction as the claim)"""
+        placeholder = '%s' if db_type == 'postgresql' else '?'
+        cursor.execute(f'''
+            UPDATE idempotency_keys SET status_code = {placeholder}, response = {placeholder}
+            WHERE key = {placeholder}
+        ''', (status_code, json.dumps(response), key))
+
+    def _sweep(self, cursor, placeholder, now):
+        if now - self._last_sweep < self.sweep_seconds:
+            return
+        self._last_sweep = now
+        cursor.execute(f'DELETE FROM idempotency_keys WHERE created_at < {placeholder}', (now - self.ttl,))
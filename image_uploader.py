@@ -1,7 +1,8 @@
+import io
 import os
 import time
 from PIL import Image
-from typing import Optional
+from typing import Optional, Tuple, Union
 from payment_terminal import PaymentTerminalController
 
 class ESP32ImageUploader(PaymentTerminalController):
@@ -90,52 +91,65 @@ class ESP32ImageUploader(PaymentTerminalController):
             self.logger.error(f"Error getting free memory: {e}")
             return None
     
-    def validate_image(self, image_path: str) -> bool:
-        """Validate image dimensions and file size"""
+    def _image_bytes(self, image: Union[str, bytes]):
+        """Encoded image as a byte memoryview, from a path or a bytes-like object; None if the file is missing"""
+        if not isinstance(image, (bytes, bytearray, memoryview)):
+            if not os.path.exists(image):
+                self.logger.error(f"Image file not found: {image}")
+                return None
+            with open(image, 'rb') as f:
+                image = f.read()
+        # Chunks are then slices of one view, not copies
+        return memoryview(image).cast('B')
+    
+    def _check_image(self, file_bytes, size: Optional[Tuple[int, int]] = None) -> bool:
+        """Check encoded size and dimensions; size (width, height) skips reading the image header"""
+        file_size_kb = len(file_bytes) / 1024
+        if file_size_kb > self.max_file_size_kb:
+            self.logger.error(f"Image too large: {file_size_kb:.1f}KB (max: {self.max_file_size_kb}KB)")
+            return False
+        
+        if size is None:
+            # Header only: PIL does not decode pixels until asked
+            with Image.open(io.BytesIO(file_bytes)) as img:
+                size = img.size
+        width, height = size
+        if width > self.max_width:
+            self.logger.error(f"Image width too large: {width}px (max: {self.max_width}px)")
+            return False
+        if height > self.max_height:
+            self.logger.error(f"Image height too large: {height}px (max: {self.max_height}px)")
+            return False
+        
+        self.logger.info(f"Image validation passed: {width}x{height}, {file_size_kb:.1f}KB")
+        return True
+    
+    def validate_image(self, image: Union[str, bytes], size: Optional[Tuple[int, int]] = None) -> bool:
+        """Validate image dimensions and file size (image is a path or encoded bytes)"""
         try:
-            # Check if file exists
-            if not os.path.exists(image_path):
-                self.logger.error(f"Image file not found: {image_path}")
-                return False
-            
-            # Check file size
-            file_size_kb = os.path.getsize(image_path) / 1024
-            if file_size_kb > self.max_file_size_kb:
-                self.logger.error(f"Image too large: {file_size_kb:.1f}KB (max: {self.max_file_size_kb}KB)")
-                return False
-            
-            # Check image dimensions
-            with Image.open(image_path) as img:
-                width, height = img.size
-                if width > self.max_width:
-                    self.logger.error(f"Image width too large: {width}px (max: {self.max_width}px)")
-                    return False
-                if height > self.max_height:
-                    self.logger.error(f"Image height too large: {height}px (max: {self.max_height}px)")
-                    return False
-            
-            self.logger.info(f"Image validation passed: {width}x{height}, {file_size_kb:.1f}KB")
-            return True
-            
+            file_bytes = self._image_bytes(image)
+            return file_bytes is not None and self._check_image(file_bytes, size)
         except Exception as e:
             self.logger.error(f"Error validating image: {e}")
             return False
     
-    def upload_image(self, image_path: str, file_number: int, chunk_size: int = 1024) -> bool:
-        """Upload image to ESP32 terminal"""
+    def upload_image(self, image: Union[str, bytes], file_number: int, chunk_size: int = 1024,
+                     size: Optional[Tuple[int, int]] = None) -> bool:
+        """Upload image to ESP32 terminal.
+
+        image is a file path or the encoded JPEG (bytes, bytearray or memoryview);
+        pass size (width, height) for an image rendered in memory to skip re-reading it.
+        """
         try:
             # Validate inputs
             if not (1 <= file_number <= 99):
                 self.logger.error("File number must be between 1 and 99")
                 return False
             
-            if not self.validate_image(image_path):
+            file_bytes = self._image_bytes(image)
+            if file_bytes is None or not self._check_image(file_bytes, size):
                 return False
             
-            # Read image file
-            with open(image_path, 'rb') as f:
-                file_bytes = f.read()
-            
             file_size = len(file_bytes)
             filename = f"{file_number}.jpeg"
             
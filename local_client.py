@@ -0,0 +1,230 @@
+"""
+Body & Soul POS - Local Service Client
+Shared keep-alive HTTP client for cloud -> local service calls, with
+per-endpoint timeouts, jittered retries for idempotent calls and a
+circuit breaker per local service URL so checkouts fail fast while the
+store PC is known to be offline.
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+LOCAL_HTTP_POOL_SIZE = int(os.getenv('LOCAL_HTTP_POOL_SIZE', 10))
+LOCAL_HTTP_RETRIES = int(os.getenv('LOCAL_HTTP_RETRIES', 2))
+LOCAL_HTTP_BACKOFF = float(os.getenv('LOCAL_HTTP_BACKOFF', 0.2))  # seconds, doubled per retry
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', 3))
+BREAKER_RESET_SECONDS = float(os.getenv('BREAKER_RESET_SECONDS', 15))
+
+# (connect, read) timeouts in seconds per local service endpoint
+ENDPOINT_TIMEOUTS = {
+    'health': (1, 2),
+    'generate_qr': (2, 30),
+    'checkout': (2, 30),
+    'payment_complete': (2, 10),
+}
+DEFAULT_TIMEOUT = (2, 10)
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of calling a local service whose breaker is open"""
+
+
+class CircuitBreaker:
+    """closed -> open after repeated connection failures -> half_open after a cool-down"""
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        """True if a call may go out; half_open lets a single trial call through"""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    def snapshot(self):
+        with self._lock:
+            state = self.state
+            retry_in = None
+            if state == 'open':
+                retry_in = round(self.reset_seconds - (time.monotonic() - self.opened_at), 1)
+            return {'state': state, 'failures': self.failures, 'retry_in': retry_in}
+
+
+class LocalServiceClient:
+    """requests.Session wrapper used for every call to a local service"""
+
+    def __init__(self, api_key, pool_size=LOCAL_HTTP_POOL_SIZE, retries=LOCAL_HTTP_RETRIES,
+                 backoff=LOCAL_HTTP_BACKOFF):
+        self.api_key = api_key
+        self.retries = retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._breakers = {}
+        self._lock = threading.Lock()
+        self.observer = None  # optional callable(endpoint, seconds, outcome), for metrics
+
+    def breaker(self, base_url):
+        with self._lock:
+            if base_url not in self._breakers:
+                self._breakers[base_url] = CircuitBreaker()
+            return self._breakers[base_url]
+
+    def breaker_state(self, base_url):
+        """Breaker snapshot for /api/local_status"""
+        return self.breaker(base_url).snapshot()
+
+    def request(self, method, base_url, endpoint, idempotent=False, use_breaker=True, observe=True, **kwargs):
+        """Call {base_url}/{endpoint}; retries only idempotent calls on connection errors/timeouts.
+
+        observe=False keeps the call out of the observer's metrics (discovery probes).
+        """
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            response = self._request(method, base_url, endpoint, idempotent, use_breaker, **kwargs)
+            outcome = 'ok'
+            return response
+        except CircuitOpenError:
+            outcome = 'circuit_open'
+            raise
+        except requests.exceptions.Timeout:
+            outcome = 'timeout'
+            raise
+        except requests.exceptions.ConnectionError:
+            outcome = 'connection_error'
+            raise
+        finally:
+            if self.observer and observe:
+                self.observer(endpoint, time.perf_counter() - started, outcome)
+
+    def _request(self, method, base_url, endpoint, idempotent, use_breaker, **kwargs):
+        breaker = self.breaker(base_url) if use_breaker else None
+        if breaker and not breaker.allow():
+            raise CircuitOpenError(f"Local service at {base_url} is marked offline; retrying in a few seconds")
+
+        kwargs.setdefault('timeout', ENDPOINT_TIMEOUTS.get(endpoint, DEFAULT_TIMEOUT))
+        headers = kwargs.pop('headers', {})
+        headers.setdefault('X-API-Key', self.api_key)
+
+        attempts = 1 + (self.retries if idempotent else 0)
+        for attempt in range(attempts):
+            try:
+                response = self.session.request(method, f"{base_url}/{endpoint}", headers=headers, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt + 1 < attempts:
+                    # Full jitter keeps retries from several tills in step
+                    time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+                    continue
+                if breaker:
+                    breaker.record_failure()
+                raise
+            except Exception:
+                if breaker:
+                    breaker.record_failure()
+                raise
+            if breaker:
+                breaker.record_success()
+            return response
+
+    def get(self, base_url, endpoint, **kwargs):
+        return self.request('GET', base_url, endpoint, idempotent=True, **kwargs)
+
+    def post(self, base_url, endpoint, idempotent=False, **kwargs):
+        return self.request('POST', base_url, endpoint, idempotent=idempotent, **kwargs)
+
+class AsyncLocalServiceClient:
+    """httpx.AsyncClient counterpart of LocalServiceClient for the ASGI app.
+
+    Shares the sync client's circuit breakers and metrics observer, so a
+    store PC marked offline by one path is skipped by the other too.
+    """
+
+    def __init__(self, sync_client, pool_size=LOCAL_HTTP_POOL_SIZE):
+        import httpx
+        self.sync_client = sync_client
+        self.client = httpx.AsyncClient(limits=httpx.Limits(max_connections=pool_size * 10,
+                                                            max_keepalive_connections=pool_size))
+        self._transport_errors = (httpx.ConnectError, httpx.TimeoutException)
+        self._timeout_error = httpx.TimeoutException
+
+    async def get(self, base_url, endpoint, **kwargs):
+        """GET {base_url}/{endpoint} with the same timeouts, retries and breaker as the sync client"""
+        import httpx
+        sync = self.sync_client
+        breaker = sync.breaker(base_url)
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            if not breaker.allow():
+                outcome = 'circuit_open'
+                raise CircuitOpenError(f"Local service at {base_url} is marked offline; retrying in a few seconds")
+            connect, read = ENDPOINT_TIMEOUTS.get(endpoint, DEFAULT_TIMEOUT)
+            headers = kwargs.pop('headers', {})
+            headers.setdefault('X-API-Key', sync.api_key)
+            for attempt in range(1 + sync.retries):
+                try:
+                    response = await self.client.get(f"{base_url}/{endpoint}", headers=headers,
+                                                     timeout=httpx.Timeout(read, connect=connect), **kwargs)
+                except self._transport_errors as e:
+                    if attempt < sync.retries:
+                        # Full jitter, as in LocalServiceClient._request
+                        await asyncio.sleep(random.uniform(0, sync.backoff * (2 ** attempt)))
+                        continue
+                    breaker.record_failure()
+                    if isinstance(e, self._timeout_error):
+                        outcome = 'timeout'
+                        raise requests.exceptions.Timeout(str(e)) from e
+                    outcome = 'connection_error'
+                    raise requests.exceptions.ConnectionError(str(e)) from e
+                except Exception:
+                    breaker.record_failure()
+                    raise
+                breaker.record_success()
+                outcome = 'ok'
+                return response
+        finally:
+            if sync.observer:
+                sync.observer(endpoint, time.perf_counter() - started, outcome)
+
+    async def close(self):
+        await self.client.aclose()
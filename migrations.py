@@ -0,0 +1,296 @@
+"""
+Body & Soul POS - Schema Migrations
+Numbered migrations recorded in a schema_version table, for SQLite and
+PostgreSQL. A process that finds the schema current does one SELECT and
+no DDL; otherwise it applies the missing migrations in one transaction
+(serialized between workers with an advisory lock on PostgreSQL).
+
+Add a migration by appending to MIGRATIONS; never edit one that has
+shipped.
+
+Run directly to migrate the configured database:
+    python migrations.py
+"""
+
+from catalog_cache import bump_catalog_version, ensure_catalog_version, ensure_product_listing_index
+from checkout_jobs import ensure_checkout_jobs
+from db import Database, database_url_from_env
+from discovery import ensure_discovery_table
+from idempotency import ensure_idempotency_keys
+from receipts import ensure_receipt_counter
+from sales_rollups import ensure_sales_rollups
+from stock import ensure_stock_reservations
+from terminals import ensure_terminals
+from transaction_items import ensure_transaction_items
+from transaction_journal import ensure_offline_sync
+
+MIGRATION_LOCK_ID = 4242019  # pg_advisory_xact_lock key shared by all workers
+VAT_RATE = 0.15
+
+SAMPLE_PRODUCTS = [
+    ('Body & Soul T-Shirt', 'Tops', 450.00, 'M', 'Blue', 25, '5901234123457'),
+    ('Body & Soul T-Shirt', 'Tops', 450.00, 'L', 'Blue', 20, '5901234123464'),
+    ('Body & Soul T-Shirt', 'Tops', 450.00, 'M', 'Black', 30, '5901234123471'),
+    ('Body & Soul Hoodie', 'Tops', 890.00, 'M', 'Grey', 15, '5901234123488'),
+    ('Body & Soul Hoodie', 'Tops', 890.00, 'L', 'Grey', 12, '5901234123495'),
+    ('Body & Soul Jeans', 'Bottoms', 1250.00, '32', 'Dark Blue', 18, '5901234123501'),
+    ('Body & Soul Jeans', 'Bottoms', 1250.00, '34', 'Dark Blue', 22, '5901234123518'),
+    ('Body & Soul Shorts', 'Bottoms', 650.00, 'M', 'Khaki', 20, '5901234123525'),
+    ('Body & Soul Cap', 'Accessories', 320.00, 'One Size', 'Black', 35, '5901234123532'),
+    ('Body & Soul Socks', 'Accessories', 180.00, 'One Size', 'White', 50, '5901234123549')
+]
+
+
+def create_base_tables(cursor, db_type):
+    """products and transactions"""
+    if db_type == 'postgresql':
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS products (
+                id SERIAL PRIMARY KEY,
+                name TEXT NOT NULL,
+                category TEXT NOT NULL,
+                price DECIMAL(10,2) NOT NULL,
+                size TEXT,
+                color TEXT,
+                stock INTEGER DEFAULT 0,
+                barcode TEXT UNIQUE
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS transactions (
+                id SERIAL PRIMARY KEY,
+                receipt_number TEXT UNIQUE NOT NULL,
+                total_amount DECIMAL(10,2) NOT NULL,
+                subtotal DECIMAL(10,2) NOT NULL,
+                vat_amount DECIMAL(10,2) NOT NULL,
+                items_json TEXT NOT NULL,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                status TEXT DEFAULT 'pending',
+                payment_method TEXT DEFAULT 'QR'
+            )
+        ''')
+    else:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS products (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                category TEXT NOT NULL,
+                price REAL NOT NULL,
+                size TEXT,
+                color TEXT,
+                stock INTEGER DEFAULT 0,
+                barcode TEXT UNIQUE
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS transactions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                receipt_number TEXT UNIQUE NOT NULL,
+                total_amount REAL NOT NULL,
+                subtotal REAL NOT NULL,
+                vat_amount REAL NOT NULL,
+                items_json TEXT NOT NULL,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                status TEXT DEFAULT 'pending',
+                payment_method TEXT DEFAULT 'QR'
+            )
+        ''')
+
+
+def _columns(cursor, db_type, table):
+    if db_type == 'postgresql':
+        cursor.execute('SELECT column_name FROM information_schema.columns WHERE table_name = %s', (table,))
+        return {row[0] for row in cursor.fetchall()}
+    cursor.execute(f'PRAGMA table_info({table})')
+    return {row[1] for row in cursor.fetchall()}
+
+
+def upgrade_legacy_tables(cursor, db_type):
+    """Columns, barcodes, receipt numbers and VAT missing from pre-enhanced databases"""
+    placeholder = '%s' if db_type == 'postgresql' else '?'
+    real = 'DECIMAL(10,2)' if db_type == 'postgresql' else 'REAL'
+    transaction_columns = _columns(cursor, db_type, 'transactions')
+    for column, definition in (('receipt_number', 'TEXT'), ('subtotal', f'{real} DEFAULT 0'),
+                               ('vat_amount', f'{real} DEFAULT 0'), ('payment_method', "TEXT DEFAULT 'QR'")):
+        if column not in transaction_columns:
+            cursor.execute(f'ALTER TABLE transactions ADD COLUMN {column} {definition}')
+            print(f"  ✓ Added transactions.{column}")
+    if 'barcode' not in _columns(cursor, db_type, 'products'):
+        cursor.execute('ALTER TABLE products ADD COLUMN barcode TEXT')
+        print("  ✓ Added products.barcode")
+
+    # Sample products created before barcodes existed
+    cursor.executemany(f'''
+        UPDATE products SET barcode = {placeholder}
+        WHERE barcode IS NULL AND name = {placeholder} AND size = {placeholder} AND color = {placeholder}
+    ''', [(barcode, name, size, color) for name, category, price, size, color, stock, barcode in SAMPLE_PRODUCTS])
+
+    cursor.execute('SELECT id FROM transactions WHERE receipt_number IS NULL ORDER BY id')
+    missing = [row[0] for row in cursor.fetchall()]
+    if missing:
+        cursor.execute("SELECT COUNT(*) FROM transactions WHERE receipt_number IS NOT NULL")
+        first = cursor.fetchone()[0] + 1
+        cursor.executemany(f'UPDATE transactions SET receipt_number = {placeholder} WHERE id = {placeholder}',
+                           [(f"BS-{number:06d}", transaction_id)
+                            for number, transaction_id in enumerate(missing, start=first)])
+        print(f"  ✓ Numbered {len(missing)} legacy transaction(s)")
+
+    cursor.execute(f'''
+        UPDATE transactions
+        SET subtotal = total_amount / {1 + VAT_RATE}, vat_amount = total_amount - total_amount / {1 + VAT_RATE}
+        WHERE subtotal IS NULL OR subtotal = 0
+    ''')
+
+
+def create_feature_tables(cursor, db_type):
+    """Tables owned by the feature modules (catalog version, jobs, items, rollups, stock, terminals, ...)"""
+    ensure_catalog_version(cursor, db_type)
+    ensure_product_listing_index(cursor)
+    ensure_receipt_counter(cursor, db_type)
+    ensure_checkout_jobs(cursor, db_type)
+    ensure_discovery_table(cursor, db_type)
+    ensure_transaction_items(cursor, db_type)
+    ensure_sales_rollups(cursor, db_type)
+    ensure_offline_sync(cursor, db_type)
+    ensure_stock_reservations(cursor, db_type)
+    ensure_terminals(cursor, db_type)
+
+
+def _indexed(cursor, db_type, table, column):
+    """True if some index on table starts with column (including UNIQUE constraints)"""
+    if db_type == 'postgresql':
+        cursor.execute('SELECT indexdef FROM pg_indexes WHERE tablename = %s', (table,))
+        return any(f'({column})' in row[0] or f'({column},' in row[0] for row in cursor.fetchall())
+    cursor.execute(f'PRAGMA index_list({table})')
+    for index in cursor.fetchall():
+        cursor.execute(f'PRAGMA index_info("{index[1]}")')
+        columns = [row[2] for row in sorted(cursor.fetchall(), key=lambda row: row[0])]
+        if columns and columns[0] == column:
+            return True
+    return False
+
+
+def create_hot_indexes(cursor, db_type):
+    """Indexes for barcode scans, receipt lookups and the status/timestamp filters"""
+    for name, table, column in (('idx_products_barcode', 'products', 'barcode'),
+                                ('idx_transactions_receipt_number', 'transactions', 'receipt_number'),
+                                ('idx_transactions_status', 'transactions', 'status'),
+                                ('idx_transactions_timestamp', 'transactions', 'timestamp')):
+        # Fresh schemas already index barcode/receipt_number through UNIQUE; only legacy ones need these
+        if not _indexed(cursor, db_type, table, column):
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({column})')
+
+
+def _unique_indexed(cursor, db_type, table, column):
+    """True if a UNIQUE index or constraint covers exactly column"""
+    if db_type == 'postgresql':
+        cursor.execute('SELECT indexdef FROM pg_indexes WHERE tablename = %s', (table,))
+        return any(row[0].startswith('CREATE UNIQUE INDEX') and row[0].endswith(f'({column})')
+                   for row in cursor.fetchall())
+    cursor.execute(f'PRAGMA index_list({table})')
+    for index in cursor.fetchall():
+        if not index[2]:
+            continue
+        cursor.execute(f'PRAGMA index_info("{index[1]}")')
+        if [row[2] for row in cursor.fetchall()] == [column]:
+            return True
+    return False
+
+
+def unique_product_barcodes(cursor, db_type):
+    """products.barcode UNIQUE on upgraded databases too (the import upserts ON CONFLICT (barcode))"""
+    if _unique_indexed(cursor, db_type, 'products', 'barcode'):
+        return
+    # Keep each barcode on its oldest product; later duplicates lose it rather than being deleted
+    cursor.execute("UPDATE products SET barcode = NULL WHERE barcode = ''")
+    cursor.execute('''
+        UPDATE products SET barcode = NULL
+        WHERE barcode IS NOT NULL
+          AND id NOT IN (SELECT MIN(id) FROM products WHERE barcode IS NOT NULL GROUP BY barcode)
+    ''')
+    if cursor.rowcount > 0:
+        print(f"  ✓ Cleared {cursor.rowcount} duplicate product barcode(s)")
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_products_barcode_unique ON products (barcode)')
+    cursor.execute('DROP INDEX IF EXISTS idx_products_barcode')  # migration 4's plain index, now redundant
+    bump_catalog_version(cursor)
+
+
+def seed_sample_products(cursor, db_type):
+    """The Body & Soul demo catalog, for an empty products table"""
+    cursor.execute('SELECT COUNT(*) FROM products')
+    if cursor.fetchone()[0]:
+        return
+    placeholder = '%s' if db_type == 'postgresql' else '?'
+    cursor.executemany(f'''
+        INSERT INTO products (name, category, price, size, color, stock, barcode)
+        VALUES ({', '.join([placeholder] * 7)})
+    ''', SAMPLE_PRODUCTS)
+    bump_catalog_version(cursor)
+
+
+MIGRATIONS = [
+    (1, 'base tables', create_base_tables),
+    (2, 'legacy columns, barcodes and receipt numbers', upgrade_legacy_tables),
+    (3, 'feature tables', create_feature_tables),
+    (4, 'hot query indexes', create_hot_indexes),
+    (5, 'sample products', seed_sample_products),
+    (6, 'idempotency keys', ensure_idempotency_keys),
+    (7, 'unique product barcodes', unique_product_barcodes),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(cursor, db_type):
+    """Highest applied migration, 0 for a database that has never been migrated"""
+    if db_type == 'postgresql':
+        cursor.execute("SELECT to_regclass('schema_version')")
+        exists = cursor.fetchone()[0] is not None
+    else:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'")
+        exists = cursor.fetchone() is not None
+    if not exists:
+        return 0
+    cursor.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version')
+    return cursor.fetchone()[0]
+
+
+def migrate(database):
+    """Apply pending migrations; returns the (version, name) pairs applied, [] when current"""
+    with database.connection() as (conn, db_type):
+        cursor = conn.cursor()
+        if schema_version(cursor, db_type) >= LATEST_VERSION:
+            return []
+
+        if db_type == 'postgresql':
+            # Workers booting together: one migrates, the rest wait and then find nothing to do
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', (MIGRATION_LOCK_ID,))
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        current = schema_version(cursor, db_type)
+        placeholder = '%s' if db_type == 'postgresql' else '?'
+        applied = []
+        for version, name, apply in MIGRATIONS:
+            if version <= current:
+                continue
+            apply(cursor, db_type)
+            cursor.execute(f'INSERT INTO schema_version (version, name) VALUES ({placeholder}, {placeholder})',
+                           (version, name))
+            applied.append((version, name))
+        return applied
+
+
+if __name__ == '__main__':
+    database = Database(database_url_from_env())
+    print("=" * 60)
+    print(f"Schema migrations ({database.db_type})")
+    print("=" * 60)
+    applied = migrate(database)
+    for version, name in applied:
+        print(f"  ✓ {version}: {name}")
+    print(f"Schema is at version {LATEST_VERSION}" + ("" if applied else " (nothing to do)"))
+    print("=" * 60)
@@ -1,89 +1,44 @@
-import requests
-import qrcode
-from PIL import Image
 from image_uploader import ESP32ImageUploader
+from qr_render import encode_jpeg
+from screen_templates import screen_templates
+from zwennpay import zwennpay_client
 
-def generate_payment_qr_with_amount(amount, output_filename="payment_qr.jpg"):
-    """Generate 320x480 JPG QR code with custom amount"""
-    
-    # ZwennPay API payload with custom amount
-    payload = {
-        "MerchantId": 56,
-        "SetTransactionAmount": True,
-        "TransactionAmount": str(amount),  # Use custom amount
-        "SetConvenienceIndicatorTip": False,
-        "ConvenienceIndicatorTip": 0,
-        "SetConvenienceFeeFixed": False,
-        "ConvenienceFeeFixed": 0,
-        "SetConvenienceFeePercentage": False,
-        "ConvenienceFeePercentage": 0,
-    }
+def render_payment_qr(amount):
+    """320x480 payment screen for amount, JPEG-encoded in memory.
+
+    Returns (jpeg memoryview, (width, height)), or None if the QR could not be generated.
+    """
     
     try:
         print(f"Generating QR for amount: MUR {amount}")
-        response = requests.post(
-            "https://api.zwennpay.com:9425/api/v1.0/Common/GetMerchantQR",
-            headers={"accept": "text/plain", "Content-Type": "application/json"},
-            json=payload,
-            timeout=20
-        )
-        
-        response.raise_for_status()
-        upi_data = response.text.strip()
+        # Shared keep-alive ZwennPay session (retries, timeouts, optional cache)
+        upi_data = zwennpay_client.merchant_qr(amount)
         print(f"✓ Got UPI data: {len(upi_data)} characters")
         
-        # Generate QR code
-        qr = qrcode.QRCode(version=1, box_size=10, border=5)
-        qr.add_data(upi_data)
-        qr.make(fit=True)
-        
-        # Create QR image
-        qr_image = qr.make_image(fill_color="black", back_color="white")
-        
-        # Create exactly 320x480 canvas with white background
-        canvas = Image.new('RGB', (320, 480), 'white')
-        
-        # Resize QR to fit with space for text below (250x250)
-        qr_size = 250
-        qr_resized = qr_image.resize((qr_size, qr_size), Image.Resampling.LANCZOS)
-        
-        # Position QR higher to leave space for text
-        x_offset = (320 - qr_size) // 2  # Center horizontally
-        y_offset = 50  # Start from top with margin
-        canvas.paste(qr_resized, (x_offset, y_offset))
-        
-        # Add amount text below QR
-        from PIL import ImageDraw, ImageFont
-        draw = ImageDraw.Draw(canvas)
+        # 320x480 screen: pre-composited 'amount' layout + QR + amount text
+        canvas = screen_templates().render('amount', upi_data, amount)
         
-        # Try to use a larger font, fallback to default if not available
-        try:
-            font = ImageFont.truetype("arial.ttf", 24)
-        except:
-            font = ImageFont.load_default()
+        # JPG with lower quality to reduce file size, never written to disk
+        jpeg = encode_jpeg(canvas)
+        print(f"✓ QR rendered: {canvas.width}x{canvas.height}, {len(jpeg)} bytes")
         
-        # Amount text
-        amount_text = f"Amount: MUR {amount}"
-        
-        # Get text size and center it
-        bbox = draw.textbbox((0, 0), amount_text, font=font)
-        text_width = bbox[2] - bbox[0]
-        text_x = (320 - text_width) // 2
-        text_y = y_offset + qr_size + 20  # 20 pixels below QR
-        
-        # Draw text in black
-        draw.text((text_x, text_y), amount_text, fill='black', font=font)
-        
-        # Save as JPG with lower quality to reduce file size
-        canvas.save(output_filename, 'JPEG', quality=70)
-        print(f"✓ QR saved as {output_filename} (320x480)")
-        
-        return output_filename
+        return jpeg, canvas.size
         
     except Exception as e:
         print(f"✗ Error generating QR: {e}")
         return None
 
+def generate_payment_qr_with_amount(amount, output_filename="payment_qr.jpg"):
+    """Generate 320x480 JPG QR code with custom amount, saved to output_filename"""
+    screen = render_payment_qr(amount)
+    if not screen:
+        return None
+    
+    with open(output_filename, 'wb') as f:
+        f.write(screen[0])
+    print(f"✓ QR saved as {output_filename} (320x480)")
+    return output_filename
+
 def upload_qr_to_device(qr_filename, slot=1, uploader=None):
     """Upload QR using existing uploader connection"""
     try:
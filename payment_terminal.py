@@ -3,11 +3,11 @@ import serial.tools.list_ports
 import logging
 import time
 from datetime import datetime
-from typing import Dict, Optional, List
-import requests
-import qrcode
-from PIL import Image
+from typing import Dict, Optional, List, Tuple
 from config import SERIAL_CONFIG
+from qr_render import encode_jpeg
+from screen_templates import screen_templates
+from zwennpay import zwennpay_client
 
 class PaymentTerminalController:
     """Controller for payment terminal serial communication"""
@@ -54,56 +54,19 @@ class PaymentTerminalController:
     def generate_dynamic_qr(self) -> bool:
         """Generate QR from ZwennPay API and upload to ESP32"""
         try:
-            # ZwennPay API payload
-            payload = {
-                "MerchantId": 56,
-                "SetTransactionAmount": True,
-                "TransactionAmount": "200",
-                "SetConvenienceIndicatorTip": False,
-                "ConvenienceIndicatorTip": 0,
-                "SetConvenienceFeeFixed": False,
-                "ConvenienceFeeFixed": 0,
-                "SetConvenienceFeePercentage": False,
-                "ConvenienceFeePercentage": 0,
-            }
-            
             self.logger.info("Calling ZwennPay API for dynamic QR...")
-            response = requests.post(
-                "https://api.zwennpay.com:9425/api/v1.0/Common/GetMerchantQR",
-                headers={"accept": "text/plain", "Content-Type": "application/json"},
-                json=payload,
-                timeout=20
-            )
-            
-            response.raise_for_status()
-            upi_data = response.text.strip()
+            upi_data = zwennpay_client.merchant_qr("200")
             self.logger.info(f"Got UPI data: {len(upi_data)} characters")
             
-            # Generate QR code
-            qr = qrcode.QRCode(version=1, box_size=10, border=5)
-            qr.add_data(upi_data)
-            qr.make(fit=True)
-            
-            # Create QR image and resize to 320x480 canvas
-            qr_image = qr.make_image(fill_color="black", back_color="white")
-            
-            # Create 320x480 canvas and center the QR code
-            canvas = Image.new('RGB', (320, 480), 'white')
-            qr_size = 280  # QR size that fits nicely in 320x480
-            qr_resized = qr_image.resize((qr_size, qr_size), Image.Resampling.LANCZOS)
-            
-            # Center the QR on the canvas
-            x_offset = (320 - qr_size) // 2
-            y_offset = (480 - qr_size) // 2
-            canvas.paste(qr_resized, (x_offset, y_offset))
+            # 320x480 screen with the QR centred (pre-composited 'centered' layout)
+            canvas = screen_templates().render('centered', upi_data)
             
-            # Save temporary QR image
-            temp_qr_path = "temp_payment_qr.png"
-            canvas.save(temp_qr_path)
-            self.logger.info("QR code generated and resized")
+            # JPEG in memory (the device stores slots as .jpeg); no temp file
+            jpeg = encode_jpeg(canvas)
+            self.logger.info("QR code generated")
             
             # Upload to ESP32 as slot 1 (more likely to be in rotation)
-            if self.upload_qr_image(temp_qr_path, 1):
+            if self.upload_qr_image(jpeg, 1, size=canvas.size):
                 self.logger.info("Dynamic QR uploaded successfully")
                 return True
             else:
@@ -114,8 +77,8 @@ class PaymentTerminalController:
             self.logger.error(f"Error generating dynamic QR: {e}")
             return False
     
-    def upload_qr_image(self, image_path: str, file_number: int) -> bool:
-        """Upload QR image to ESP32 using proven working method"""
+    def upload_qr_image(self, image, file_number: int, size: Optional[Tuple[int, int]] = None) -> bool:
+        """Upload QR image (path or encoded bytes) to ESP32 using proven working method"""
         try:
             from image_uploader import ESP32ImageUploader
             
@@ -125,7 +88,7 @@ class PaymentTerminalController:
             temp_uploader.logger = self.logger
             
             # Use the proven upload method
-            return temp_uploader.upload_image(image_path, file_number, chunk_size=1024)
+            return temp_uploader.upload_image(image, file_number, chunk_size=1024, size=size)
             
         except Exception as e:
             self.logger.error(f"Error uploading QR image: {e}")
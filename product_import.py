@@ -0,0 +1,204 @@
+"""
+Body & Soul POS - Bulk Product Import
+Streams a product CSV, validates each row as it is read and upserts the
+good rows by barcode in one database transaction: PostgreSQL COPYs them
+into a temporary staging table and merges with a single INSERT ... ON
+CONFLICT, SQLite uses batched executemany. Bad rows are reported and
+skipped; they never abort the import. A file that is not valid CSV is
+refused as a whole (CSVFormatError).
+
+The stock column is the count on the shelf. Units held by unpaid
+checkouts are already out of products.stock and come back when their
+reservation is released, so they are subtracted from the imported count.
+
+CSV header: name,category,price,size,color,stock,barcode
+
+Run directly to import a file:
+    python product_import.py products.csv
+"""
+
+import csv
+import io
+import math
+import sys
+import time
+
+from catalog_cache import bump_catalog_version, ensure_catalog_version
+from db import Database, database_url_from_env
+from stock import ensure_stock_reservations
+
+IMPORT_COLUMNS = ('name', 'category', 'price', 'size', 'color', 'stock', 'barcode')
+REQUIRED_COLUMNS = ('name', 'category', 'price', 'barcode')
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_REJECTS = 100
+MAX_PRICE = 99999999.99  # products.price is DECIMAL(10,2)
+# Imported stock less what unpaid checkouts hold (see module docstring)
+ON_SHELF_STOCK = '''excluded.stock - COALESCE((
+    SELECT SUM(r.qty) FROM stock_reservations r
+    WHERE r.product_id = products.id AND r.status = 'reserved'
+), 0)'''
+
+
+class CSVFormatError(ValueError):
+    """The CSV as a whole cannot be imported (e.g. missing columns)"""
+
+
+def validate_row(row):
+    """Return a products tuple in IMPORT_COLUMNS order, or raise ValueError with the reason"""
+    name = (row.get('name') or '').strip()
+    category = (row.get('category') or '').strip()
+    barcode = (row.get('barcode') or '').strip()
+    if not name:
+        raise ValueError('name is empty')
+    if not category:
+        raise ValueError('category is empty')
+    if not barcode or len(barcode) > 64:
+        raise ValueError('barcode must be 1-64 characters')
+    try:
+        price = round(float(row.get('price')), 2)
+    except (TypeError, ValueError):
+        raise ValueError(f"price {row.get('price')!r} is not a number")
+    if not math.isfinite(price):
+        raise ValueError(f"price {row.get('price')!r} is not a number")
+    if price < 0:
+        raise ValueError('price is negative')
+    if price > MAX_PRICE:
+        raise ValueError(f"price {price} is above {MAX_PRICE}")
+    stock_text = (row.get('stock') or '0').strip()
+    try:
+        stock = int(stock_text)
+    except ValueError:
+        raise ValueError(f"stock {stock_text!r} is not a whole number")
+    if stock < 0:
+        raise ValueError('stock is negative')
+    size = (row.get('size') or '').strip() or None
+    color = (row.get('color') or '').strip() or None
+    return (name, category, price, size, color, stock, barcode)
+
+
+def read_rows(stream, report):
+    """Yield validated product tuples from a text stream, recording rejects in report"""
+    reader = csv.DictReader(stream)
+    try:
+        yield from _read_rows(reader, report)
+    except csv.Error as e:
+        raise CSVFormatError(f"CSV is malformed after line {reader.line_num}: {e}")
+
+
+def _read_rows(reader, report):
+    header = [column.strip().lower() for column in (reader.fieldnames or [])]
+    missing = [column for column in REQUIRED_COLUMNS if column not in header]
+    if missing:
+        raise CSVFormatError(f"CSV is missing column(s): {', '.join(missing)}")
+    reader.fieldnames = header
+
+    seen = set()
+    for row in reader:
+        report['rows'] += 1
+        try:
+            product = validate_row(row)
+            if product[6] in seen:
+                raise ValueError(f"barcode {product[6]} appears more than once")
+        except ValueError as e:
+            report['rejected_count'] += 1
+            if len(report['rejected']) < MAX_REPORTED_REJECTS:
+                report['rejected'].append({'line': reader.line_num, 'error': str(e)})
+            continue
+        seen.add(product[6])
+        yield product
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _copy_batch(cursor, batch):
+    """COPY one batch into the staging table"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for name, category, price, size, color, stock, barcode in batch:
+        writer.writerow((name, category, price, '' if size is None else size,
+                         '' if color is None else color, stock, barcode))
+    buffer.seek(0)
+    cursor.copy_expert(f'''
+        COPY product_import_staging ({', '.join(IMPORT_COLUMNS)})
+        FROM STDIN WITH (FORMAT csv, NULL '')
+    ''', buffer)
+
+
+def import_products(database, stream, batch_size=IMPORT_BATCH_SIZE):
+    """Upsert products from a CSV text stream; returns a report dict"""
+    report = {'rows': 0, 'imported': 0, 'rejected_count': 0, 'rejected': []}
+    started = time.perf_counter()
+
+    with database.connection() as (conn, db_type):
+        cursor = conn.cursor()
+        ensure_catalog_version(cursor, db_type)
+        ensure_stock_reservations(cursor, db_type)
+        rows = read_rows(stream, report)
+
+        if db_type == 'postgresql':
+            cursor.execute('''
+                CREATE TEMP TABLE product_import_staging (
+                    name TEXT, category TEXT, price DECIMAL(10,2), size TEXT,
+                    color TEXT, stock INTEGER, barcode TEXT
+                ) ON COMMIT DROP
+            ''')
+            for batch in _batches(rows, batch_size):
+                _copy_batch(cursor, batch)
+            cursor.execute(f'''
+                INSERT INTO products ({', '.join(IMPORT_COLUMNS)})
+                SELECT {', '.join(IMPORT_COLUMNS)} FROM product_import_staging
+                ON CONFLICT (barcode) DO UPDATE SET
+                    name = EXCLUDED.name, category = EXCLUDED.category, price = EXCLUDED.price,
+                    size = EXCLUDED.size, color = EXCLUDED.color, stock = {ON_SHELF_STOCK}
+            ''')
+            report['imported'] = cursor.rowcount
+        else:
+            for batch in _batches(rows, batch_size):
+                cursor.executemany(f'''
+                    INSERT INTO products ({', '.join(IMPORT_COLUMNS)})
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (barcode) DO UPDATE SET
+                        name = excluded.name, category = excluded.category, price = excluded.price,
+                        size = excluded.size, color = excluded.color, stock = {ON_SHELF_STOCK}
+                ''', batch)
+                report['imported'] += len(batch)
+
+        if report['imported']:
+            bump_catalog_version(cursor)
+
+    elapsed = time.perf_counter() - started
+    report['seconds'] = round(elapsed, 3)
+    report['rows_per_second'] = round(report['rows'] / elapsed) if elapsed > 0 else report['rows']
+    return report
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python product_import.py products.csv")
+        sys.exit(1)
+
+    database = Database(database_url_from_env())
+    print("=" * 60)
+    print(f"Importing {sys.argv[1]} ({database.db_type})")
+    print("=" * 60)
+    with open(sys.argv[1], newline='', encoding='utf-8-sig') as f:
+        try:
+            result = import_products(database, f)
+        except CSVFormatError as e:
+            print(f"✗ {e}")
+            sys.exit(1)
+    for reject in result['rejected']:
+        print(f"  ✗ Line {reject['line']}: {reject['error']}")
+    print("=" * 60)
+    print(f"Done: {result['imported']} imported, {result['rejected_count']} rejected of {result['rows']} rows "
+          f"in {result['seconds']}s ({result['rows_per_second']} rows/sec)")
+    print("=" * 60)
@@ -0,0 +1,63 @@
+"""
+Payment QR rasteriser
+Renders a QR module matrix straight at its display size: the module size
+is the largest whole number of pixels that fits the target box, so every
+module edge lands on a pixel boundary. No oversized render, no LANCZOS
+resample, and the flat black/white areas compress to a smaller JPEG.
+"""
+
+import io
+
+import qrcode
+from PIL import Image
+
+CANVAS_SIZE = (320, 480)  # ESP32 display, portrait
+QR_BORDER = 4  # quiet zone in modules (QR spec minimum)
+JPEG_QUALITY = 70  # keeps a payment screen well under the device's 80KB limit
+
+
+def qr_matrix(data, border=QR_BORDER):
+    """Module matrix for data (True = dark), quiet zone included"""
+    qr = qrcode.QRCode(border=border, error_correction=qrcode.constants.ERROR_CORRECT_M)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr.get_matrix()
+
+
+def render_qr(data, size, border=QR_BORDER):
+    """Greyscale QR image no larger than size x size, with integer-sized modules"""
+    return render_matrix(qr_matrix(data, border), size)
+
+
+def render_matrix(matrix, size):
+    """Rasterise a module matrix at the largest integer module size that fits size x size"""
+    modules = len(matrix)
+    module_px = size // modules
+    if module_px < 1:
+        raise ValueError(f"{size}px is too small for a {modules}-module QR code")
+    # One pixel per module, then an exact integer upscale
+    pixels = bytes(0 if dark else 255 for row in matrix for dark in row)
+    image = Image.frombytes('L', (modules, modules), pixels)
+    return image.resize((modules * module_px, modules * module_px), Image.Resampling.NEAREST)
+
+
+def paste_qr(canvas, data, box):
+    """Render data into the square box (left, top, size) of canvas, centred; returns the QR's (x, y, size)"""
+    left, top, size = box
+    qr_image = render_qr(data, size)
+    offset = (size - qr_image.width) // 2
+    canvas.paste(qr_image, (left + offset, top + offset))
+    return left + offset, top + offset, qr_image.width
+
+
+def centered_box(size, top=None, canvas_size=CANVAS_SIZE):
+    """Square box of side size, centred horizontally (and vertically unless top is given)"""
+    width, height = canvas_size
+    return (width - size) // 2, (height - size) // 2 if top is None else top, size
+
+
+def encode_jpeg(image, quality=JPEG_QUALITY):
+    """JPEG-encode image in memory; returns a memoryview over the encoded bytes"""
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=quality)
+    return buffer.getbuffer()
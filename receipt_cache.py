@@ -0,0 +1,80 @@
+"""
+Body & Soul POS - Receipt Cache
+Completed receipts never change, so each worker keeps their serialized
+JSON in an LRU bounded by total bytes. Entries are found by transaction
+id or receipt number and carry a strong ETag for conditional reprints.
+Pending receipts are never cached.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+RECEIPT_CACHE_BYTES = int(os.getenv('RECEIPT_CACHE_BYTES', 4 * 1024 * 1024))
+
+
+class ReceiptCache:
+    """Process-local LRU of completed receipt bodies"""
+
+    def __init__(self, max_bytes=RECEIPT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # transaction_id -> (receipt_number, body, etag)
+        self._by_number = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, transaction_id=None, receipt_number=None):
+        """Return (body, etag) for a cached receipt, or None"""
+        with self._lock:
+            if transaction_id is None:
+                transaction_id = self._by_number.get(receipt_number)
+            entry = self._entries.get(transaction_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(transaction_id)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, transaction_id, receipt_number, body):
+        """Cache a completed receipt's JSON bytes; returns its strong ETag"""
+        etag = hashlib.sha1(body).hexdigest()
+        if len(body) > self.max_bytes:
+            return etag
+        with self._lock:
+            self._discard(transaction_id)
+            self._entries[transaction_id] = (receipt_number, body, etag)
+            self._by_number[receipt_number] = transaction_id
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._discard(oldest)
+                self.evictions += 1
+        return etag
+
+    def invalidate(self, transaction_id):
+        """Drop a receipt whose transaction status changed"""
+        with self._lock:
+            self._discard(transaction_id)
+
+    def _discard(self, transaction_id):
+        """Remove an entry; caller holds self._lock"""
+        entry = self._entries.pop(transaction_id, None)
+        if entry is not None:
+            self._by_number.pop(entry[0], None)
+            self._bytes -= len(entry[1])
+
+    def stats(self):
+        with self._lock:
+            return {
+                'receipts': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,117 @@
+"""
+Body & Soul POS - Receipt Number Allocator
+Hands out BS-numbers from a database sequence (PostgreSQL) or counter
+table (SQLite) in blocks reserved per worker, so most checkouts need no
+extra round trip and concurrent tills never collide.
+"""
+
+import os
+import threading
+from collections import deque
+
+RECEIPT_PREFIX = 'BS'
+RECEIPT_BLOCK_SIZE = int(os.getenv('RECEIPT_BLOCK_SIZE', 20))
+RECEIPT_SEQUENCE = 'receipt_number_seq'
+
+
+def format_receipt_number(number):
+    """Format a receipt counter value, e.g. 42 -> BS-000042"""
+    return f"{RECEIPT_PREFIX}-{number:06d}"
+
+
+def ensure_receipt_counter(cursor, db_type):
+    """Create the receipt sequence/counter, seeded past the highest existing receipt"""
+    if db_type == 'postgresql':
+        cursor.execute(f"SELECT to_regclass('{RECEIPT_SEQUENCE}')")
+        if cursor.fetchone()[0] is not None:
+            return
+        cursor.execute(f'''
+            SELECT COALESCE(MAX(CAST(SUBSTRING(receipt_number FROM 4) AS INTEGER)), 0)
+            FROM transactions
+            WHERE receipt_number LIKE '{RECEIPT_PREFIX}-%'
+        ''')
+        last_number = cursor.fetchone()[0]
+        cursor.execute(f'CREATE SEQUENCE IF NOT EXISTS {RECEIPT_SEQUENCE} START WITH {last_number + 1}')
+    else:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS receipt_counter (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute(f'''
+            INSERT OR IGNORE INTO receipt_counter (name, value)
+            SELECT 'receipt', COALESCE(MAX(CAST(SUBSTR(receipt_number, 4) AS INTEGER)), 0)
+            FROM transactions
+            WHERE receipt_number LIKE '{RECEIPT_PREFIX}-%'
+        ''')
+
+
+class ReceiptAllocator:
+    """Per-worker pool of pre-reserved receipt numbers"""
+
+    def __init__(self, database, block_size=RECEIPT_BLOCK_SIZE):
+        self.database = database
+        self.block_size = max(1, block_size)
+        self._numbers = deque()
+        self._lock = threading.Lock()
+        self._counter_ready = False
+        self._pid = os.getpid()
+
+    def _reserve_block(self):
+        """Reserve the next block of numbers in its own transaction.
+
+        Must not run inside another db.connection() block: a rolled-back
+        SQLite counter update would hand the same block to another worker.
+        """
+        with self.database.connection() as (conn, db_type):
+            cursor = conn.cursor()
+            if not self._counter_ready:
+                ensure_receipt_counter(cursor, db_type)
+
+            if db_type == 'postgresql':
+                # nextval() is non-transactional and never hands out a value twice
+                cursor.execute(
+                    f"SELECT nextval('{RECEIPT_SEQUENCE}') FROM generate_series(1, %s)",
+                    (self.block_size,)
+                )
+                block = sorted(row[0] for row in cursor.fetchall())
+            else:
+                # The UPDATE takes SQLite's write lock, so the block is ours alone
+                cursor.execute(
+                    "UPDATE receipt_counter SET value = value + ? WHERE name = 'receipt'",
+                    (self.block_size,)
+                )
+                cursor.execute("SELECT value FROM receipt_counter WHERE name = 'receipt'")
+                last_number = cursor.fetchone()[0]
+                block = list(range(last_number - self.block_size + 1, last_number + 1))
+        # Only once the counter's creation has committed
+        self._counter_ready = True
+        return block
+
+    def next_number(self):
+        """Return the next receipt number as an int"""
+        with self._lock:
+            if self._pid != os.getpid():
+                # Numbers reserved before a fork belong to the parent
+                self._numbers.clear()
+                self._pid = os.getpid()
+            if not self._numbers:
+                self._numbers.extend(self._reserve_block())
+            return self._numbers.popleft()
+
+    def next_receipt(self):
+        """Return the next formatted receipt number"""
+        return format_receipt_number(self.next_number())
+
+    def give_back(self, receipt_number):
+        """Return an unused receipt number so the next checkout on this worker gets it"""
+        with self._lock:
+            if self._pid == os.getpid():
+                self._numbers.appendleft(int(receipt_number.split('-', 1)[1]))
+
+    def reset(self):
+        """Drop reserved numbers (e.g. after the counter was re-seeded)"""
+        with self._lock:
+            self._numbers.clear()
+            self._counter_ready = False
@@ -0,0 +1,251 @@
+"""
+Body & Soul POS - Sales Rollups
+Hourly and daily sales totals plus per-product daily units, kept up to
+date as each payment completes. The /api/reports endpoints read only
+these tables, so a dashboard costs O(days) rather than O(transactions).
+
+Run directly to rebuild the rollups from completed transactions:
+    python sales_rollups.py
+"""
+
+import sys
+import time
+
+from db import Database, database_url_from_env
+
+REBUILD_BATCH_SIZE = 500
+
+
+def ensure_sales_rollups(cursor, db_type):
+    """Create the rollup tables if missing"""
+    money = 'DECIMAL(12,2)' if db_type == 'postgresql' else 'REAL'
+    for table, key in (('sales_hourly', 'hour'), ('sales_daily', 'day')):
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                {key} TEXT PRIMARY KEY,
+                transactions INTEGER NOT NULL DEFAULT 0,
+                units INTEGER NOT NULL DEFAULT 0,
+                revenue {money} NOT NULL DEFAULT 0,
+                vat {money} NOT NULL DEFAULT 0
+            )
+        ''')
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS product_sales_daily (
+            day TEXT NOT NULL,
+            product_id INTEGER NOT NULL,
+            barcode TEXT,
+            name TEXT,
+            category TEXT,
+            units INTEGER NOT NULL DEFAULT 0,
+            revenue {money} NOT NULL DEFAULT 0,
+            vat {money} NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, product_id)
+        )
+    ''')
+
+
+def buckets(timestamp):
+    """('YYYY-MM-DD HH:00', 'YYYY-MM-DD') for a transactions.timestamp value"""
+    text = str(timestamp)
+    return f"{text[:13]}:00", text[:10]
+
+
+def complete_transaction(cursor, db_type, transaction_id):
+    """Mark a transaction completed and add it to the rollups in the caller's DB transaction.
+
+    Only a pending transaction completes: returns False if it was already
+    completed, failed (its stock released) or does not exist, so a repeated
+    payment_complete call is never counted twice.
+    """
+    placeholder = '%s' if db_type == 'postgresql' else '?'
+    cursor.execute(f'''
+        UPDATE transactions
+        SET status = 'completed'
+        WHERE id = {placeholder} AND status = 'pending'
+    ''', (transaction_id,))
+    if cursor.rowcount != 1:
+        return False
+    add_to_rollups(cursor, db_type, transaction_id)
+    return True
+
+
+def add_to_rollups(cursor, db_type, transaction_id):
+    """Fold one completed transaction into the hourly, daily and product rollups"""
+    placeholder = '%s' if db_type == 'postgresql' else '?'
+    cursor.execute(f'''
+        SELECT timestamp, total_amount, vat_amount
+        FROM transactions
+        WHERE id = {placeholder}
+    ''', (transaction_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return
+    timestamp, total_amount, vat_amount = row[0], float(row[1]), float(row[2])
+    hour, day = buckets(timestamp)
+    vat_share = vat_amount / total_amount if total_amount else 0.0
+
+    cursor.execute(f'''
+        SELECT COALESCE(ti.product_id, 0), MAX(ti.barcode), MAX(p.name), MAX(p.category),
+               SUM(ti.qty), SUM(ti.qty * ti.unit_price)
+        FROM transaction_items ti
+        LEFT JOIN products p ON p.id = ti.product_id
+        WHERE ti.transaction_id = {placeholder}
+        GROUP BY COALESCE(ti.product_id, 0)
+    ''', (transaction_id,))
+    lines = cursor.fetchall()
+    units = sum(int(line[4]) for line in lines)
+
+    for table, key, bucket in (('sales_hourly', 'hour', hour), ('sales_daily', 'day', day)):
+        cursor.execute(f'''
+            INSERT INTO {table} ({key}, transactions, units, revenue, vat)
+            VALUES ({placeholder}, 1, {placeholder}, {placeholder}, {placeholder})
+            ON CONFLICT ({key}) DO UPDATE SET
+                transactions = {table}.transactions + 1,
+                units = {table}.units + EXCLUDED.units,
+                revenue = {table}.revenue + EXCLUDED.revenue,
+                vat = {table}.vat + EXCLUDED.vat
+        ''', (bucket, units, total_amount, vat_amount))
+
+    for product_id, barcode, name, category, qty, revenue in lines:
+        revenue = float(revenue)
+        cursor.execute(f'''
+            INSERT INTO product_sales_daily (day, product_id, barcode, name, category, units, revenue, vat)
+            VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder},
+                    {placeholder}, {placeholder}, {placeholder})
+            ON CONFLICT (day, product_id) DO UPDATE SET
+                units = product_sales_daily.units + EXCLUDED.units,
+                revenue = product_sales_daily.revenue + EXCLUDED.revenue,
+                vat = product_sales_daily.vat + EXCLUDED.vat
+        ''', (day, product_id, barcode, name, category or 'Uncategorised',
+              int(qty), round(revenue, 2), round(revenue * vat_share, 2)))
+
+
+def _date_range(placeholder, column, start, end):
+    """WHERE clause and params for an inclusive [start, end] date filter"""
+    clauses, params = [], []
+    if start:
+        clauses.append(f"{column} >= {placeholder}")
+        params.append(start)
+    if end:
+        clauses.append(f"{column} < {placeholder}")
+        params.append(end + '~')  # sorts after any 'YYYY-MM-DD HH:00' on that day
+    return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+
+def _totals(row):
+    return {
+        'transactions': int(row[0]),
+        'units': int(row[1]),
+        'revenue': round(float(row[2]), 2),
+        'vat': round(float(row[3]), 2),
+    }
+
+
+def daily_report(database, start=None, end=None):
+    """Totals per day between start and end (YYYY-MM-DD, inclusive)"""
+    where, params = _date_range(database.placeholder, 'day', start, end)
+    with database.connection() as (conn, db_type):
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT day, transactions, units, revenue, vat FROM sales_daily{where} ORDER BY day',
+                       params)
+        rows = cursor.fetchall()
+    return [dict(day=row[0], **_totals(row[1:])) for row in rows]
+
+
+def hourly_report(database, start=None, end=None):
+    """Totals per hour between start and end (YYYY-MM-DD, inclusive)"""
+    where, params = _date_range(database.placeholder, 'hour', start, end)
+    with database.connection() as (conn, db_type):
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT hour, transactions, units, revenue, vat FROM sales_hourly{where} ORDER BY hour',
+                       params)
+        rows = cursor.fetchall()
+    return [dict(hour=row[0], **_totals(row[1:])) for row in rows]
+
+
+def product_report(database, start=None, end=None, limit=50):
+    """Units, revenue and VAT per product over the range, best sellers first"""
+    where, params = _date_range(database.placeholder, 'day', start, end)
+    with database.connection() as (conn, db_type):
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT product_id, MAX(barcode), MAX(name), MAX(category),
+                   SUM(units), SUM(revenue), SUM(vat)
+            FROM product_sales_daily{where}
+            GROUP BY product_id
+            ORDER BY SUM(units) DESC, product_id
+            LIMIT {database.placeholder}
+        ''', params + [limit])
+        rows = cursor.fetchall()
+    return [{
+        'product_id': row[0],
+        'barcode': row[1],
+        'name': row[2],
+        'category': row[3],
+        'units': int(row[4]),
+        'revenue': round(float(row[5]), 2),
+        'vat': round(float(row[6]), 2),
+    } for row in rows]
+
+
+def category_report(database, start=None, end=None):
+    """Units, revenue and VAT per category over the range"""
+    where, params = _date_range(database.placeholder, 'day', start, end)
+    with database.connection() as (conn, db_type):
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT category, SUM(units), SUM(revenue), SUM(vat)
+            FROM product_sales_daily{where}
+            GROUP BY category
+            ORDER BY SUM(revenue) DESC
+        ''', params)
+        rows = cursor.fetchall()
+    return [{
+        'category': row[0],
+        'units': int(row[1]),
+        'revenue': round(float(row[2]), 2),
+        'vat': round(float(row[3]), 2),
+    } for row in rows]
+
+
+def rebuild_rollups(database, batch_size=REBUILD_BATCH_SIZE):
+    """Recompute every rollup from completed transactions (one-off, O(transactions))"""
+    started = time.perf_counter()
+    with database.connection() as (conn, db_type):
+        cursor = conn.cursor()
+        ensure_sales_rollups(cursor, db_type)
+        for table in ('sales_hourly', 'sales_daily', 'product_sales_daily'):
+            cursor.execute(f'DELETE FROM {table}')
+
+        last_id = 0
+        rebuilt = 0
+        while True:
+            cursor.execute(f'''
+                SELECT id FROM transactions
+                WHERE status = 'completed' AND id > {database.placeholder}
+                ORDER BY id
+                LIMIT {database.placeholder}
+            ''', (last_id, batch_size))
+            ids = [row[0] for row in cursor.fetchall()]
+            if not ids:
+                break
+            for transaction_id in ids:
+                add_to_rollups(cursor, db_type, transaction_id)
+            rebuilt += len(ids)
+            last_id = ids[-1]
+            print(f"  ✓ Rolled up to transaction {last_id}")
+
+    return {'transactions': rebuilt, 'seconds': round(time.perf_counter() - started, 2)}
+
+
+if __name__ == '__main__':
+    batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else REBUILD_BATCH_SIZE
+    database = Database(database_url_from_env())
+
+    print("=" * 60)
+    print(f"Rebuild sales rollups ({database.db_type})")
+    print("=" * 60)
+    result = rebuild_rollups(database, batch_size)
+    print("=" * 60)
+    print(f"Done: {result['transactions']} completed transactions in {result['seconds']}s")
+    print("=" * 60)
@@ -0,0 +1,107 @@
+"""
+Payment screen templates
+The static layers of each screen layout (background, logo/branding
+images, fixed captions) are composited once into a base canvas. A
+payment screen is then a copy of the base, one QR blit and one amount
+text composite, with no per-checkout canvas building, image loading or
+caption layout.
+
+Layouts are DEFAULT_LAYOUTS, overridden or extended by the JSON file
+named in SCREEN_LAYOUTS_FILE (same shape, keyed by layout name).
+"""
+
+import json
+import os
+import threading
+
+from PIL import Image, ImageDraw
+
+from fonts import font_registry, format_amount
+from qr_render import CANVAS_SIZE, paste_qr
+
+SCREEN_LAYOUTS_FILE = os.getenv('SCREEN_LAYOUTS_FILE')
+
+DEFAULT_LAYOUTS = {
+    # QR with the amount underneath (local service, payment_qr.py)
+    'amount': {
+        'background': 'white',
+        'qr_box': [35, 50, 250],
+        'amount': {'format': 'Amount: MUR {amount}', 'center_x': 160, 'y': 320, 'size': 24},
+    },
+    # QR alone, centred (qr_generator.py, payment_terminal.py)
+    'centered': {
+        'background': 'white',
+        'qr_box': [20, 100, 280],
+    },
+}
+
+
+class ScreenTemplate:
+    """One layout: its pre-composited base canvas plus where the QR and amount go"""
+
+    def __init__(self, name, layout):
+        self.name = name
+        self.qr_box = tuple(layout['qr_box'])
+        self.amount = layout.get('amount')
+        self.amount_glyphs = font_registry.glyphs(self.amount['size'], self.amount.get('font')) if self.amount else None
+        self.base = self._composite(layout)
+
+    def _composite(self, layout):
+        """Background, images and captions, drawn once"""
+        base = Image.new('RGB', tuple(layout.get('canvas', CANVAS_SIZE)), layout.get('background', 'white'))
+        for image in layout.get('images', []):
+            with Image.open(image['path']) as source:
+                layer = source.convert('RGBA')
+            if image.get('size'):
+                layer = layer.resize(tuple(image['size']), Image.Resampling.LANCZOS)
+            base.paste(layer, tuple(image['xy']), layer)
+        draw = ImageDraw.Draw(base)
+        for caption in layout.get('captions', []):
+            font = font_registry.get(caption.get('size', 18), caption.get('font'))
+            bbox = draw.textbbox((0, 0), caption['text'], font=font)
+            draw.text((caption['center_x'] - (bbox[2] - bbox[0]) // 2, caption['y']), caption['text'],
+                      fill=caption.get('color', 'black'), font=font)
+        return base
+
+    def render(self, qr_data, amount=None):
+        """The finished screen for one payment"""
+        canvas = self.base.copy()
+        paste_qr(canvas, qr_data, self.qr_box)
+        if self.amount and amount is not None:
+            # Pre-rasterised glyphs: a few masked pastes, no text layout
+            self.amount_glyphs.draw_centered(canvas, self.amount['format'].format(amount=format_amount(amount)),
+                                             self.amount['center_x'], self.amount['y'],
+                                             self.amount.get('color', 'black'))
+        return canvas
+
+
+def load_layouts(path=SCREEN_LAYOUTS_FILE):
+    """DEFAULT_LAYOUTS merged with the layouts file, if any"""
+    layouts = dict(DEFAULT_LAYOUTS)
+    if path:
+        with open(path, encoding='utf-8') as f:
+            layouts.update(json.load(f))
+    return layouts
+
+
+class ScreenTemplates:
+    """All configured layouts, composited once per process"""
+
+    def __init__(self, layouts):
+        self.templates = {name: ScreenTemplate(name, layout) for name, layout in layouts.items()}
+
+    def render(self, layout, qr_data, amount=None):
+        return self.templates[layout].render(qr_data, amount)
+
+
+_templates = None
+_templates_lock = threading.Lock()
+
+
+def screen_templates():
+    """The process-wide ScreenTemplates, built on first use (or at startup by calling this)"""
+    global _templates
+    with _templates_lock:
+        if _templates is None:
+            _templates = ScreenTemplates(load_layouts())
+        return _templates
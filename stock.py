@@ -0,0 +1,197 @@
+"""
+Body & Soul POS - Stock Reservations
+A checkout takes its cart out of stock straight away with one conditional
+UPDATE per cart (stock = stock - n WHERE stock >= n), so two tills can
+never sell the last item twice. The reservation is committed when the
+payment completes. If the QR never reaches the till the checkout is
+marked failed and released at once; an abandoned sale is released after
+RESERVATION_TTL seconds.
+"""
+
+import os
+import time
+
+RESERVATION_TTL = float(os.getenv('RESERVATION_TTL', 900))  # seconds an unpaid checkout holds stock
+
+
+class InsufficientStock(Exception):
+    """Raised when a cart asks for more than is in stock"""
+
+    def __init__(self, shortages):
+        self.shortages = shortages  # {product_id: units available}
+        super().__init__('Not enough stock for product(s): ' + ', '.join(str(p) for p in sorted(shortages)))
+
+
+def ensure_stock_reservations(cursor, db_type):
+    """Create the stock_reservations table if missing"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_reservations (
+            transaction_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            qty INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'reserved',
+            reserved_at DOUBLE PRECISION NOT NULL,
+            PRIMARY KEY (transaction_id, product_id)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_stock_reservations_status ON stock_reservations (status, reserved_at)')
+
+
+def cart_quantities(items):
+    """{product_id: total quantity} for cart items, merging repeated lines"""
+    quantities = {}
+    for item in items or []:
+        if not isinstance(item, dict) or item.get('id') is None:
+            continue
+        qty = int(item.get('quantity', 1))
+        if qty > 0:
+            quantities[int(item['id'])] = quantities.get(int(item['id']), 0) + qty
+    return quantities
+
+
+def take_stock(cursor, db_type, quantities):
+    """Decrement stock for every product that has enough, in one statement.
+
+    Returns ({product_id: new stock} for the rows changed, {product_id:
+    available} for the rows that were short).
+    """
+    if not quantities:
+        return {}, {}
+    product_ids = sorted(quantities)
+
+    if db_type == 'postgresql':
+        values = ', '.join(['(%s, %s)'] * len(product_ids))
+        params = [value for product_id in product_ids for value in (product_id, quantities[product_id])]
+        # Lock the rows in id order first so concurrent tills cannot deadlock
+        cursor.execute(f'''
+            UPDATE products p
+            SET stock = p.stock - c.qty
+            FROM (SELECT id FROM products WHERE id = ANY(%s) ORDER BY id FOR UPDATE) locked,
+                 (VALUES {values}) AS c(id, qty)
+            WHERE p.id = locked.id AND p.id = c.id AND p.stock >= c.qty
+            RETURNING p.id, p.stock
+        ''', [product_ids] + params)
+    else:
+        # SQLite has one writer at a time; RETURNING needs SQLite 3.35+
+        cases = ' '.join(['WHEN ? THEN ?'] * len(product_ids))
+        case_params = [value for product_id in product_ids for value in (product_id, quantities[product_id])]
+        cursor.execute(f'''
+            UPDATE products
+            SET stock = stock - CASE id {cases} END
+            WHERE id IN ({', '.join(['?'] * len(product_ids))}) AND stock >= CASE id {cases} END
+            RETURNING id, stock
+        ''', case_params + product_ids + case_params)
+    levels = {row[0]: row[1] for row in cursor.fetchall()}
+
+    short_ids = [product_id for product_id in product_ids if product_id not in levels]
+    if not short_ids:
+        return levels, {}
+    available = _stock_levels(cursor, db_type, short_ids)
+    return levels, {product_id: available.get(product_id, 0) for product_id in short_ids}
+
+
+def _stock_levels(cursor, db_type, product_ids):
+    placeholder = '%s' if db_type == 'postgresql' else '?'
+    cursor.execute(f'''
+        SELECT id, stock FROM products WHERE id IN ({', '.join([placeholder] * len(product_ids))})
+    ''', list(product_ids))
+    return {row[0]: row[1] for row in cursor.fetchall()}
+
+
+def reserve_stock(cursor, db_type, transaction_id, items):
+    """Take a checkout's cart out of stock in the caller's DB transaction.
+
+    Raises InsufficientStock (roll back the transaction) if any product is
+    short; otherwise returns {product_id: new stock}.
+    """
+    quantities = cart_quantities(items)
+    levels, shortages = take_stock(cursor, db_type, quantities)
+    if shortages:
+        raise InsufficientStock(shortages)
+    if quantities:
+        placeholder = '%s' if db_type == 'postgresql' else '?'
+        now = time.time()
+        cursor.executemany(f'''
+            INSERT INTO stock_reservations (transaction_id, product_id, qty, status, reserved_at)
+            VALUES ({placeholder}, {placeholder}, {placeholder}, 'reserved', {placeholder})
+        ''', [(transaction_id, product_id, qty, now) for product_id, qty in quantities.items()])
+    return levels
+
+
+def commit_stock(cursor, db_type, transaction_id):
+    """Keep a completed sale's stock taken; returns {product_id: new stock} if stock changed.
+
+    Sales whose reservation expired, or that were never reserved (offline
+    checkouts), take their stock now from transaction_items. Payment has
+    already been taken, so a shortfall is logged rather than refused.
+    """
+    placeholder = '%s' if db_type == 'postgresql' else '?'
+    cursor.execute(f'''
+        UPDATE stock_reservations SET status = 'committed'
+        WHERE transaction_id = {placeholder} AND status = 'reserved'
+    ''', (transaction_id,))
+    if cursor.rowcount:
+        return {}
+
+    cursor.execute(f'''
+        SELECT product_id, SUM(qty) FROM transaction_items
+        WHERE transaction_id = {placeholder} AND product_id IS NOT NULL
+        GROUP BY product_id
+    ''', (transaction_id,))
+    quantities = {row[0]: int(row[1]) for row in cursor.fetchall()}
+    levels, shortages = take_stock(cursor, db_type, quantities)
+    if shortages:
+        print(f"✗ Transaction {transaction_id} sold more than in stock for product(s) {sorted(shortages)}")
+    cursor.execute(f'''
+        UPDATE stock_reservations SET status = 'committed'
+        WHERE transaction_id = {placeholder}
+    ''', (transaction_id,))
+    return levels
+
+
+def release_expired(cursor, db_type, ttl=RESERVATION_TTL):
+    """Return stock held by checkouts still pending after ttl seconds; returns {product_id: new stock}"""
+    placeholder = '%s' if db_type == 'postgresql' else '?'
+    # Claim the reservations first so a payment completing meanwhile cannot also keep them
+    cursor.execute(f'''
+        UPDATE stock_reservations SET status = 'released'
+        WHERE status = 'reserved' AND reserved_at < {placeholder}
+          AND transaction_id IN (SELECT id FROM transactions WHERE status != 'completed')
+        RETURNING transaction_id, product_id, qty
+    ''', (time.time() - ttl,))
+    released = cursor.fetchall()
+    if not released:
+        return {}
+    print(f"✓ Released stock from {len({row[0] for row in released})} abandoned checkout(s)")
+    return _return_stock(cursor, db_type, released)
+
+
+def release_failed_checkout(cursor, db_type, transaction_id):
+    """Mark a pending checkout failed and return its reserved stock; returns {product_id: new stock}"""
+    placeholder = '%s' if db_type == 'postgresql' else '?'
+    cursor.execute(f'''
+        UPDATE transactions SET status = 'failed'
+        WHERE id = {placeholder} AND status = 'pending'
+    ''', (transaction_id,))
+    if cursor.rowcount != 1:
+        return {}
+    cursor.execute(f'''
+        UPDATE stock_reservations SET status = 'released'
+        WHERE transaction_id = {placeholder} AND status = 'reserved'
+        RETURNING transaction_id, product_id, qty
+    ''', (transaction_id,))
+    return _return_stock(cursor, db_type, cursor.fetchall())
+
+
+def _return_stock(cursor, db_type, released):
+    """Add released (transaction_id, product_id, qty) rows back to stock; returns {product_id: new stock}"""
+    if not released:
+        return {}
+    placeholder = '%s' if db_type == 'postgresql' else '?'
+    quantities = {}
+    for transaction_id, product_id, qty in released:
+        quantities[product_id] = quantities.get(product_id, 0) + qty
+    cursor.executemany(f'''
+        UPDATE products SET stock = stock + {placeholder} WHERE id = {placeholder}
+    ''', [(qty, product_id) for product_id, qty in sorted(quantities.items())])
+    return _stock_levels(cursor, db_type, list(quantities))
@@ -0,0 +1,150 @@
+"""
+Body & Soul POS - Terminal Registry
+Maps each till's terminal id to the local service that drives its ESP32:
+URL, API key, device capabilities and last heartbeat. Local services
+register themselves with a periodic heartbeat; every cloud worker keeps
+a short-lived copy of the table so routing a checkout costs no query.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+
+import requests
+
+TERMINAL_HEARTBEAT_TTL = float(os.getenv('TERMINAL_HEARTBEAT_TTL', 90))  # seconds before a terminal counts as offline
+TERMINAL_CACHE_TTL = float(os.getenv('TERMINAL_CACHE_TTL', 5))  # seconds a worker trusts its copy of the table
+HEARTBEAT_INTERVAL = float(os.getenv('HEARTBEAT_INTERVAL', 30))
+
+Terminal = namedtuple('Terminal', 'id url api_key capabilities last_heartbeat')
+
+
+def ensure_terminals(cursor, db_type):
+    """Create the terminals table if missing"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS terminals (
+            id TEXT PRIMARY KEY,
+            url TEXT NOT NULL,
+            api_key TEXT NOT NULL,
+            capabilities TEXT NOT NULL DEFAULT '{}',
+            last_heartbeat DOUBLE PRECISION NOT NULL
+        )
+    ''')
+
+
+def is_online(terminal, ttl=TERMINAL_HEARTBEAT_TTL):
+    return time.time() - terminal.last_heartbeat < ttl
+
+
+class TerminalRegistry:
+    """Per-worker cached view of the terminals table"""
+
+    def __init__(self, database, cache_ttl=TERMINAL_CACHE_TTL):
+        self.database = database
+        self.cache_ttl = cache_ttl
+        self._terminals = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._table_ready = False
+
+    def _ensure_table(self, cursor, db_type):
+        if not self._table_ready:
+            ensure_terminals(cursor, db_type)
+            self._table_ready = True
+
+    def _load(self):
+        with self.database.connection() as (conn, db_type):
+            cursor = conn.cursor()
+            self._ensure_table(cursor, db_type)
+            cursor.execute('SELECT id, url, api_key, capabilities, last_heartbeat FROM terminals')
+            rows = cursor.fetchall()
+        terminals = {row[0]: Terminal(row[0], row[1], row[2], json.loads(row[3] or '{}'), float(row[4]))
+                     for row in rows}
+        with self._lock:
+            self._terminals = terminals
+            self._loaded_at = time.monotonic()
+
+    def _snapshot(self):
+        with self._lock:
+            fresh = time.monotonic() - self._loaded_at < self.cache_ttl
+            terminals = self._terminals
+        if fresh:
+            return terminals
+        try:
+            self._load()
+        except Exception as e:
+            # Database unreachable: keep routing with the last known table for another cache_ttl
+            print(f"✗ Could not refresh terminal registry: {e}")
+            with self._lock:
+                self._loaded_at = time.monotonic()
+            return terminals
+        with self._lock:
+            return self._terminals
+
+    def get(self, terminal_id):
+        """Registered Terminal for an id, or None"""
+        return self._snapshot().get(terminal_id)
+
+    def all(self):
+        return sorted(self._snapshot().values(), key=lambda terminal: terminal.id)
+
+    def heartbeat(self, terminal_id, url, api_key, capabilities):
+        """Register or refresh a terminal"""
+        terminal = Terminal(terminal_id, url.rstrip('/'), api_key, capabilities or {}, time.time())
+        with self.database.connection() as (conn, db_type):
+            cursor = conn.cursor()
+            self._ensure_table(cursor, db_type)
+            placeholder = '%s' if db_type == 'postgresql' else '?'
+            cursor.execute(f'''
+                INSERT INTO terminals (id, url, api_key, capabilities, last_heartbeat)
+                VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder})
+                ON CONFLICT (id) DO UPDATE SET
+                    url = EXCLUDED.url, api_key = EXCLUDED.api_key,
+                    capabilities = EXCLUDED.capabilities, last_heartbeat = EXCLUDED.last_heartbeat
+            ''', (terminal.id, terminal.url, terminal.api_key, json.dumps(terminal.capabilities),
+                  terminal.last_heartbeat))
+        with self._lock:
+            self._terminals = dict(self._terminals, **{terminal.id: terminal})
+        return terminal
+
+
+class TerminalHeartbeat:
+    """Local service side: announce this terminal to the cloud every HEARTBEAT_INTERVAL seconds"""
+
+    def __init__(self, cloud_url, terminal_id, public_url, api_key, capabilities, interval=HEARTBEAT_INTERVAL):
+        self.cloud_url = cloud_url.rstrip('/') if cloud_url else None
+        self.terminal_id = terminal_id
+        self.public_url = public_url
+        self.api_key = api_key
+        self.capabilities = capabilities  # callable returning the current capabilities dict
+        self.interval = interval
+        self.session = requests.Session()
+
+    def start(self):
+        if not self.cloud_url:
+            print("✗ CLOUD_URL not set; this terminal will not register with the cloud")
+            return
+        threading.Thread(target=self._run, name='terminal-heartbeat', daemon=True).start()
+
+    def send(self):
+        response = self.session.post(f"{self.cloud_url}/api/terminals/heartbeat", json={
+            'terminal_id': self.terminal_id,
+            'url': self.public_url,
+            'capabilities': self.capabilities()
+        }, headers={'X-API-Key': self.api_key}, timeout=(3, 10))
+        response.raise_for_status()
+
+    def _run(self):
+        registered = False
+        while True:
+            try:
+                self.send()
+                if not registered:
+                    print(f"✓ Registered terminal '{self.terminal_id}' at {self.public_url} with {self.cloud_url}")
+                    registered = True
+            except Exception as e:
+                print(f"✗ Terminal heartbeat failed: {e}")
+                registered = False
+            time.sleep(self.interval)
@@ -0,0 +1,29 @@
+"""
+Tests run against the flat top-level modules of the repo, on scratch
+SQLite databases. Run from the repo root: python -m pytest -q
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The cloud app migrates its database when imported: point it at a scratch SQLite file
+os.environ['SQLITE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='body-soul-tests-'), 'cloud.db')
+for name in ('DATABASE_URL', 'POSTGRES_URL', 'POSTGRESQL_URL', 'DATABASE_PRIVATE_URL'):
+    os.environ.pop(name, None)
+
+
+@pytest.fixture
+def cloud():
+    """The cloud service module (one shared scratch database per test run)"""
+    import body_soul_cloud_enhanced
+    return body_soul_cloud_enhanced
+
+
+@pytest.fixture
+def client(cloud):
+    return cloud.app.test_client()
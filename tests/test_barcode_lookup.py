@@ -0,0 +1,38 @@
+def add_product(cloud, name, barcode, stock):
+    with cloud.db.connection() as (conn, db_type):
+        conn.cursor().execute('''
+            INSERT INTO products (name, category, price, size, color, stock, barcode)
+            VALUES (?, 'Accessories', 320.0, 'One Size', 'Black', ?, ?)
+        ''', (name, stock, barcode))
+
+
+def test_scan_is_answered_from_the_index_without_the_database(cloud, client, monkeypatch):
+    add_product(cloud, 'Body & Soul Cap', '2000000000039', 5)
+    cloud.catalog_cache.invalidate()
+    cloud.catalog_cache.get()
+
+    def no_database():
+        raise AssertionError('barcode hit went to the database')
+
+    monkeypatch.setattr(cloud.db, 'connection', no_database)
+    response = client.get('/api/product/barcode/2000000000039')
+
+    assert response.status_code == 200
+    assert response.get_json()['product']['name'] == 'Body & Soul Cap'
+
+
+def test_product_added_after_the_snapshot_is_found_and_refreshes_it(cloud, client):
+    cloud.catalog_cache.get()
+    add_product(cloud, 'Body & Soul Socks', '2000000000046', 3)
+
+    response = client.get('/api/product/barcode/2000000000046')
+
+    assert response.get_json()['product']['stock'] == 3
+    assert cloud.catalog_cache.lookup('2000000000046')['name'] == 'Body & Soul Socks'
+
+
+def test_out_of_stock_and_unknown_barcodes_are_not_found(cloud, client):
+    add_product(cloud, 'Body & Soul Belt', '2000000000053', 0)
+
+    assert client.get('/api/product/barcode/2000000000053').status_code == 404
+    assert client.get('/api/product/barcode/2000000000060').status_code == 404
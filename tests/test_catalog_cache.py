@@ -0,0 +1,75 @@
+import pytest
+
+from catalog_cache import CatalogCache, bump_catalog_version, read_catalog_version
+from db import Database
+from migrations import migrate
+
+
+@pytest.fixture
+def database(tmp_path):
+    database = Database(sqlite_path=str(tmp_path / 'pos.db'))
+    migrate(database)
+    with database.connection() as (conn, db_type):
+        conn.cursor().executemany('''
+            INSERT INTO products (name, category, price, size, color, stock, barcode)
+            VALUES (?, ?, ?, 'M', 'Black', ?, ?)
+        ''', [('Body & Soul Tee', 'Tops', 650.0, 4, '2000000000015'),
+              ('Body & Soul Leggings', 'Bottoms', 890.0, 2, '2000000000022')])
+    return database
+
+
+def test_unchanged_version_revalidates_without_a_rebuild(database):
+    cache = CatalogCache(database, ttl=0)
+    body, etag = cache.get()
+
+    assert cache.get() == (body, etag)
+    assert cache.stats()['rebuilds'] == 1
+
+    with database.connection() as (conn, db_type):
+        cursor = conn.cursor()
+        cursor.execute("UPDATE products SET price = 700.0 WHERE barcode = '2000000000015'")
+        bump_catalog_version(cursor)
+    new_body, new_etag = cache.get()
+
+    assert new_etag != etag
+    assert b'700.0' in new_body
+    assert cache.stats()['rebuilds'] == 2
+
+
+def test_stock_levels_patch_the_snapshot_in_place(database):
+    cache = CatalogCache(database, ttl=60)
+    cache.get()
+    leggings = cache.lookup('2000000000022')
+    products = cache.stats()['products']
+
+    with database.connection() as (conn, db_type):
+        cursor = conn.cursor()
+        bump_catalog_version(cursor)
+        version = read_catalog_version(cursor)
+    cache.apply_stock_levels({leggings['id']: 0}, version)
+
+    assert cache.lookup('2000000000022') is None
+    stats = cache.stats()
+    assert (stats['version'], stats['products'], stats['rebuilds']) == (version, products - 1, 2)
+
+
+def test_a_missed_version_drops_the_snapshot(database):
+    cache = CatalogCache(database, ttl=60)
+    cache.get()
+    tee = cache.lookup('2000000000015')
+
+    cache.apply_stock_levels({tee['id']: 3}, version=cache.stats()['version'] + 2)
+
+    assert cache.stats()['version'] is None
+
+
+def test_products_answers_304_for_a_matching_etag(client):
+    response = client.get('/api/products')
+    etag = response.headers['ETag']
+    assert response.status_code == 200
+
+    revalidated = client.get('/api/products', headers={'If-None-Match': etag})
+
+    assert revalidated.status_code == 304
+    assert revalidated.data == b''
+    assert client.get('/api/products', headers={'If-None-Match': '"stale"'}).status_code == 200
@@ -0,0 +1,59 @@
+from checkout_jobs import CheckoutJobQueue, STALE_JOB_ERROR
+from db import Database
+from migrations import migrate
+from stock import release_failed_checkout, reserve_stock
+
+
+def test_reaper_fails_jobs_left_behind_by_a_dead_worker_and_releases_their_stock(tmp_path):
+    database = Database(sqlite_path=str(tmp_path / 'pos.db'))
+    migrate(database)
+    queue = CheckoutJobQueue(database, runner=None, timeout=60)
+    failed = []
+
+    def release_on_failure(job):
+        if job['state'] == 'failed':
+            with database.connection() as (conn, db_type):
+                release_failed_checkout(conn.cursor(), db_type, job['transaction_id'])
+            failed.append(job)
+
+    queue.subscribe(release_on_failure)
+
+    with database.connection() as (conn, db_type):
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO products (name, category, price, size, color, stock)
+            VALUES ('Body & Soul Scarf', 'Accessories', 540.0, 'One Size', 'Red', 3)
+        ''')
+        product_id = cursor.lastrowid
+        jobs = []
+        for receipt_number in ('BS-000001', 'BS-000002'):
+            cursor.execute('''
+                INSERT INTO transactions (receipt_number, total_amount, subtotal, vat_amount, items_json)
+                VALUES (?, 540.0, 469.57, 70.43, '[]')
+            ''', (receipt_number,))
+            transaction_id = cursor.lastrowid
+            reserve_stock(cursor, db_type, transaction_id, [{'id': product_id, 'quantity': 1}])
+            jobs.append((queue.create(cursor, db_type, transaction_id), transaction_id))
+        # The first job's worker died while uploading ten minutes ago; the second is still recent
+        cursor.execute("UPDATE checkout_jobs SET state = 'uploading', updated_at = datetime('now', '-10 minutes') "
+                       "WHERE id = ?", (jobs[0][0],))
+
+    (stale_job, stale_transaction), (fresh_job, fresh_transaction) = jobs
+    reaped = queue.reap_stale()
+
+    assert [job['job_id'] for job in reaped] == [stale_job]
+    assert [job['job_id'] for job in failed] == [stale_job]
+    assert queue.get(stale_job)['state'] == 'failed'
+    assert queue.get(stale_job)['error'] == STALE_JOB_ERROR
+    assert queue.get(fresh_job)['state'] == 'queued'
+    with database.connection() as (conn, db_type):
+        cursor = conn.cursor()
+        cursor.execute('SELECT stock FROM products WHERE id = ?', (product_id,))
+        assert cursor.fetchone()[0] == 2
+        cursor.execute('SELECT status FROM transactions WHERE id = ?', (stale_transaction,))
+        assert cursor.fetchone()[0] == 'failed'
+
+    # A late report from the lost run cannot revive the reaped job
+    queue.set_state(stale_job, stale_transaction, 'displayed')
+    assert queue.get(stale_job)['state'] == 'failed'
+    assert queue.reap_stale() == []
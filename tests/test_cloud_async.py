@@ -0,0 +1,28 @@
+import threading
+
+import pytest
+
+pytest.importorskip('starlette')
+pytest.importorskip('httpx')
+
+
+@pytest.fixture
+def async_client(cloud):
+    from starlette.testclient import TestClient
+
+    import body_soul_cloud_async
+    with TestClient(body_soul_cloud_async.app) as client:
+        yield client
+
+
+def test_local_status_publishes_device_status_off_the_event_loop(cloud, async_client, monkeypatch):
+    published_on = []
+    monkeypatch.setattr(cloud, 'local_service_for', lambda till_id: None)
+    monkeypatch.setattr(cloud, 'publish_device_status',
+                        lambda *args, **kwargs: published_on.append(threading.current_thread().name))
+
+    response = async_client.get('/api/local_status', headers={'X-Till-Id': 'main'})
+
+    assert response.json()['status'] == 'offline'
+    assert len(published_on) == 1
+    assert 'AnyIO worker thread' in published_on[0]
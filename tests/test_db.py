@@ -0,0 +1,25 @@
+import sqlite3
+
+import pytest
+
+from db import Database, PoolTimeout, database_unreachable
+
+
+def test_only_connection_failures_count_as_unreachable():
+    assert database_unreachable(sqlite3.OperationalError('unable to open database file'))
+    assert not database_unreachable(sqlite3.OperationalError('database is locked'))
+    assert not database_unreachable(sqlite3.OperationalError('no such table: products'))
+    assert not database_unreachable(sqlite3.OperationalError('near "SELEC": syntax error'))
+    assert not database_unreachable(PoolTimeout('No database connection free after 10s (pool max 5)'))
+
+def test_unreachable_postgres_is_retried_not_replaced_by_sqlite():
+    psycopg2 = pytest.importorskip('psycopg2')
+    database = Database('postgresql://pos@127.0.0.1:1/pos', timeout=1)
+
+    for attempt in range(2):
+        with pytest.raises(psycopg2.OperationalError) as raised:
+            with database.connection():
+                pass
+        assert database_unreachable(raised.value)
+        assert database.db_type == 'postgresql'
+        assert database._pool is None
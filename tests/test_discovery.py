@@ -0,0 +1,45 @@
+import threading
+import time
+
+from db import Database
+from discovery import LocalServiceDiscovery
+
+LOCAL_URL = 'http://localhost:8080'
+
+
+def test_report_failure_reprobes_in_the_background(tmp_path):
+    reachable = threading.Event()
+    reachable.set()
+    probed_on = []
+
+    def probe(url):
+        probed_on.append(threading.current_thread().name)
+        reachable.wait(5)
+        return True
+
+    discovery = LocalServiceDiscovery(Database(sqlite_path=str(tmp_path / 'pos.db')), probe,
+                                      lambda: [LOCAL_URL], ttl=60, interval=60)
+    assert discovery.get() == LOCAL_URL  # cold start: probed inline
+    probed_on.clear()
+
+    reachable.clear()  # the next probe hangs until the service answers again
+    discovery.report_failure(LOCAL_URL)
+    started = time.monotonic()
+    assert discovery.get() is None
+    assert time.monotonic() - started < 1
+
+    reachable.set()
+    deadline = time.monotonic() + 5
+    while discovery.get() != LOCAL_URL and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert discovery.get() == LOCAL_URL
+    assert probed_on and threading.current_thread().name not in probed_on
+
+def test_failed_probes_stay_out_of_local_call_metrics(cloud):
+    calls = []
+    observer, cloud.local_client.observer = cloud.local_client.observer, lambda *args: calls.append(args)
+    try:
+        assert cloud.probe_local_service('http://127.0.0.1:9') is False
+    finally:
+        cloud.local_client.observer = observer
+    assert calls == []
@@ -0,0 +1,18 @@
+import pytest
+
+from events import EventBus, TooManyStreams
+
+
+def test_subscribe_refuses_streams_beyond_the_limit():
+    bus = EventBus()
+    first = bus.subscribe('main', limit=2)
+    bus.subscribe('2', limit=2)
+
+    with pytest.raises(TooManyStreams):
+        bus.subscribe('3', limit=2)
+    assert bus.stats()['subscribers'] == 2
+    assert bus.stats()['refused'] == 1
+
+    bus.unsubscribe(first)
+    bus.subscribe('3', limit=2)
+    assert bus.stats()['subscribers'] == 2
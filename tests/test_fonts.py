@@ -0,0 +1,49 @@
+from PIL import Image, ImageChops, ImageDraw
+
+import fonts
+from fonts import FontRegistry, GlyphCache, format_amount
+
+
+def test_amounts_are_formatted_with_thousands_and_two_decimals():
+    assert format_amount(1250) == '1,250.00'
+    assert format_amount('99.5') == '99.50'
+    assert format_amount('on request') == 'on request'
+
+
+def test_cached_glyphs_draw_exactly_what_imagedraw_would():
+    registry = FontRegistry()
+    font, glyphs = registry.get(24), registry.glyphs(24)
+    text = 'Amount: MUR 1,250.00'
+
+    expected = Image.new('L', (320, 60), 0)
+    ImageDraw.Draw(expected).text((10, 10), text, fill=255, font=font)
+    drawn = Image.new('L', (320, 60), 0)
+    glyphs.draw(drawn, text, (10, 10), fill=255)
+
+    assert ImageChops.difference(expected, drawn).getbbox() is None
+    assert glyphs.width(text) == round(font.getlength(text))
+
+
+def test_fonts_and_glyph_caches_are_built_once_per_size():
+    registry = FontRegistry()
+
+    assert registry.get(24) is registry.get(24)
+    assert registry.glyphs(24) is registry.glyphs(24)
+    assert registry.glyphs(24) is not registry.glyphs(32)
+
+
+def test_missing_fonts_fall_back_to_the_default_font():
+    registry = FontRegistry(paths=['/nonexistent/font.ttf'])
+
+    assert registry.get(20, 'also-missing.ttf') is not None
+    assert registry._resolve('also-missing.ttf') is None
+
+
+def test_piece_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(fonts, 'MAX_CACHED_PIECES', len(fonts.GLYPH_CHARS) + 2)
+    glyphs = GlyphCache(FontRegistry().get(18))
+
+    for n in range(10):
+        glyphs.piece(f'Till {n}:')
+
+    assert len(glyphs._pieces) == len(fonts.GLYPH_CHARS) + 2
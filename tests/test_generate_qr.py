@@ -0,0 +1,48 @@
+from db import Database
+from migrations import migrate
+from receipts import ReceiptAllocator
+
+
+def receipt_counter(number):
+    return int(number.split('-', 1)[1])
+
+
+def test_replays_and_out_of_stock_checkouts_use_no_receipt_number(cloud, client):
+    with cloud.db.connection() as (conn, db_type):
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO products (name, category, price, size, color, stock)
+            VALUES ('Body & Soul Tote', 'Accessories', 450.0, 'One Size', 'Natural', 5)
+        ''')
+        product_id = cursor.lastrowid
+    cart = [{'id': product_id, 'quantity': 1, 'price': 450.0}]
+
+    first = client.post('/api/generate_qr', json={'amount': 450.0, 'items': cart, 'till_id': 'main'},
+                        headers={'Idempotency-Key': 'receipt-gap-1'})
+    assert first.status_code == 202
+
+    short = client.post('/api/generate_qr', json={'amount': 4500.0, 'till_id': 'main',
+                                                  'items': [{'id': product_id, 'quantity': 10, 'price': 450.0}]})
+    assert short.status_code == 409
+
+    replay = client.post('/api/generate_qr', json={'amount': 450.0, 'items': cart, 'till_id': 'main'},
+                         headers={'Idempotency-Key': 'receipt-gap-1'})
+    assert replay.headers['Idempotent-Replayed'] == 'true'
+
+    second = client.post('/api/generate_qr', json={'amount': 450.0, 'items': cart, 'till_id': 'main'},
+                         headers={'Idempotency-Key': 'receipt-gap-2'})
+    assert second.status_code == 202
+    assert receipt_counter(second.get_json()['receipt_number']) == \
+        receipt_counter(first.get_json()['receipt_number']) + 1
+
+
+def test_given_back_number_is_handed_out_next(tmp_path):
+    database = Database(sqlite_path=str(tmp_path / 'pos.db'))
+    migrate(database)
+    allocator = ReceiptAllocator(database, block_size=5)
+
+    first = allocator.next_receipt()
+    allocator.give_back(first)
+
+    assert allocator.next_receipt() == first
+    assert allocator.next_receipt() != first
@@ -0,0 +1,66 @@
+import time
+
+import pytest
+import requests
+
+from local_client import CircuitBreaker, CircuitOpenError, LocalServiceClient
+
+LOCAL_URL = 'http://127.0.0.1:9'
+
+
+def test_breaker_opens_after_repeated_failures_and_lets_one_trial_through():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.05)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open' and not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.state == 'half_open'
+    assert breaker.allow()
+    assert not breaker.allow()  # one trial at a time
+
+    breaker.record_success()
+    assert breaker.snapshot() == {'state': 'closed', 'failures': 0, 'retry_in': None}
+
+
+def refusing_client(monkeypatch, **kwargs):
+    client = LocalServiceClient('test-key', backoff=0, **kwargs)
+    attempts = []
+
+    def refuse(method, url, **request_kwargs):
+        attempts.append((method, url, request_kwargs['timeout'], request_kwargs['headers']['X-API-Key']))
+        raise requests.exceptions.ConnectionError('connection refused')
+
+    monkeypatch.setattr(client.session, 'request', refuse)
+    return client, attempts
+
+
+def test_only_idempotent_calls_are_retried(monkeypatch):
+    client, attempts = refusing_client(monkeypatch, retries=2)
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.get(LOCAL_URL, 'health')
+    assert attempts == [('GET', f'{LOCAL_URL}/health', (1, 2), 'test-key')] * 3
+
+    attempts.clear()
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.post(LOCAL_URL, 'generate_qr', json={})
+    assert len(attempts) == 1
+
+
+def test_open_breaker_fails_fast_and_is_observed(monkeypatch):
+    client, attempts = refusing_client(monkeypatch, retries=0)
+    observed = []
+    client.observer = lambda endpoint, seconds, outcome: observed.append((endpoint, outcome))
+
+    for _ in range(client.breaker(LOCAL_URL).failure_threshold):
+        with pytest.raises(requests.exceptions.ConnectionError):
+            client.post(LOCAL_URL, 'checkout')
+    attempts.clear()
+
+    with pytest.raises(CircuitOpenError):
+        client.post(LOCAL_URL, 'checkout')
+    assert attempts == []
+    assert observed[-2:] == [('checkout', 'connection_error'), ('checkout', 'circuit_open')]
+    assert client.breaker_state(LOCAL_URL)['state'] == 'open'
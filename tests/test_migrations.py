@@ -0,0 +1,91 @@
+import io
+import os
+import sqlite3
+import subprocess
+import sys
+
+from db import Database
+from migrations import LATEST_VERSION, migrate, schema_version
+from product_import import import_products
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def legacy_database(path):
+    """A store database from before the enhanced POS: no barcodes, no receipt numbers"""
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            category TEXT NOT NULL,
+            price REAL NOT NULL,
+            size TEXT,
+            color TEXT,
+            stock INTEGER DEFAULT 0
+        );
+        CREATE TABLE transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            total_amount REAL NOT NULL,
+            items_json TEXT NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            status TEXT DEFAULT 'pending'
+        );
+        -- Entered twice by hand: migration 2 gives both rows the same sample barcode
+        INSERT INTO products (name, category, price, size, color, stock)
+        VALUES ('Body & Soul T-Shirt', 'Tops', 450.0, 'M', 'Blue', 10),
+               ('Body & Soul T-Shirt', 'Tops', 450.0, 'M', 'Blue', 5),
+               ('Body & Soul Cap', 'Accessories', 320.0, 'One Size', 'Black', 7);
+        INSERT INTO transactions (total_amount, items_json, status) VALUES (450.0, '[]', 'completed');
+    ''')
+    conn.commit()
+    conn.close()
+    return Database(sqlite_path=path)
+
+
+def test_legacy_database_migrates_to_latest(tmp_path):
+    database = legacy_database(str(tmp_path / 'legacy.db'))
+
+    applied = migrate(database)
+
+    assert [version for version, name in applied] == list(range(1, LATEST_VERSION + 1))
+    with database.connection() as (conn, db_type):
+        cursor = conn.cursor()
+        assert schema_version(cursor, db_type) == LATEST_VERSION
+        cursor.execute("SELECT id, barcode FROM products WHERE name = 'Body & Soul T-Shirt' ORDER BY id")
+        # The first row keeps the barcode; the duplicate is cleared rather than deleted
+        assert [tuple(row) for row in cursor.fetchall()] == [(1, '5901234123457'), (2, None)]
+        cursor.execute('SELECT receipt_number FROM transactions')
+        assert cursor.fetchone()[0] == 'BS-000001'
+    assert migrate(database) == []
+
+
+def test_import_upserts_into_upgraded_legacy_database(tmp_path):
+    database = legacy_database(str(tmp_path / 'legacy.db'))
+    migrate(database)
+
+    report = import_products(database, io.StringIO(
+        'name,category,price,size,color,stock,barcode\n'
+        'Body & Soul T-Shirt,Tops,475.00,M,Blue,40,5901234123457\n'
+        'Body & Soul Scarf,Accessories,390.00,One Size,Red,12,5901234123556\n'
+    ))
+
+    assert report['imported'] == 2
+    assert report['rejected_count'] == 0
+    with database.connection() as (conn, db_type):
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, price, stock FROM products WHERE barcode = '5901234123457'")
+        assert tuple(cursor.fetchone()) == (1, 475.0, 40)
+        cursor.execute("SELECT COUNT(*) FROM products WHERE barcode = '5901234123556'")
+        assert cursor.fetchone()[0] == 1
+
+def test_serving_the_app_migrates_without_calling_init_db(tmp_path):
+    # What a gunicorn worker does on boot: import the app module, nothing more
+    path = str(tmp_path / 'boot.db')
+    env = dict(os.environ, SQLITE_PATH=path, DATABASE_URL='', POSTGRES_URL='', POSTGRESQL_URL='',
+               DATABASE_PRIVATE_URL='')
+    subprocess.run([sys.executable, '-c', 'import body_soul_cloud_enhanced'], cwd=REPO_ROOT, env=env,
+                   check=True, capture_output=True, timeout=60)
+
+    with Database(sqlite_path=path).connection() as (conn, db_type):
+        assert schema_version(conn.cursor(), db_type) == LATEST_VERSION
@@ -0,0 +1,33 @@
+import time
+
+from local_client import CircuitOpenError
+from terminals import Terminal
+
+
+def unreachable_terminal(cloud, monkeypatch):
+    terminal = Terminal(None, 'http://127.0.0.1:9', cloud.LOCAL_API_KEY, {}, time.time())
+    monkeypatch.setattr(cloud, 'local_service_for', lambda till_id: terminal)
+    return terminal
+
+
+def test_offline_payment_complete_answers_503_when_the_local_service_is_down(cloud, client, monkeypatch):
+    unreachable_terminal(cloud, monkeypatch)
+
+    response = client.post('/api/payment_complete', json={'client_ref': 'main:key-1', 'till_id': 'main'})
+
+    assert response.status_code == 503
+    assert 'Cannot connect to local payment device' in response.get_json()['error']
+
+
+def test_offline_payment_complete_answers_503_while_the_breaker_is_open(cloud, client, monkeypatch):
+    unreachable_terminal(cloud, monkeypatch)
+
+    def breaker_open(*args, **kwargs):
+        raise CircuitOpenError('Circuit open for http://127.0.0.1:9')
+
+    monkeypatch.setattr(cloud.local_client, 'post', breaker_open)
+
+    response = client.post('/api/payment_complete', json={'client_ref': 'main:key-1', 'till_id': 'main'})
+
+    assert response.status_code == 503
+    assert 'offline' in response.get_json()['error']
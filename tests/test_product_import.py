@@ -0,0 +1,133 @@
+import csv
+import io
+
+import pytest
+
+from db import Database
+from migrations import migrate
+from product_import import CSVFormatError, import_products
+from stock import release_failed_checkout, reserve_stock
+
+HEADER = 'name,category,price,size,color,stock,barcode\n'
+
+
+@pytest.fixture
+def database(tmp_path):
+    database = Database(sqlite_path=str(tmp_path / 'pos.db'))
+    migrate(database)
+    return database
+
+
+def stock_of(database, barcode):
+    with database.connection() as (conn, db_type):
+        cursor = conn.cursor()
+        cursor.execute('SELECT stock FROM products WHERE barcode = ?', (barcode,))
+        return cursor.fetchone()[0]
+
+
+def test_import_keeps_units_held_by_unpaid_checkouts_out_of_stock(database):
+    import_products(database, io.StringIO(HEADER + 'Body & Soul Scarf,Accessories,540.00,,Red,10,5901234123556\n'))
+    with database.connection() as (conn, db_type):
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM products WHERE barcode = '5901234123556'")
+        product_id = cursor.fetchone()[0]
+        cursor.execute('''
+            INSERT INTO transactions (receipt_number, total_amount, subtotal, vat_amount, items_json)
+            VALUES ('BS-900001', 1620.0, 1408.70, 211.30, '[]')
+        ''')
+        transaction_id = cursor.lastrowid
+        reserve_stock(cursor, db_type, transaction_id, [{'id': product_id, 'quantity': 3}])
+    assert stock_of(database, '5901234123556') == 7
+
+    # A stock count finds 12 on the shelf while the 3 are still unpaid
+    import_products(database, io.StringIO(HEADER + 'Body & Soul Scarf,Accessories,540.00,,Red,12,5901234123556\n'))
+    assert stock_of(database, '5901234123556') == 9
+
+    with database.connection() as (conn, db_type):
+        release_failed_checkout(conn.cursor(), db_type, transaction_id)
+    assert stock_of(database, '5901234123556') == 12
+
+
+def test_prices_outside_decimal_10_2_are_rejected_rows(database):
+    report = import_products(database, io.StringIO(
+        HEADER +
+        'Body & Soul Scarf,Accessories,540.00,,Red,10,5901234123556\n'
+        'Gold Watch,Accessories,100000000,,Gold,1,5901234123563\n'
+        'Mystery Box,Accessories,nan,,,1,5901234123570\n'
+    ))
+
+    assert report['imported'] == 1
+    assert [reject['line'] for reject in report['rejected']] == [3, 4]
+    assert 'above' in report['rejected'][0]['error']
+
+
+def test_malformed_csv_is_refused_as_a_whole(database):
+    runaway_quote = '"' + 'x' * (csv.field_size_limit() + 1)
+    with pytest.raises(CSVFormatError, match='after line 2'):
+        import_products(database, io.StringIO(
+            HEADER +
+            'Body & Soul Scarf,Accessories,540.00,,Red,10,5901234123556\n'
+            f'Body & Soul Cap,Accessories,320.00,,{runaway_quote}\n'
+        ))
+    with database.connection() as (conn, db_type):
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM products WHERE barcode = '5901234123556'")
+        assert cursor.fetchone()[0] == 0
+
+def test_import_inserts_new_products_and_updates_existing_ones_by_barcode(database):
+    import_products(database, io.StringIO(HEADER + 'Body & Soul Scarf,Accessories,540.00,,Red,10,5901234123556\n'))
+
+    report = import_products(database, io.StringIO(
+        HEADER +
+        'Body & Soul Scarf,Accessories,495.50, ,Burgundy,8,5901234123556\n'
+        'Body & Soul Headband,Accessories,180,One Size,,4,5901234123587\n'
+    ), batch_size=1)
+
+    assert (report['rows'], report['imported'], report['rejected_count']) == (2, 2, 0)
+    with database.connection() as (conn, db_type):
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT name, price, size, color, stock FROM products
+            WHERE barcode IN ('5901234123556', '5901234123587') ORDER BY barcode
+        ''')
+        assert [tuple(row) for row in cursor.fetchall()] == [
+            ('Body & Soul Scarf', 495.5, None, 'Burgundy', 8),
+            ('Body & Soul Headband', 180.0, 'One Size', None, 4),
+        ]
+
+
+def test_bad_rows_are_reported_by_line_and_skipped(database):
+    report = import_products(database, io.StringIO(
+        'Name,Category,Price,Stock,Barcode\n'
+        ',Accessories,100,1,5901234123594\n'
+        'Body & Soul Pouch,Accessories,120,-2,5901234123600\n'
+        'Body & Soul Pouch,Accessories,120,two,5901234123600\n'
+        'Body & Soul Pouch,Accessories,120,2,5901234123600\n'
+        'Body & Soul Pouch,Accessories,120,3,5901234123600\n'
+    ))
+
+    assert (report['rows'], report['imported'], report['rejected_count']) == (5, 1, 4)
+    assert report['rejected'] == [
+        {'line': 2, 'error': 'name is empty'},
+        {'line': 3, 'error': 'stock is negative'},
+        {'line': 4, 'error': "stock 'two' is not a whole number"},
+        {'line': 6, 'error': 'barcode 5901234123600 appears more than once'},
+    ]
+
+
+def test_missing_columns_refuse_the_file(database):
+    with pytest.raises(CSVFormatError, match='price, barcode'):
+        import_products(database, io.StringIO('name,category\nBody & Soul Pouch,Accessories\n'))
+
+
+def test_import_endpoint_requires_the_api_key_and_maps_bad_files_to_400(cloud, client):
+    assert client.post('/api/products/import', data=HEADER).status_code == 401
+
+    headers = {'X-API-Key': cloud.LOCAL_API_KEY, 'Content-Type': 'text/csv'}
+    refused = client.post('/api/products/import', data='name\nBody & Soul Pouch\n', headers=headers)
+    imported = client.post('/api/products/import', headers=headers,
+                           data=HEADER + 'Body & Soul Pouch,Accessories,120,,,2,2000000000121\n')
+
+    assert refused.status_code == 400
+    assert imported.get_json()['imported'] == 1
+    assert client.get('/api/product/barcode/2000000000121').get_json()['product']['stock'] == 2
@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from catalog_cache import decode_cursor, encode_cursor, product_page
+from db import Database
+from migrations import migrate
+
+
+@pytest.fixture
+def database(tmp_path):
+    database = Database(sqlite_path=str(tmp_path / 'pos.db'))
+    migrate(database)
+    with database.connection() as (conn, db_type):
+        conn.cursor().executemany('''
+            INSERT INTO products (name, category, price, size, color, stock)
+            VALUES (?, ?, 100.0, ?, 'Black', ?)
+        ''', [('Pages Tee', 'Pages A', 'S', 1), ('Pages Tee', 'Pages A', 'M', 1), ('Pages Tee', 'Pages A', 'L', 1),
+              ('Pages Cap', 'Pages A', None, 0), ('Pages Bag', 'Pages B', None, 2)])
+    return database
+
+
+def all_pages(database, limit, **kwargs):
+    pages, after = [], None
+    while True:
+        products, next_cursor = product_page(database, after, limit, categories=['Pages A', 'Pages B'], **kwargs)
+        pages.append(products)
+        if next_cursor is None:
+            return pages
+        after = decode_cursor(next_cursor)
+
+
+def test_pages_split_equal_names_by_id_without_repeats_or_gaps(database):
+    pages = all_pages(database, limit=2)
+
+    listed = [(p['category'], p['name'], p['size']) for page in pages for p in page]
+    assert [len(page) for page in pages] == [2, 2]
+    assert listed == [('Pages A', 'Pages Tee', 'S'), ('Pages A', 'Pages Tee', 'M'),
+                      ('Pages A', 'Pages Tee', 'L'), ('Pages B', 'Pages Bag', None)]
+
+
+def test_last_full_page_has_no_next_cursor(database):
+    assert [len(page) for page in all_pages(database, limit=4)] == [4]
+    assert [len(page) for page in all_pages(database, limit=1)] == [1, 1, 1, 1]
+
+
+def test_fields_and_categories_narrow_the_page(database):
+    products, next_cursor = product_page(database, limit=10, fields=('name', 'price'), categories=['Pages B'])
+
+    assert products == [{'name': 'Pages Bag', 'price': 100.0}]
+    assert next_cursor is None
+
+
+def test_cursor_round_trips_and_rejects_garbage():
+    assert decode_cursor(encode_cursor('Tops', 'Body & Soul Tee', 42)) == ('Tops', 'Body & Soul Tee', 42)
+    with pytest.raises(ValueError):
+        decode_cursor('not-a-cursor')
+
+
+def test_paged_listing_endpoint(client):
+    first = client.get('/api/products?limit=1&fields=id,name')
+    body = json.loads(first.data)
+
+    assert list(body['products'][0]) == ['id', 'name']
+    assert body['next_cursor']
+    second = json.loads(client.get(f"/api/products?limit=1&cursor={body['next_cursor']}").data)
+    assert second['products'][0]['id'] != body['products'][0]['id']
+
+    assert client.get('/api/products?cursor=garbage').status_code == 400
+    assert client.get('/api/products?fields=id,cost').status_code == 400
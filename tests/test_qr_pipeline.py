@@ -0,0 +1,75 @@
+import os
+
+import pytest
+from PIL import Image
+
+pytest.importorskip('serial')
+
+PAYLOAD = '00020101021226580014mu.zwennpay.www0110BODYSOUL0154041234.005802MU6304ABCD'
+
+
+class FakeESP32:
+    """Serial port double: confirms the upload and acknowledges every chunk"""
+
+    is_open = True
+
+    def __init__(self):
+        self.commands = []
+        self.chunks = []
+        self._replies = []
+
+    def write(self, data):
+        if isinstance(data, bytes) and data.endswith(b'\n') and b'**' in data:
+            self.commands.append(data.decode('utf-8').strip())
+            self._replies = [b'start\n', b'exit\n']
+        else:
+            self.chunks.append(data)
+            self._replies = [b'ok\n']
+
+    def readline(self):
+        return self._replies.pop(0) if self._replies else b''
+
+    def flush(self):
+        pass
+
+    def read_all(self):
+        return b''
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # the controller's log file lands here, and so would any temp image
+    return tmp_path
+
+
+def test_payment_screen_is_rendered_and_uploaded_without_touching_disk(workdir, monkeypatch):
+    import payment_qr
+    from image_uploader import ESP32ImageUploader
+
+    monkeypatch.setattr(payment_qr.zwennpay_client, 'merchant_qr', lambda amount: PAYLOAD)
+    monkeypatch.setattr(Image, 'open', lambda *args, **kwargs: pytest.fail('the rendered JPEG was re-read'))
+    uploader = ESP32ImageUploader()
+    uploader.ser = FakeESP32()
+    before = set(os.listdir(workdir))
+
+    jpeg, size = payment_qr.render_payment_qr(1250)
+    assert uploader.upload_image(jpeg, 3, chunk_size=4096, size=size)
+
+    assert size == (320, 480) and bytes(jpeg[:2]) == b'\xff\xd8'
+    assert uploader.ser.commands == [f'sending**3.jpeg**{len(jpeg)}**4096']
+    assert all(isinstance(chunk, memoryview) for chunk in uploader.ser.chunks)
+    assert b''.join(uploader.ser.chunks) == bytes(jpeg)
+    assert set(os.listdir(workdir)) == before
+
+
+def test_in_memory_images_are_still_validated(workdir):
+    from image_uploader import ESP32ImageUploader
+    from qr_render import encode_jpeg
+
+    uploader = ESP32ImageUploader()
+    wide = encode_jpeg(Image.new('RGB', (400, 100), 'white'))
+
+    assert uploader.validate_image(encode_jpeg(Image.new('RGB', (320, 480), 'white')))
+    assert not uploader.validate_image(wide)  # read from the JPEG header
+    assert not uploader.validate_image(b'x' * (81 * 1024), size=(320, 480))
+    assert not uploader.validate_image(str(workdir / 'missing.jpg'))
@@ -0,0 +1,49 @@
+import io
+
+import pytest
+from PIL import Image
+
+from qr_render import CANVAS_SIZE, centered_box, encode_jpeg, paste_qr, qr_matrix, render_matrix, render_qr
+
+PAYLOAD = '00020101021226580014mu.zwennpay.www0110BODYSOUL0154041234.005802MU6304ABCD'
+
+
+def test_every_module_is_a_whole_block_of_its_colour():
+    matrix = qr_matrix(PAYLOAD)
+    image = render_qr(PAYLOAD, 280)
+    module_px = image.width // len(matrix)
+
+    assert image.size == (len(matrix) * module_px,) * 2
+    assert image.width <= 280 and module_px == 280 // len(matrix)
+    for y, row in enumerate(matrix):
+        for x, dark in enumerate(row):
+            block = image.crop((x * module_px, y * module_px, (x + 1) * module_px, (y + 1) * module_px))
+            assert block.getextrema() == ((0, 0) if dark else (255, 255))
+
+
+def test_box_smaller_than_one_pixel_per_module_is_refused():
+    with pytest.raises(ValueError):
+        render_matrix([[False] * 25] * 25, 24)
+
+
+def test_qr_is_centred_in_its_box():
+    canvas = Image.new('L', CANVAS_SIZE, 128)
+    box = centered_box(280, top=60)
+
+    x, y, size = paste_qr(canvas, PAYLOAD, box)
+
+    assert box == (20, 60, 280)
+    assert (x - 20, y - 60) == ((280 - size) // 2,) * 2
+    assert canvas.getpixel((x, y)) == 255  # quiet zone
+    assert canvas.getpixel((x - 1, y - 1)) == 128
+
+
+def test_jpeg_screen_fits_the_device_limit():
+    canvas = Image.new('RGB', CANVAS_SIZE, 'white')
+    paste_qr(canvas, PAYLOAD, centered_box(280))
+
+    encoded = encode_jpeg(canvas)
+
+    assert bytes(encoded[:2]) == b'\xff\xd8'
+    assert len(encoded) < 80 * 1024
+    assert Image.open(io.BytesIO(encoded)).size == CANVAS_SIZE
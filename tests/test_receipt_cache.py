@@ -0,0 +1,67 @@
+from receipt_cache import ReceiptCache
+
+
+def test_cache_stays_within_its_byte_bound_evicting_least_recently_used():
+    cache = ReceiptCache(max_bytes=250)
+    for n in (1, 2):
+        cache.put(n, f'BS-00000{n}', b'x' * 100)
+    cache.get(transaction_id=1)  # 2 is now the least recently used
+
+    cache.put(3, 'BS-000003', b'x' * 100)
+
+    assert cache.get(receipt_number='BS-000002') is None
+    assert cache.get(receipt_number='BS-000001') is not None
+    assert cache.stats()['bytes'] == 200
+    assert cache.stats()['evictions'] == 1
+
+
+def test_oversized_receipt_is_not_cached_but_still_gets_its_etag():
+    cache = ReceiptCache(max_bytes=50)
+
+    etag = cache.put(1, 'BS-000001', b'x' * 51)
+
+    assert etag and cache.get(transaction_id=1) is None
+    assert cache.stats()['bytes'] == 0
+
+
+def test_replacing_a_receipt_does_not_count_its_bytes_twice():
+    cache = ReceiptCache(max_bytes=1000)
+    cache.put(1, 'BS-000001', b'x' * 100)
+    cache.put(1, 'BS-000001', b'y' * 60)
+
+    assert cache.stats()['bytes'] == 60
+    cache.invalidate(1)
+    assert (cache.stats()['receipts'], cache.stats()['bytes']) == (0, 0)
+
+
+def add_transaction(cloud, receipt_number, status):
+    with cloud.db.connection() as (conn, db_type):
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO transactions (receipt_number, total_amount, subtotal, vat_amount, items_json, status)
+            VALUES (?, 460.0, 400.0, 60.0, '[]', ?)
+        ''', (receipt_number, status))
+        return cursor.lastrowid
+
+
+def test_completed_receipts_revalidate_with_a_strong_etag(cloud, client):
+    transaction_id = add_transaction(cloud, 'BS-700001', 'completed')
+
+    response = client.get(f'/api/receipt/{transaction_id}')
+    etag = response.headers['ETag']
+    assert not etag.startswith('W/')
+
+    by_number = client.get('/api/receipt/number/BS-700001', headers={'If-None-Match': etag})
+    assert by_number.status_code == 304
+    assert cloud.receipt_cache.get(transaction_id=transaction_id) is not None
+
+
+def test_pending_receipts_are_neither_cached_nor_tagged(cloud, client):
+    transaction_id = add_transaction(cloud, 'BS-700002', 'pending')
+
+    response = client.get(f'/api/receipt/{transaction_id}')
+
+    assert response.get_json()['receipt']['receipt_number'] == 'BS-700002'
+    assert 'ETag' not in response.headers
+    assert response.headers['Cache-Control'] == 'no-store'
+    assert cloud.receipt_cache.get(transaction_id=transaction_id) is None
@@ -0,0 +1,58 @@
+import pytest
+
+from db import Database
+from migrations import migrate
+from receipts import ReceiptAllocator
+
+
+@pytest.fixture
+def database(tmp_path):
+    database = Database(sqlite_path=str(tmp_path / 'pos.db'))
+    migrate(database)
+    return database
+
+
+def test_counter_is_not_marked_ready_when_its_creation_rolls_back(database):
+    with database.connection() as (conn, db_type):
+        conn.cursor().execute('DROP TABLE IF EXISTS receipt_counter')
+    allocator = ReceiptAllocator(database, block_size=5)
+    allocator.block_size = 'five'  # the block UPDATE fails after the counter table was created
+
+    with pytest.raises(Exception):
+        allocator.next_receipt()
+    assert not allocator._counter_ready
+
+    allocator.block_size = 5
+    assert allocator.next_receipt() == 'BS-000001'
+    assert allocator._counter_ready
+
+
+def test_workers_draw_disjoint_blocks(database):
+    first, second = ReceiptAllocator(database, block_size=3), ReceiptAllocator(database, block_size=3)
+
+    numbers = [first.next_receipt(), second.next_receipt(), first.next_receipt(), second.next_receipt()]
+
+    assert numbers == ['BS-000001', 'BS-000004', 'BS-000002', 'BS-000005']
+    assert first.next_receipt() == 'BS-000003'
+    assert first.next_receipt() == 'BS-000007'  # the next free block
+
+
+def test_counter_is_seeded_past_existing_receipts(database):
+    with database.connection() as (conn, db_type):
+        cursor = conn.cursor()
+        cursor.execute('DROP TABLE receipt_counter')  # a database from before the allocator
+        cursor.execute('''
+            INSERT INTO transactions (receipt_number, total_amount, subtotal, vat_amount, items_json)
+            VALUES ('BS-000041', 460.0, 400.0, 60.0, '[]')
+        ''')
+
+    assert ReceiptAllocator(database, block_size=5).next_receipt() == 'BS-000042'
+
+
+def test_reset_drops_reserved_numbers(database):
+    allocator = ReceiptAllocator(database, block_size=5)
+    assert allocator.next_receipt() == 'BS-000001'
+
+    allocator.reset()
+
+    assert allocator.next_receipt() == 'BS-000006'
@@ -0,0 +1,86 @@
+import pytest
+
+from db import Database
+from migrations import migrate
+from sales_rollups import (category_report, complete_transaction, daily_report, hourly_report, product_report,
+                           rebuild_rollups)
+from transaction_items import save_transaction_items
+
+
+@pytest.fixture
+def database(tmp_path):
+    database = Database(sqlite_path=str(tmp_path / 'pos.db'))
+    migrate(database)
+    return database
+
+
+def add_transaction(cursor, receipt_number, total_amount, status='pending', timestamp='2026-03-02 10:15:00'):
+    cursor.execute('''
+        INSERT INTO transactions (receipt_number, total_amount, subtotal, vat_amount, items_json, status, timestamp)
+        VALUES (?, ?, ?, ?, '[]', ?, ?)
+    ''', (receipt_number, total_amount, round(total_amount / 1.15, 2), round(total_amount - total_amount / 1.15, 2),
+          status, timestamp))
+    return cursor.lastrowid
+
+
+def test_only_pending_transactions_complete(database):
+    with database.connection() as (conn, db_type):
+        cursor = conn.cursor()
+        pending = add_transaction(cursor, 'BS-000001', 460.0)
+        failed = add_transaction(cursor, 'BS-000002', 920.0, status='failed')
+
+        assert complete_transaction(cursor, db_type, pending)
+        assert not complete_transaction(cursor, db_type, pending)  # a repeated payment_complete
+        assert not complete_transaction(cursor, db_type, failed)  # its stock was already released
+        cursor.execute('SELECT status FROM transactions WHERE id = ?', (failed,))
+        assert cursor.fetchone()[0] == 'failed'
+
+    assert [(day['day'], day['transactions'], day['revenue']) for day in daily_report(database)] == \
+        [('2026-03-02', 1, 460.0)]
+
+def test_rollups_total_completed_sales_per_hour_day_product_and_category(database):
+    with database.connection() as (conn, db_type):
+        cursor = conn.cursor()
+        cursor.executemany('''
+            INSERT INTO products (id, name, category, price, size, color, stock, barcode)
+            VALUES (?, ?, ?, ?, 'M', 'Black', 10, ?)
+        ''', [(901, 'Body & Soul Tee', 'Tops', 230.0, '2000000000107'),
+              (902, 'Body & Soul Leggings', 'Bottoms', 690.0, '2000000000114')])
+        sales = [
+            ('BS-000011', 1150.0, '2026-03-02 10:15:00', [(901, 2), (902, 1)]),
+            ('BS-000012', 230.0, '2026-03-02 10:50:00', [(901, 1)]),
+            ('BS-000013', 690.0, '2026-03-03 16:05:00', [(902, 1)]),
+        ]
+        for receipt_number, total, timestamp, lines in sales:
+            transaction_id = add_transaction(cursor, receipt_number, total, timestamp=timestamp)
+            save_transaction_items(cursor, db_type, transaction_id, [
+                {'id': product_id, 'quantity': qty, 'price': 230.0 if product_id == 901 else 690.0}
+                for product_id, qty in lines
+            ])
+            complete_transaction(cursor, db_type, transaction_id)
+        add_transaction(cursor, 'BS-000014', 690.0, timestamp='2026-03-03 16:20:00')  # never paid
+
+    assert daily_report(database) == [
+        {'day': '2026-03-02', 'transactions': 2, 'units': 4, 'revenue': 1380.0, 'vat': 180.0},
+        {'day': '2026-03-03', 'transactions': 1, 'units': 1, 'revenue': 690.0, 'vat': 90.0},
+    ]
+    assert [(hour['hour'], hour['revenue']) for hour in hourly_report(database, '2026-03-02', '2026-03-02')] == \
+        [('2026-03-02 10:00', 1380.0)]
+    assert [(product['product_id'], product['units'], product['revenue']) for product in product_report(database)] == \
+        [(901, 3, 690.0), (902, 2, 1380.0)]
+    assert [(category['category'], category['revenue']) for category in category_report(database, '2026-03-03')] == \
+        [('Bottoms', 690.0)]
+
+
+def test_rebuild_matches_the_incremental_rollups(database):
+    with database.connection() as (conn, db_type):
+        cursor = conn.cursor()
+        for n in range(1, 6):
+            transaction_id = add_transaction(cursor, f'BS-00002{n}', 115.0 * n, timestamp=f'2026-03-0{n} 09:30:00')
+            complete_transaction(cursor, db_type, transaction_id)
+    incremental = daily_report(database)
+
+    result = rebuild_rollups(database, batch_size=2)
+
+    assert result['transactions'] == 5
+    assert daily_report(database) == incremental
@@ -0,0 +1,70 @@
+import json
+
+from PIL import Image
+
+from qr_render import render_qr
+from screen_templates import DEFAULT_LAYOUTS, ScreenTemplate, ScreenTemplates, load_layouts
+
+PAYLOAD = '00020101021226580014mu.zwennpay.www0110BODYSOUL0154041234.005802MU6304ABCD'
+
+
+def dark_rows(image, top, bottom):
+    """Rows between top and bottom that have any non-white pixel"""
+    grey = image.convert('L')
+    return [y for y in range(top, bottom) if grey.crop((0, y, grey.width, y + 1)).getextrema()[0] < 128]
+
+
+def test_render_leaves_the_composited_base_untouched():
+    template = ScreenTemplate('amount', DEFAULT_LAYOUTS['amount'])
+    base = template.base.tobytes()
+
+    screen = template.render(PAYLOAD, 1250)
+
+    assert template.base.tobytes() == base
+    assert screen.size == template.base.size
+    assert screen.tobytes() != base
+
+
+def test_qr_and_amount_land_where_the_layout_puts_them():
+    template = ScreenTemplate('amount', DEFAULT_LAYOUTS['amount'])
+    left, top, size = DEFAULT_LAYOUTS['amount']['qr_box']
+    qr_image = render_qr(PAYLOAD, size)
+    offset = (size - qr_image.width) // 2
+
+    screen = template.render(PAYLOAD, 1250)
+    pasted = screen.convert('L').crop((left + offset, top + offset,
+                                       left + offset + qr_image.width, top + offset + qr_image.width))
+
+    assert pasted.tobytes() == qr_image.tobytes()
+    assert dark_rows(screen, 300, 380)  # the amount line
+    assert not dark_rows(template.render(PAYLOAD), 300, 380)
+
+
+def test_layout_images_and_captions_are_composited_once(tmp_path):
+    logo = tmp_path / 'logo.png'
+    Image.new('RGBA', (10, 10), (200, 0, 0, 255)).save(logo)
+    layout = dict(DEFAULT_LAYOUTS['centered'], images=[{'path': str(logo), 'xy': [0, 0], 'size': [20, 20]}],
+                  captions=[{'text': 'Scan to pay', 'center_x': 160, 'y': 420}])
+
+    template = ScreenTemplate('branded', layout)
+    logo.unlink()  # rendering never reopens the image
+
+    screen = template.render(PAYLOAD)
+    assert screen.getpixel((19, 19)) == (200, 0, 0)
+    assert screen.getpixel((21, 21)) == (255, 255, 255)
+    assert dark_rows(screen, 400, 460)
+
+
+def test_layouts_file_overrides_and_extends_the_defaults(tmp_path):
+    layouts_file = tmp_path / 'layouts.json'
+    layouts_file.write_text(json.dumps({
+        'centered': {'background': 'black', 'qr_box': [40, 120, 240]},
+        'kiosk': {'qr_box': [0, 0, 320]},
+    }))
+
+    layouts = load_layouts(str(layouts_file))
+    templates = ScreenTemplates(layouts)
+
+    assert set(layouts) == {'amount', 'centered', 'kiosk'}
+    assert templates.templates['centered'].base.getpixel((0, 0)) == (0, 0, 0)
+    assert templates.render('kiosk', PAYLOAD).size == (320, 480)
@@ -0,0 +1,87 @@
+import threading
+
+import pytest
+
+from checkout_jobs import CheckoutJobError, CheckoutJobQueue
+from db import Database
+from migrations import migrate
+from stock import InsufficientStock, release_failed_checkout, reserve_stock
+
+
+def failing_runner(payload, report):
+    report('rendering')
+    raise CheckoutJobError('Cannot connect to local payment device')
+
+
+def test_failed_display_job_releases_stock_for_the_next_checkout(tmp_path):
+    database = Database(sqlite_path=str(tmp_path / 'pos.db'))
+    migrate(database)
+    with database.connection() as (conn, db_type):
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO products (name, category, price, size, color, stock, barcode)
+            VALUES ('Body & Soul Scarf', 'Accessories', 540.0, 'One Size', 'Red', 1, '5901234123556')
+        ''')
+        product_id = cursor.lastrowid
+    cart = [{'id': product_id, 'quantity': 1}]
+
+    queue = CheckoutJobQueue(database, failing_runner)
+    failed = threading.Event()
+
+    def release_on_failure(job):
+        # As the cloud service's listener does, after the 'failed' state is saved
+        if job['state'] == 'failed':
+            with database.connection() as (conn, db_type):
+                release_failed_checkout(conn.cursor(), db_type, job['transaction_id'])
+            failed.set()
+
+    queue.subscribe(release_on_failure)
+
+    def checkout(receipt_number):
+        with database.connection() as (conn, db_type):
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO transactions (receipt_number, total_amount, subtotal, vat_amount, items_json)
+                VALUES (?, 540.0, 469.57, 70.43, '[]')
+            ''', (receipt_number,))
+            transaction_id = cursor.lastrowid
+            reserve_stock(cursor, db_type, transaction_id, cart)
+            return transaction_id, queue.create(cursor, db_type, transaction_id)
+
+    transaction_id, job_id = checkout('BS-000001')
+    with pytest.raises(InsufficientStock):
+        checkout('BS-000002')  # the last scarf is held by the first checkout
+
+    queue.start(job_id, transaction_id, {})
+    assert failed.wait(5)
+
+    assert queue.get(job_id)['state'] == 'failed'
+    with database.connection() as (conn, db_type):
+        cursor = conn.cursor()
+        cursor.execute('SELECT status FROM transactions WHERE id = ?', (transaction_id,))
+        assert cursor.fetchone()[0] == 'failed'
+        cursor.execute('SELECT status FROM stock_reservations WHERE transaction_id = ?', (transaction_id,))
+        assert cursor.fetchone()[0] == 'released'
+        cursor.execute('SELECT stock FROM products WHERE id = ?', (product_id,))
+        assert cursor.fetchone()[0] == 1
+
+    checkout('BS-000003')
+    with database.connection() as (conn, db_type):
+        cursor = conn.cursor()
+        cursor.execute('SELECT stock FROM products WHERE id = ?', (product_id,))
+        assert cursor.fetchone()[0] == 0
+
+def test_sweep_is_not_marked_done_when_its_transaction_fails(cloud, monkeypatch):
+    def lost_connection(cursor, db_type):
+        raise RuntimeError('connection lost')
+
+    monkeypatch.setattr(cloud, '_last_reservation_sweep', 0.0)
+    monkeypatch.setattr(cloud, 'release_expired', lost_connection)
+    with pytest.raises(RuntimeError):
+        cloud.release_abandoned_stock()
+    assert cloud._last_reservation_sweep == 0.0
+
+    monkeypatch.setattr(cloud, 'release_expired', lambda cursor, db_type: {})
+    cloud.release_abandoned_stock()
+    assert cloud._last_reservation_sweep > 0.0
+
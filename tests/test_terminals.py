@@ -0,0 +1,50 @@
+import time
+
+from db import Database
+from migrations import migrate
+from terminals import TerminalRegistry
+
+
+def test_registry_is_shared_through_the_database_and_survives_an_outage(tmp_path):
+    database = Database(sqlite_path=str(tmp_path / 'pos.db'))
+    migrate(database)
+    TerminalRegistry(database).heartbeat('till-2', 'http://10.0.0.12:8080/', 'till-2-key', {'qr_slot': 2})
+    other_worker = TerminalRegistry(database, cache_ttl=0)
+
+    terminal = other_worker.get('till-2')
+    assert (terminal.url, terminal.api_key, terminal.capabilities) == ('http://10.0.0.12:8080', 'till-2-key',
+                                                                       {'qr_slot': 2})
+
+    def unreachable():
+        raise RuntimeError('database unreachable')
+
+    database.connection = unreachable
+    assert other_worker.get('till-2') == terminal  # routes with the last known table
+    assert [t.id for t in other_worker.all()] == ['till-2']
+
+
+def test_tills_route_to_their_terminal_or_fall_back_to_discovery(cloud, monkeypatch):
+    monkeypatch.setattr(cloud, 'find_local_service', lambda: 'http://localhost:5000')
+    cloud.terminal_registry.heartbeat('till-3', 'http://10.0.0.13:8080', 'till-3-key', {'qr_slot': 3})
+
+    assert cloud.local_service_for('till-3').url == 'http://10.0.0.13:8080'
+    fallback = cloud.local_service_for('till-without-terminal')
+    assert (fallback.id, fallback.url, fallback.api_key) == (None, 'http://localhost:5000', cloud.LOCAL_API_KEY)
+
+    stale = cloud.terminal_registry.get('till-3')._replace(last_heartbeat=time.time() - 3600)
+    monkeypatch.setattr(cloud.terminal_registry, 'get', lambda terminal_id: stale)
+    assert cloud.local_service_for('till-3') is None  # offline, not silently sent elsewhere
+
+
+def test_heartbeat_endpoint_lets_a_terminal_key_refresh_only_its_own_terminal(cloud, client):
+    def heartbeat(terminal_id, header_key, **extra):
+        return client.post('/api/terminals/heartbeat', headers={'X-API-Key': header_key},
+                           json=dict(terminal_id=terminal_id, url='http://10.0.0.14:8080', **extra)).status_code
+
+    assert heartbeat('till-4', cloud.LOCAL_API_KEY, api_key='till-4-key') == 200
+    assert heartbeat('till-4', 'till-4-key') == 200
+    assert heartbeat('till-5', 'till-4-key') == 401
+    assert heartbeat('till-4', 'wrong-key') == 401
+
+    listed = {t['terminal_id']: t for t in client.get('/api/terminals').get_json()['terminals']}
+    assert listed['till-4']['online'] and 'till-5' not in listed
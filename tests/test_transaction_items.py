@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from db import Database
+from migrations import migrate
+from transaction_items import backfill_transaction_items, item_rows, save_transaction_items
+
+
+@pytest.fixture
+def database(tmp_path):
+    database = Database(sqlite_path=str(tmp_path / 'pos.db'))
+    migrate(database)
+    return database
+
+
+def add_transaction(cursor, receipt_number, items_json):
+    cursor.execute('''
+        INSERT INTO transactions (receipt_number, total_amount, subtotal, vat_amount, items_json)
+        VALUES (?, 460.0, 400.0, 60.0, ?)
+    ''', (receipt_number, items_json))
+    return cursor.lastrowid
+
+
+def items_of(cursor, transaction_id):
+    cursor.execute('''
+        SELECT product_id, barcode, qty, unit_price FROM transaction_items
+        WHERE transaction_id = ? ORDER BY id
+    ''', (transaction_id,))
+    return [tuple(row) for row in cursor.fetchall()]
+
+
+def test_item_rows_skip_lines_that_are_not_cart_items():
+    rows = item_rows(7, [
+        {'id': 1, 'barcode': '5901234123457', 'price': '650.00', 'quantity': 2},
+        {'id': 2, 'price': 890.0},
+        {'id': 3, 'price': 'free', 'quantity': 1},
+        'gift card',
+    ])
+
+    assert rows == [(7, 1, '5901234123457', 2, 650.0), (7, 2, None, 1, 890.0)]
+
+
+def test_checkout_lines_are_saved_with_the_transaction(database):
+    with database.connection() as (conn, db_type):
+        cursor = conn.cursor()
+        transaction_id = add_transaction(cursor, 'BS-000001', '[]')
+        save_transaction_items(cursor, db_type, transaction_id, [{'id': 1, 'barcode': '5901234123457',
+                                                                  'price': 230.0, 'quantity': 2}])
+
+        assert items_of(cursor, transaction_id) == [(1, '5901234123457', 2, 230.0)]
+
+
+def test_backfill_covers_old_transactions_once_and_skips_unreadable_json(database):
+    with database.connection() as (conn, db_type):
+        cursor = conn.cursor()
+        ids = [add_transaction(cursor, f'BS-00000{n}', json.dumps([{'id': n, 'price': 100.0, 'quantity': n}]))
+               for n in (1, 2, 3)]
+        broken = add_transaction(cursor, 'BS-000004', '{not json')
+
+    result = backfill_transaction_items(database, batch_size=2)
+    again = backfill_transaction_items(database, batch_size=2)
+
+    assert (result['transactions'], result['skipped']) == (3, 1)
+    assert again['transactions'] == 0
+    with database.connection() as (conn, db_type):
+        cursor = conn.cursor()
+        assert [items_of(cursor, transaction_id) for transaction_id in ids] == \
+            [[(n, None, n, 100.0)] for n in (1, 2, 3)]
+        assert items_of(cursor, broken) == []
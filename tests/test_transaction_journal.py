@@ -0,0 +1,52 @@
+from transaction_journal import TransactionJournal
+
+
+def test_retried_offline_checkout_reuses_its_journal_entry(tmp_path):
+    journal = TransactionJournal(str(tmp_path / 'journal.db'))
+
+    first = journal.record(450.0, [], client_ref='main:key-1')
+    again = journal.record(450.0, [], client_ref='main:key-1')
+
+    assert first == again == 'main:key-1'
+    assert [entry['client_ref'] for entry in journal.unsynced()] == ['main:key-1']
+
+
+def test_failed_display_is_not_synced_until_a_retry_shows_it(tmp_path):
+    journal = TransactionJournal(str(tmp_path / 'journal.db'))
+    journal.record(450.0, [], client_ref='main:key-1')
+    journal.record(320.0, [], client_ref='main:key-2')
+
+    journal.mark_display_failed('main:key-1', 'ESP32 device not connected')
+
+    assert [entry['client_ref'] for entry in journal.unsynced()] == ['main:key-2']
+    assert not journal.mark_completed('main:key-1')  # nobody can pay a QR that never showed
+
+    journal.record(450.0, [], client_ref='main:key-1')  # the till retries with the same key
+    assert sorted(entry['client_ref'] for entry in journal.unsynced()) == ['main:key-1', 'main:key-2']
+
+def test_prune_keeps_only_recent_or_unsynced_entries(tmp_path):
+    journal = TransactionJournal(str(tmp_path / 'journal.db'))
+    journal.record(450.0, [], client_ref='old-synced', transaction_id=1, receipt_number='BS-000001')
+    journal.record(320.0, [], client_ref='old-failed')
+    journal.mark_display_failed('old-failed', 'ESP32 device not connected')
+    journal.record(180.0, [], client_ref='old-unsynced')
+    journal.record(890.0, [], client_ref='new-synced', transaction_id=2, receipt_number='BS-000002')
+    with journal.database.connection() as (conn, db_type):
+        conn.execute("UPDATE journal SET created_at = '2020-01-01 00:00:00' WHERE client_ref LIKE 'old-%'")
+
+    assert journal.stats() == {'unsynced': 1, 'failed_displays': 1}
+    assert journal.prune(retention_days=7) == 2
+
+    with journal.database.connection() as (conn, db_type):
+        left = sorted(row[0] for row in conn.execute('SELECT client_ref FROM journal'))
+    assert left == ['new-synced', 'old-unsynced']
+    assert journal.stats() == {'unsynced': 1, 'failed_displays': 0}
+
+
+def test_health_count_reads_only_the_unsynced_index_range(tmp_path):
+    journal = TransactionJournal(str(tmp_path / 'journal.db'))
+    with journal.database.connection() as (conn, db_type):
+        plan = ' '.join(row[-1] for row in conn.execute('''
+            EXPLAIN QUERY PLAN SELECT COUNT(*) FROM journal WHERE synced = 0
+        '''))
+    assert 'idx_journal_unsynced' in plan
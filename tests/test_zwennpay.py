@@ -0,0 +1,83 @@
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+import requests
+
+from bench_zwennpay import QR_PATH, StandInHandler, start_stand_in
+from zwennpay import ZwennPayClient
+
+
+@pytest.fixture
+def stand_in():
+    server, url = start_stand_in()
+    yield url
+    server.shutdown()
+
+
+@pytest.fixture
+def flaky_stand_in():
+    """Answers 503 to the first two calls, then like the real endpoint"""
+    handler = type('FlakyHandler', (StandInHandler,), {'busy_left': 2})
+
+    def do_POST(self):
+        # One handler serves the whole keep-alive connection, so decide per request
+        self.failure_rate = 1.0 if type(self).busy_left else 0.0
+        type(self).busy_left = max(type(self).busy_left - 1, 0)
+        StandInHandler.do_POST(self)
+
+    handler.do_POST = do_POST
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}{QR_PATH}"
+    server.shutdown()
+
+
+def test_busy_answers_are_retried_until_the_qr_arrives(flaky_stand_in):
+    outcomes = []
+    client = ZwennPayClient(url=flaky_stand_in, backoff=0, retries=2)
+    client.observer = lambda seconds, outcome: outcomes.append(outcome)
+
+    qr_data = client.merchant_qr('1250')
+
+    assert qr_data.startswith('000201') and '1250' in qr_data
+    assert (client.stats()['calls'], client.stats()['retries'], client.stats()['errors']) == (1, 2, 0)
+    assert outcomes == ['ok']
+
+
+def test_retries_stop_at_the_limit_and_the_deadline():
+    unreachable = ZwennPayClient(url='http://127.0.0.1:9/qr', backoff=0, retries=2)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        unreachable.merchant_qr('150')
+    assert (unreachable.stats()['retries'], unreachable.stats()['errors']) == (2, 1)
+
+    past_deadline = ZwennPayClient(url='http://127.0.0.1:9/qr', backoff=0, retries=2, deadline=0)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        past_deadline.merchant_qr('150')
+    assert past_deadline.stats()['retries'] == 0
+
+
+def test_payload_cache_skips_repeat_amounts_and_evicts_the_oldest(stand_in):
+    client = ZwennPayClient(url=stand_in, cache_size=2)
+
+    first = client.merchant_qr('150')
+    assert client.merchant_qr('150') == first
+    client.merchant_qr('250')
+    client.merchant_qr('400')  # evicts 150
+    client.merchant_qr('150')
+
+    stats = client.stats()
+    assert (stats['calls'], stats['cache_hits'], stats['cached']) == (4, 1, 2)
+    assert set(stats['latency_ms']) == {'last', 'p50', 'p95', 'max'}
+
+
+def test_expired_or_disabled_cache_calls_the_api(stand_in):
+    expiring = ZwennPayClient(url=stand_in, cache_size=2, cache_ttl=0)
+    uncached = ZwennPayClient(url=stand_in)
+    for client in (expiring, uncached):
+        client.merchant_qr('99.50')
+        client.merchant_qr('99.50')
+
+    assert expiring.stats()['calls'] == uncached.stats()['calls'] == 2
+    assert uncached.stats()['cached'] == 0
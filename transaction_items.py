@@ -0,0 +1,140 @@
+"""
+Body & Soul POS - Transaction Items
+Normalised cart lines (one row per product per transaction) so reporting
+can query what sold without parsing transactions.items_json.
+
+Run directly to backfill rows for existing transactions:
+    python transaction_items.py [batch_size]
+"""
+
+import json
+import sys
+import time
+
+from db import Database, database_url_from_env
+
+BACKFILL_BATCH_SIZE = 500
+
+
+def ensure_transaction_items(cursor, db_type):
+    """Create transaction_items and the reporting indexes if missing"""
+    if db_type == 'postgresql':
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS transaction_items (
+                id SERIAL PRIMARY KEY,
+                transaction_id INTEGER NOT NULL REFERENCES transactions(id),
+                product_id INTEGER,
+                barcode TEXT,
+                qty INTEGER NOT NULL,
+                unit_price DECIMAL(10,2) NOT NULL
+            )
+        ''')
+    else:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS transaction_items (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                transaction_id INTEGER NOT NULL REFERENCES transactions(id),
+                product_id INTEGER,
+                barcode TEXT,
+                qty INTEGER NOT NULL,
+                unit_price REAL NOT NULL
+            )
+        ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_transaction_items_transaction ON transaction_items (transaction_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_transaction_items_product ON transaction_items (product_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_timestamp ON transactions (timestamp)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_status ON transactions (status)')
+
+
+def item_rows(transaction_id, items):
+    """Turn cart items ({id, barcode, price, quantity, ...}) into transaction_items rows"""
+    rows = []
+    for item in items or []:
+        if not isinstance(item, dict):
+            continue
+        try:
+            qty = int(item.get('quantity', 1))
+            unit_price = float(item.get('price', 0))
+        except (TypeError, ValueError):
+            continue
+        rows.append((transaction_id, item.get('id'), item.get('barcode'), qty, unit_price))
+    return rows
+
+
+def insert_item_rows(cursor, db_type, rows):
+    """Insert prepared rows in one statement (PostgreSQL) or one executemany (SQLite)"""
+    if not rows:
+        return
+    if db_type == 'postgresql':
+        from psycopg2.extras import execute_values
+        execute_values(cursor, '''
+            INSERT INTO transaction_items (transaction_id, product_id, barcode, qty, unit_price)
+            VALUES %s
+        ''', rows)
+    else:
+        cursor.executemany('''
+            INSERT INTO transaction_items (transaction_id, product_id, barcode, qty, unit_price)
+            VALUES (?, ?, ?, ?, ?)
+        ''', rows)
+
+
+def save_transaction_items(cursor, db_type, transaction_id, items):
+    """Store a checkout's cart lines in the caller's transaction"""
+    insert_item_rows(cursor, db_type, item_rows(transaction_id, items))
+
+
+def backfill_transaction_items(database, batch_size=BACKFILL_BATCH_SIZE):
+    """Create item rows for transactions that only have items_json, one batch per DB transaction"""
+    last_id = 0
+    migrated = 0
+    skipped = 0
+    started = time.perf_counter()
+
+    with database.connection() as (conn, db_type):
+        ensure_transaction_items(conn.cursor(), db_type)
+
+    while True:
+        with database.connection() as (conn, db_type):
+            cursor = conn.cursor()
+            placeholder = database.placeholder
+            cursor.execute(f'''
+                SELECT t.id, t.items_json
+                FROM transactions t
+                WHERE t.id > {placeholder}
+                  AND NOT EXISTS (SELECT 1 FROM transaction_items ti WHERE ti.transaction_id = t.id)
+                ORDER BY t.id
+                LIMIT {placeholder}
+            ''', (last_id, batch_size))
+            batch = cursor.fetchall()
+            if not batch:
+                break
+
+            rows = []
+            for transaction_id, items_json in batch:
+                try:
+                    rows.extend(item_rows(transaction_id, json.loads(items_json)))
+                    migrated += 1
+                except (TypeError, ValueError):
+                    print(f"  ✗ Transaction {transaction_id}: unreadable items_json, skipped")
+                    skipped += 1
+            insert_item_rows(cursor, db_type, rows)
+            last_id = batch[-1][0]
+
+        print(f"  ✓ Backfilled up to transaction {last_id} ({len(rows)} item rows)")
+
+    elapsed = time.perf_counter() - started
+    return {'transactions': migrated, 'skipped': skipped, 'seconds': round(elapsed, 2)}
+
+
+if __name__ == '__main__':
+    batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else BACKFILL_BATCH_SIZE
+    database = Database(database_url_from_env())
+
+    print("=" * 60)
+    print(f"Backfill transaction_items ({database.db_type}, batches of {batch_size})")
+    print("=" * 60)
+    result = backfill_transaction_items(database, batch_size)
+    print("=" * 60)
+    print(f"Done: {result['transactions']} transactions migrated, "
+          f"{result['skipped']} skipped, {result['seconds']}s")
+    print("=" * 60)
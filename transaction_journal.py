@@ -0,0 +1,264 @@
+"""
+Body & Soul POS - Offline Transaction Journal
+The local service records every transaction it shows a QR for in a
+SQLite WAL journal on the store PC. Checkouts taken while the cloud is
+unreachable are journaled first and synced to the cloud later, in
+batches keyed by a client reference so a retried batch is never
+recorded twice. Checkouts whose QR never showed are kept out of the
+sync, and synced entries are pruned after JOURNAL_RETENTION_DAYS.
+"""
+
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import requests
+
+from db import Database
+
+JOURNAL_PATH = os.getenv('JOURNAL_PATH', 'local_journal.db')
+SYNC_INTERVAL = float(os.getenv('SYNC_INTERVAL', 10))  # seconds between sync passes
+SYNC_BATCH_SIZE = int(os.getenv('SYNC_BATCH_SIZE', 50))
+SYNC_BACKOFF_MAX = float(os.getenv('SYNC_BACKOFF_MAX', 300))  # longest wait after repeated failures
+JOURNAL_RETENTION_DAYS = float(os.getenv('JOURNAL_RETENTION_DAYS', 7))  # synced entries kept this long
+PRUNE_INTERVAL = 3600  # seconds between prune passes of the sync thread
+
+
+def new_client_ref():
+    """Reference that identifies an offline checkout on both sides"""
+    return uuid.uuid4().hex
+
+
+def utc_timestamp():
+    """Timestamp in the format SQLite's CURRENT_TIMESTAMP uses (UTC)"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def ensure_offline_sync(cursor, db_type):
+    """Cloud side: map of synced client references to transactions"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS offline_sync (
+            client_ref TEXT PRIMARY KEY,
+            transaction_id INTEGER NOT NULL REFERENCES transactions(id)
+        )
+    ''')
+
+
+class TransactionJournal:
+    """Durable record of displayed transactions on the store PC"""
+
+    def __init__(self, path=JOURNAL_PATH):
+        self.database = Database(None, sqlite_path=path, sqlite_synchronous='FULL')
+        with self.database.connection() as (conn, db_type):
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS journal (
+                    client_ref TEXT PRIMARY KEY,
+                    transaction_id INTEGER,
+                    receipt_number TEXT,
+                    amount REAL NOT NULL,
+                    items_json TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    created_at TEXT NOT NULL,
+                    synced INTEGER NOT NULL DEFAULT 0,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_journal_unsynced ON journal (synced, created_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_journal_transaction ON journal (transaction_id)')
+
+    def record(self, amount, items, client_ref=None, transaction_id=None, receipt_number=None):
+        """Journal a checkout before its QR is shown.
+
+        Checkouts that already have a cloud transaction_id are stored as
+        synced; offline ones wait for the sync thread. A retry with the same
+        client_ref reuses its entry (reviving it if its display failed).
+        Returns client_ref.
+        """
+        client_ref = client_ref or new_client_ref()
+        with self.database.connection() as (conn, db_type):
+            conn.execute('''
+                INSERT INTO journal (client_ref, transaction_id, receipt_number, amount, items_json,
+                                     created_at, synced)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (client_ref) DO UPDATE SET status = 'pending', last_error = NULL
+                WHERE journal.status = 'failed'
+            ''', (client_ref, transaction_id, receipt_number, amount, json.dumps(items or []),
+                  utc_timestamp(), 1 if transaction_id else 0))
+        return client_ref
+
+    def mark_display_failed(self, client_ref, error):
+        """The QR for an offline checkout never showed: no sale, so it is not synced"""
+        with self.database.connection() as (conn, db_type):
+            conn.execute('''
+                UPDATE journal SET status = 'failed', last_error = ?
+                WHERE client_ref = ? AND status = 'pending' AND synced = 0
+            ''', (str(error)[:500], client_ref))
+
+    def mark_completed(self, client_ref):
+        """Payment taken for an offline checkout; the completion is synced too"""
+        with self.database.connection() as (conn, db_type):
+            cursor = conn.execute('''
+                UPDATE journal SET status = 'completed', synced = 0
+                WHERE client_ref = ? AND status = 'pending'
+            ''', (client_ref,))
+            return cursor.rowcount == 1
+
+    def unsynced(self, limit=SYNC_BATCH_SIZE):
+        """Oldest entries the cloud has not confirmed yet"""
+        with self.database.connection() as (conn, db_type):
+            rows = conn.execute('''
+                SELECT client_ref, amount, items_json, status, created_at
+                FROM journal
+                WHERE synced = 0 AND status != 'failed'
+                ORDER BY created_at
+                LIMIT ?
+            ''', (limit,)).fetchall()
+        return [{
+            'client_ref': row[0],
+            'amount': row[1],
+            'items': json.loads(row[2]),
+            'status': row[3],
+            'created_at': row[4],
+        } for row in rows]
+
+    def mark_synced(self, results):
+        """Store the cloud's transaction ids/receipt numbers for a confirmed batch.
+
+        An entry completed while its batch was in flight stays unsynced.
+        """
+        with self.database.connection() as (conn, db_type):
+            conn.executemany('''
+                UPDATE journal
+                SET synced = CASE WHEN status = ? THEN 1 ELSE 0 END,
+                    transaction_id = ?, receipt_number = ?, last_error = NULL
+                WHERE client_ref = ?
+            ''', [(r['status'], r['transaction_id'], r['receipt_number'], r['client_ref']) for r in results])
+
+    def mark_failed(self, client_refs, error):
+        with self.database.connection() as (conn, db_type):
+            conn.executemany('''
+                UPDATE journal SET attempts = attempts + 1, last_error = ? WHERE client_ref = ?
+            ''', [(error[:500], ref) for ref in client_refs])
+
+    def prune(self, retention_days=JOURNAL_RETENTION_DAYS):
+        """Delete synced entries and failed displays older than retention_days; returns rows deleted"""
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=retention_days)).strftime('%Y-%m-%d %H:%M:%S')
+        with self.database.connection() as (conn, db_type):
+            # Both ranges are on idx_journal_unsynced (synced, created_at)
+            deleted = conn.execute('DELETE FROM journal WHERE synced = 1 AND created_at < ?', (cutoff,)).rowcount
+            deleted += conn.execute('''
+                DELETE FROM journal WHERE synced = 0 AND created_at < ? AND status = 'failed'
+            ''', (cutoff,)).rowcount
+        return deleted
+
+    def stats(self):
+        """Entries waiting to sync and failed displays; reads only the unsynced index range (cheap for /health)"""
+        with self.database.connection() as (conn, db_type):
+            waiting, failed = conn.execute('''
+                SELECT COALESCE(SUM(status != 'failed'), 0), COALESCE(SUM(status = 'failed'), 0)
+                FROM journal
+                WHERE synced = 0
+            ''').fetchone()
+        return {'unsynced': waiting, 'failed_displays': failed}
+
+
+class JournalSync:
+    """Background thread pushing unsynced journal entries to the cloud"""
+
+    def __init__(self, journal, cloud_url, api_key, interval=SYNC_INTERVAL,
+                 batch_size=SYNC_BATCH_SIZE, backoff_max=SYNC_BACKOFF_MAX):
+        self.journal = journal
+        self.cloud_url = cloud_url.rstrip('/') if cloud_url else None
+        self.api_key = api_key
+        self.interval = interval
+        self.batch_size = batch_size
+        self.backoff_max = backoff_max
+        self.session = requests.Session()
+        self.failures = 0
+        self.last_success = None
+        self.last_error = None
+        self._wake = threading.Event()
+        self._started = False
+        self._last_prune = 0.0
+
+    def start(self):
+        """Start the sync thread; without CLOUD_URL it only prunes the journal"""
+        if not self.cloud_url:
+            print("✗ CLOUD_URL not set; offline checkouts stay in the local journal")
+        if not self._started:
+            self._started = True
+            threading.Thread(target=self._run, name='journal-sync', daemon=True).start()
+
+    def wake(self):
+        """Sync soon (e.g. after an offline checkout or completion)"""
+        self._wake.set()
+
+    def delay(self):
+        """Seconds until the next pass: the interval, or jittered exponential backoff after failures"""
+        if not self.failures:
+            return self.interval
+        return random.uniform(self.interval, min(self.backoff_max, self.interval * 2 ** self.failures))
+
+    def sync_once(self):
+        """Send batches until the journal is drained; returns entries confirmed"""
+        confirmed = 0
+        while True:
+            batch = self.journal.unsynced(self.batch_size)
+            if not batch:
+                return confirmed
+            try:
+                response = self.session.post(
+                    f"{self.cloud_url}/api/sync/transactions",
+                    json={'transactions': batch},
+                    headers={'X-API-Key': self.api_key},
+                    timeout=(3, 30)
+                )
+                response.raise_for_status()
+                results = response.json()['results']
+            except Exception as e:
+                self.journal.mark_failed([entry['client_ref'] for entry in batch], str(e))
+                raise
+            self.journal.mark_synced(results)
+            confirmed += len(results)
+            if len(batch) < self.batch_size:
+                return confirmed
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.delay())
+            self._wake.clear()
+            if self.cloud_url:
+                self._sync_pass()
+            if time.monotonic() - self._last_prune >= PRUNE_INTERVAL:
+                self._last_prune = time.monotonic()
+                try:
+                    pruned = self.journal.prune()
+                    if pruned:
+                        print(f"✓ Pruned {pruned} old journal entries")
+                except Exception as e:
+                    print(f"✗ Journal prune failed: {e}")
+
+    def _sync_pass(self):
+        try:
+            confirmed = self.sync_once()
+            if confirmed:
+                print(f"✓ Synced {confirmed} journaled transaction(s) to the cloud")
+            self.failures = 0
+            self.last_success = time.time()
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            print(f"✗ Journal sync failed ({self.failures} in a row): {e}")
+
+    def status(self):
+        return {
+            'cloud_url': self.cloud_url,
+            'failures': self.failures,
+            'last_success': self.last_success,
+            'last_error': self.last_error,
+        }
@@ -0,0 +1,186 @@
+"""
+Body & Soul POS - ZwennPay Client
+Shared keep-alive client for the ZwennPay GetMerchantQR endpoint: one
+pooled session (no TLS handshake per checkout), tight connect/read
+timeouts, jittered retries bounded by an overall deadline, and latency
+stats for /status.
+
+Merchants whose QR data is deterministic per amount can turn on the
+payload cache (ZWENNPAY_CACHE_SIZE > 0): QR strings are then kept per
+(merchant, amount) and repeat amounts skip the API call entirely.
+
+ZWENNPAY_URL points the client elsewhere, e.g. at the stand-in server in
+bench_zwennpay.py.
+"""
+
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+ZWENNPAY_URL = os.getenv('ZWENNPAY_URL', 'https://api.zwennpay.com:9425/api/v1.0/Common/GetMerchantQR')
+ZWENNPAY_MERCHANT_ID = int(os.getenv('ZWENNPAY_MERCHANT_ID', 56))
+ZWENNPAY_TIMEOUT = (float(os.getenv('ZWENNPAY_CONNECT_TIMEOUT', 2)), float(os.getenv('ZWENNPAY_READ_TIMEOUT', 5)))
+ZWENNPAY_RETRIES = int(os.getenv('ZWENNPAY_RETRIES', 2))
+ZWENNPAY_BACKOFF = float(os.getenv('ZWENNPAY_BACKOFF', 0.2))  # seconds, doubled per retry
+ZWENNPAY_DEADLINE = float(os.getenv('ZWENNPAY_DEADLINE', 12))  # no retry starts after this many seconds
+ZWENNPAY_CACHE_SIZE = int(os.getenv('ZWENNPAY_CACHE_SIZE', 0))  # 0 = no payload cache
+ZWENNPAY_CACHE_TTL = float(os.getenv('ZWENNPAY_CACHE_TTL', 3600))
+RETRY_STATUSES = (429, 502, 503, 504)
+LATENCY_WINDOW = 200  # recent calls kept for p50/p95
+
+
+class ZwennPayError(requests.exceptions.RequestException):
+    """ZwennPay answered, but without usable QR data"""
+
+
+def merchant_qr_payload(amount, merchant_id=ZWENNPAY_MERCHANT_ID):
+    """GetMerchantQR request body for a fixed transaction amount"""
+    return {
+        "MerchantId": merchant_id,
+        "SetTransactionAmount": True,
+        "TransactionAmount": str(amount),
+        "SetConvenienceIndicatorTip": False,
+        "ConvenienceIndicatorTip": 0,
+        "SetConvenienceFeeFixed": False,
+        "ConvenienceFeeFixed": 0,
+        "SetConvenienceFeePercentage": False,
+        "ConvenienceFeePercentage": 0,
+    }
+
+
+class ZwennPayClient:
+    """requests.Session wrapper used for every GetMerchantQR call"""
+
+    def __init__(self, url=ZWENNPAY_URL, merchant_id=ZWENNPAY_MERCHANT_ID, timeout=ZWENNPAY_TIMEOUT,
+                 retries=ZWENNPAY_RETRIES, backoff=ZWENNPAY_BACKOFF, deadline=ZWENNPAY_DEADLINE,
+                 cache_size=ZWENNPAY_CACHE_SIZE, cache_ttl=ZWENNPAY_CACHE_TTL):
+        self.url = url
+        self.merchant_id = merchant_id
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.deadline = deadline
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.session = requests.Session()
+        self.session.headers.update({"accept": "text/plain", "Content-Type": "application/json"})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._cache = OrderedDict()  # (merchant_id, amount) -> (qr data, stored at)
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._counts = {'calls': 0, 'errors': 0, 'retries': 0, 'cache_hits': 0}
+        self._lock = threading.Lock()
+        self.observer = None  # optional callable(seconds, outcome), for metrics
+
+    def merchant_qr(self, amount, merchant_id=None):
+        """QR data string for amount; raises requests exceptions once retries are exhausted"""
+        merchant_id = self.merchant_id if merchant_id is None else merchant_id
+        key = (merchant_id, str(amount))
+        cached = self._cached(key)
+        if cached:
+            return cached
+
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            qr_data = self._request(merchant_qr_payload(amount, merchant_id))
+            outcome = 'ok'
+        except requests.exceptions.Timeout:
+            outcome = 'timeout'
+            raise
+        except requests.exceptions.ConnectionError:
+            outcome = 'connection_error'
+            raise
+        finally:
+            self._record(time.perf_counter() - started, outcome)
+
+        if self.cache_size > 0:
+            with self._lock:
+                self._cache[key] = (qr_data, time.monotonic())
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return qr_data
+
+    def _request(self, payload):
+        started = time.monotonic()
+        attempts = 1 + self.retries
+        for attempt in range(attempts):
+            retry = attempt + 1 < attempts and time.monotonic() - started < self.deadline
+            try:
+                response = self.session.post(self.url, json=payload, timeout=self.timeout)
+                if response.status_code in RETRY_STATUSES and retry:
+                    response.close()
+                    self._retry_wait(attempt)
+                    continue
+                response.raise_for_status()
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if retry:
+                    self._retry_wait(attempt)
+                    continue
+                raise
+            qr_data = response.text.strip()
+            if not qr_data:
+                raise ZwennPayError("ZwennPay returned an empty QR payload")
+            return qr_data
+
+    def _retry_wait(self, attempt):
+        with self._lock:
+            self._counts['retries'] += 1
+        # Full jitter keeps retries from several tills in step
+        time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+    def _cached(self, key):
+        if self.cache_size <= 0:
+            return None
+        with self._lock:
+            entry = self._cache.get(key)
+            if not entry:
+                return None
+            qr_data, stored_at = entry
+            if time.monotonic() - stored_at > self.cache_ttl:
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            self._counts['cache_hits'] += 1
+        if self.observer:
+            self.observer(0.0, 'cache_hit')
+        return qr_data
+
+    def _record(self, seconds, outcome):
+        with self._lock:
+            self._counts['calls'] += 1
+            if outcome != 'ok':
+                self._counts['errors'] += 1
+            self._latencies.append(seconds)
+        if self.observer:
+            self.observer(seconds, outcome)
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self):
+        """Call counts and recent API latency (ms) for /status"""
+        with self._lock:
+            stats = dict(self._counts)
+            last = self._latencies[-1] if self._latencies else None
+            latencies = sorted(self._latencies)
+            stats['cached'] = len(self._cache)
+        if latencies:
+            stats['latency_ms'] = {
+                'last': round(last * 1000, 1),
+                'p50': round(latencies[len(latencies) // 2] * 1000, 1),
+                'p95': round(latencies[max(int(len(latencies) * 0.95) - 1, 0)] * 1000, 1),
+                'max': round(latencies[-1] * 1000, 1),
+            }
+        return stats
+
+
+zwennpay_client = ZwennPayClient()